@@ -14,585 +14,502 @@ import time
 import zipfile
 import io
 import base64
-from urllib.parse import urlparse, parse_qs
+import argparse
+import copy
+import threading
+import concurrent.futures
+import uuid
+import queue
+import shutil
+import functools
+from collections import OrderedDict
+from urllib.parse import urlparse, parse_qs, unquote
+
+from disk_cache import LLMCompletionCache, TestArchiveCache
+from llm_client import OllamaClient, LLMUnavailableError
+from model_store import ModelStore, ModelIndex
+from generation_sessions import GenerationSessionRegistry
+from metrics import MetricsRegistry, CONTENT_TYPE as METRICS_CONTENT_TYPE
+import tracing
 
-# Настройка логирования
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(sys.stdout),
-        logging.FileHandler('api.log', mode='a', encoding='utf-8')
-    ]
-)
 logger = logging.getLogger(__name__)
 
+
+def configure_logging():
+    """Настройка логирования сервера: консоль и api.log"""
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.StreamHandler(sys.stdout),
+            logging.FileHandler('api.log', mode='a', encoding='utf-8')
+        ]
+    )
+
+# Число рабочих потоков сервера (можно переопределить через API_WORKERS или --workers)
+DEFAULT_WORKERS = int(os.environ.get("API_WORKERS", "16"))
+
+# Число одновременно выполняемых фоновых задач генерации модели
+DEFAULT_JOB_WORKERS = int(os.environ.get("JOB_WORKERS", "2"))
+
+# Подключение к Ollama
+OLLAMA_URL = os.environ.get("OLLAMA_URL", "http://localhost:11434")
+LLM_TIMEOUT = float(os.environ.get("LLM_TIMEOUT", "30"))
+OLLAMA_HEALTH_TTL = float(os.environ.get("OLLAMA_HEALTH_TTL", "10"))
+
+# Дисковый кэш ответов LLM
+LLM_CACHE_DIR = os.environ.get("LLM_CACHE_DIR", os.path.join("cache", "llm"))
+LLM_CACHE_MAX_MB = int(os.environ.get("LLM_CACHE_MAX_MB", "256"))
+LLM_CACHE_ENABLED = os.environ.get("LLM_CACHE_ENABLED", "1") != "0"
+
+# Период фоновой записи измененных моделей на диск (секунды)
+MODEL_FLUSH_INTERVAL = float(os.environ.get("MODEL_FLUSH_INTERVAL", "2"))
+
+# Максимальная длина текста ТЗ в одном промпте; длинные документы режутся на части
+PROMPT_TEXT_LIMIT = 1500
+
+# Сколько частей документа одновременно отправляется в LLM
+DEFAULT_LLM_CONCURRENCY = int(os.environ.get("LLM_CONCURRENCY", "4"))
+
+# Ограничения перечисления сценариев в /api/generate-tests (0 - без ограничения)
+TESTS_MAX_SCENARIOS = int(os.environ.get("TESTS_MAX_SCENARIOS", "200"))
+TESTS_TIME_BUDGET = float(os.environ.get("TESTS_TIME_BUDGET", "20"))
+# Предварительная проверка: сколько сценариев всего допускается (0 - без проверки)
+TESTS_MAX_TOTAL_SCENARIOS = int(os.environ.get("TESTS_MAX_TOTAL_SCENARIOS", "100000"))
+# Процессы рендеринга файлов тестов (1 - в потоке запроса, 0 - по числу ядер)
+TESTS_PROCESSES = int(os.environ.get("TESTS_PROCESSES", "1"))
+
+# Дисковый кэш архивов тестов (TTL в секундах, 0 - без ограничения)
+TESTS_CACHE_DIR = os.environ.get("TESTS_CACHE_DIR", os.path.join("cache", "tests"))
+TESTS_CACHE_MAX_MB = int(os.environ.get("TESTS_CACHE_MAX_MB", "512"))
+TESTS_CACHE_TTL = float(os.environ.get("TESTS_CACHE_TTL", "86400"))
+TESTS_CACHE_ENABLED = os.environ.get("TESTS_CACHE_ENABLED", "1") != "0"
+# Сессии генерации тестов: при правках модели заново строятся только файлы
+# затронутых действий (0 - каждый запрос строит генератор с нуля)
+TESTS_SESSIONS = int(os.environ.get("TESTS_SESSIONS", "8"))
+
+# Журнал трасс запросов, JSON lines ("" - не писать) и его размер до смены файла
+TRACE_LOG = os.environ.get("TRACE_LOG", os.path.join("cache", "traces.jsonl"))
+TRACE_LOG_MAX_MB = int(os.environ.get("TRACE_LOG_MAX_MB", "50"))
+# Запросы дольше порога (мс) пишутся в отдельный журнал с разбивкой по этапам (0 - выключено)
+SLOW_REQUEST_MS = float(os.environ.get("SLOW_REQUEST_MS", "0"))
+SLOW_REQUEST_LOG = os.environ.get("SLOW_REQUEST_LOG", os.path.join("cache", "slow_requests.jsonl"))
+
+# Службы сервера создает init_services() при запуске, а не импорт модуля:
+# процессы пула рендеринга тестов (forkserver/spawn) импортируют api_main
+# заново как __mp_main__ и не должны открывать api.log, чистить кэши и
+# создавать свои хранилище моделей и клиент Ollama
+ollama_client = None
+llm_cache = None
+tests_cache = None
+generation_sessions = None
+model_store = None
+trace_log = None
+
+
+def init_services():
+    """Создает клиент Ollama, кэши, хранилище моделей, сессии тестов и журнал трасс"""
+    global ollama_client, llm_cache, tests_cache, generation_sessions, model_store, trace_log
+    
+    ollama_client = OllamaClient(
+        OLLAMA_URL,
+        pool_size=max(DEFAULT_LLM_CONCURRENCY, 4),
+        health_ttl=OLLAMA_HEALTH_TTL
+    )
+    
+    llm_cache = LLMCompletionCache(
+        LLM_CACHE_DIR,
+        max_bytes=LLM_CACHE_MAX_MB * 1024 * 1024,
+        enabled=LLM_CACHE_ENABLED
+    )
+    
+    tests_cache = TestArchiveCache(
+        TESTS_CACHE_DIR,
+        max_bytes=TESTS_CACHE_MAX_MB * 1024 * 1024,
+        ttl=TESTS_CACHE_TTL or None,
+        enabled=TESTS_CACHE_ENABLED
+    )
+    
+    generation_sessions = GenerationSessionRegistry(max_sessions=TESTS_SESSIONS)
+    
+    # Модели держатся в памяти и записываются на диск пакетно
+    model_store = ModelStore("models", flush_interval=MODEL_FLUSH_INTERVAL)
+    
+    trace_log = tracing.TraceLog(
+        TRACE_LOG or None,
+        slow_path=SLOW_REQUEST_LOG or None,
+        slow_threshold=SLOW_REQUEST_MS / 1000 if SLOW_REQUEST_MS > 0 else None,
+        max_bytes=TRACE_LOG_MAX_MB * 1024 * 1024
+    )
+
+# Метрики для /api/metrics (формат Prometheus)
+metrics = MetricsRegistry()
+
+http_requests = metrics.counter(
+    "graph_editor_http_requests_total", "HTTP запросы по методу, маршруту и статусу ответа",
+    labels=("method", "route", "status"))
+http_request_seconds = metrics.histogram(
+    "graph_editor_http_request_seconds", "Время обработки HTTP запроса до конца ответа",
+    labels=("method", "route"))
+http_in_flight = metrics.gauge(
+    "graph_editor_http_requests_in_flight", "HTTP запросы в обработке", labels=("route",))
+
+llm_requests = metrics.counter(
+    "graph_editor_llm_requests_total", "Запросы к Ollama /api/generate (без попаданий в кэш) по исходу",
+    labels=("mode", "result"))
+llm_request_seconds = metrics.histogram(
+    "graph_editor_llm_request_seconds", "Время запроса к Ollama /api/generate до полного ответа",
+    labels=("mode",))
+llm_parse_results = metrics.counter(
+    "graph_editor_llm_parse_total", "Разбор ответов LLM: actions - найдены действия, empty - нет",
+    labels=("result",))
+llm_parse_seconds = metrics.histogram(
+    "graph_editor_llm_parse_seconds", "Время разбора ответа LLM (parse_llm_response)",
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1))
+llm_json_repairs = metrics.counter(
+    "graph_editor_llm_json_repairs_total", "Попытки починить неполный JSON ответа LLM по исходу",
+    labels=("result",))
+
+model_merge_seconds = metrics.histogram(
+    "graph_editor_model_merge_seconds",
+    "Слияние действий в модель: add_action - одно действие, merge_actions - ответ LLM целиком",
+    labels=("operation",), buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10))
+model_merged_actions = metrics.counter(
+    "graph_editor_model_merged_actions_total", "Действия, слитые в модели", labels=("operation",))
+
+tests_generation_seconds = metrics.histogram(
+    "graph_editor_tests_generation_seconds", "Генерация тестов без попаданий в кэш архивов",
+    labels=("output",))
+tests_scenarios = metrics.histogram(
+    "graph_editor_tests_scenarios", "Сценарии в одном ответе /api/generate-tests",
+    buckets=(10, 100, 1000, 10000, 100000, 1000000))
+tests_session_updates = metrics.counter(
+    "graph_editor_tests_session_updates_total",
+    "Подготовка генератора сессии тестов: full - с нуля, incremental - по изменениям модели",
+    labels=("mode",))
+
+
+def _caches_stats():
+    return {"llm": llm_cache.stats(), "tests": tests_cache.stats()}
+
+
+metrics.counter("graph_editor_cache_hits_total", "Попадания в дисковые кэши", labels=("cache",),
+                callback=lambda: {(name,): stats["hits"] for name, stats in _caches_stats().items()})
+metrics.counter("graph_editor_cache_misses_total", "Промахи дисковых кэшей", labels=("cache",),
+                callback=lambda: {(name,): stats["misses"] for name, stats in _caches_stats().items()})
+metrics.gauge("graph_editor_cache_hit_ratio", "Доля попаданий в дисковые кэши с запуска", labels=("cache",),
+              callback=lambda: {(name,): stats["hit_ratio"] for name, stats in _caches_stats().items()})
+metrics.gauge("graph_editor_cache_bytes", "Размер дисковых кэшей", labels=("cache",),
+              callback=lambda: {(name,): stats["bytes"] for name, stats in _caches_stats().items()})
+metrics.gauge("graph_editor_tests_sessions", "Сессии генерации тестов в памяти",
+              callback=lambda: generation_sessions.stats()["sessions"])
+
+# Маршруты с параметром в пути: метка route не зависит от имени модели, ID задачи и т.п.
+METRICS_ROUTE_PREFIXES = (
+    ("/api/test-manager/tests/", "/api/test-manager/tests/<action_id>"),
+    ("/api/models/", "/api/models/<name>/stats"),
+    ("/api/download-tests/", "/api/download-tests/<key>"),
+    ("/api/jobs/", "/api/jobs/<job_id>")
+)
+METRICS_ROUTES = {
+    "/api/health", "/api/status", "/api/metrics", "/api/test-manager/tests", "/api/latest-model",
+    "/api/models", "/api/llm/status", "/api/cache/llm", "/api/cache/tests", "/api/jobs",
+    "/api/generate-model", "/api/generate", "/api/generate-model/stream", "/api/jobs/generate-model",
+    "/api/generate-tests"
+}
+
+
+def metrics_route(path):
+    """Метка route для пути запроса (неизвестные пути - other)"""
+    path = urlparse(path).path
+    if path in METRICS_ROUTES:
+        return path
+    for prefix, route in METRICS_ROUTE_PREFIXES:
+        if path.startswith(prefix):
+            return route
+    return "other"
+
+
+def instrumented(handler_method):
+    """
+    Учитывает запрос в метриках (число по статусу, время, запросы в
+    обработке) и выполняет его в трассе, которая пишется в журнал трасс
+    """
+    @functools.wraps(handler_method)
+    def wrapper(self):
+        route = metrics_route(self.path)
+        self.response_status = None
+        self.trace = tracing.Trace(
+            tracing.request_id_from(self.headers.get("X-Request-ID")), "http",
+            method=self.command, route=route, path=urlparse(self.path).path
+        )
+        started = time.perf_counter()
+        try:
+            with http_in_flight.track(route=route), tracing.activate(self.trace):
+                return handler_method(self)
+        finally:
+            http_request_seconds.observe(time.perf_counter() - started, method=self.command, route=route)
+            http_requests.inc(method=self.command, route=route, status=self.response_status or "none")
+            self.trace.finish(status=self.response_status)
+            trace_log.write(self.trace)
+            self.trace = None
+    return wrapper
+
+
+def split_text_into_chunks(text, max_chunk_size=PROMPT_TEXT_LIMIT):
+    """
+    Разбивает текст ТЗ на части не длиннее max_chunk_size символов.
+    
+    Разрыв ищется на границе абзаца или предложения в последних 200 символах
+    части, иначе на границе слова (так же, как _splitTextIntoChunks в graph-manager.js).
+    """
+    if len(text) <= max_chunk_size:
+        return [text]
+    
+    chunks = []
+    start = 0
+    
+    while start < len(text):
+        end = start + max_chunk_size
+        
+        if end >= len(text):
+            tail = text[start:].strip()
+            if tail:
+                chunks.append(tail)
+            break
+        
+        break_point = end
+        
+        # Ищем конец предложения или абзаца, начинающийся не дальше end
+        separators = ['. ', '! ', '? ', '\n\n', '\n']
+        positions = {sep: text.rfind(sep, start, end + len(sep)) for sep in separators}
+        sentence_end = max(positions.values())
+        
+        if sentence_end > start and sentence_end > end - 200:
+            if positions['\n\n'] == sentence_end:
+                break_point = sentence_end + 2
+            else:
+                break_point = sentence_end + 1
+        
+        # Если не нашли, разрываем по границе слова
+        if break_point == end:
+            last_space = text.rfind(' ', start, end + 1)
+            if last_space > start and last_space > end - 50:
+                break_point = last_space + 1
+        
+        chunk = text[start:break_point].strip()
+        if chunk:
+            chunks.append(chunk)
+        
+        start = break_point
+    
+    return chunks
+
+
 def write_port_to_file(port):
     """Записывает порт в файл для launch.command"""
     with open("api_port.txt", "w") as f:
         f.write(str(port))
 
-class SimpleAPIHandler(http.server.BaseHTTPRequestHandler):
+
+class ActionStreamParser:
+    """
+    Инкрементальный разбор потокового ответа LLM.
     
-    def _set_cors_headers(self):
-        """Устанавливает CORS заголовки"""
-        self.send_header("Access-Control-Allow-Origin", "*")
-        self.send_header("Access-Control-Allow-Methods", "GET, POST, OPTIONS")
-        self.send_header("Access-Control-Allow-Headers", "Content-Type")
+    Принимает фрагменты текста и возвращает каждый JSON объект верхнего
+    уровня (элемент массива действий), как только пришла его закрывающая
+    скобка. Текст вне объектов (скобки массива, markdown обертки) пропускается.
+    """
     
-    def do_OPTIONS(self):
-        """Обработка CORS preflight запросов"""
-        self.send_response(200)
-        self._set_cors_headers()
-        self.send_header("Content-Type", "application/json")
-        self.end_headers()
+    def __init__(self):
+        self.depth = 0
+        self.in_string = False
+        self.escape = False
+        self.skipped = 0
+        self._current = []
+        self._text_parts = []
     
-    def do_GET(self):
-        if self.path == "/api/health" or self.path == "/api/status":
-            self.send_response(200)
-            self.send_header("Content-Type", "application/json")
-            self._set_cors_headers()
-            self.end_headers()
-            
-            response = {
-                "status": "healthy",
-                "timestamp": datetime.datetime.now().isoformat(),
-                "service": "Graph Editor API",
-                "version": "1.0.0",
-                "endpoints": {
-                    "health": "/api/health",
-                    "generate": "/api/generate (POST)",
-                    "status": "/api/status",
-                    "test_manager": {
-                        "all_tests": "/api/test-manager/tests",
-                        "action_tests": "/api/test-manager/tests/<action_id>"
-                    }
-                }
-            }
+    @property
+    def text(self):
+        """Весь полученный текст (для разбора целиком, если потоковый не удался)"""
+        return "".join(self._text_parts)
+    
+    def feed(self, fragment):
+        """Добавляет фрагмент и возвращает список завершенных объектов"""
+        self._text_parts.append(fragment)
+        objects = []
+        
+        for ch in fragment:
+            if self.depth == 0:
+                if ch == '{':
+                    self.depth = 1
+                    self._current = [ch]
+                continue
             
-            self.wfile.write(json.dumps(response, indent=2).encode())
-            logger.info(f"✅ Health check - {datetime.datetime.now()}")
+            self._current.append(ch)
             
-        elif self.path == "/api/test-manager/tests":
-            # Эндпоинт для получения всех тестов
-            self.send_response(200)
-            self.send_header("Content-Type", "application/json")
-            self._set_cors_headers()
-            self.end_headers()
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif ch == '\\':
+                    self.escape = True
+                elif ch == '"':
+                    self.in_string = False
+                continue
             
-            # Заглушка для демонстрации
-            test_data = {
-                "tests": [
-                    {
-                        "id": "test_001",
-                        "name": "Тест проверки соединения",
-                        "description": "Проверяет установку соединения с API",
-                        "type": "integration",
-                        "priority": "high"
-                    },
-                    {
-                        "id": "test_002",
-                        "name": "Тест загрузки графа",
-                        "description": "Проверяет корректность загрузки структуры графа",
-                        "type": "functional",
-                        "priority": "medium"
-                    },
-                    {
-                        "id": "test_003",
-                        "name": "Тест валидации действий",
-                        "description": "Проверяет валидность действий в графе",
-                        "type": "validation",
-                        "priority": "high"
-                    },
-                    {
-                        "id": "test_004",
-                        "name": "Тест целостности данных",
-                        "description": "Проверяет целостность данных модели",
-                        "type": "data",
-                        "priority": "medium"
-                    }
-                ],
-                "total": 4,
-                "timestamp": datetime.datetime.now().isoformat()
+            if ch == '"':
+                self.in_string = True
+            elif ch == '{':
+                self.depth += 1
+            elif ch == '}':
+                self.depth -= 1
+                if self.depth == 0:
+                    try:
+                        objects.append(json.loads("".join(self._current)))
+                    except json.JSONDecodeError:
+                        self.skipped += 1
+                    self._current = []
+        
+        return objects
+
+
+class ModelGenerationService:
+    """
+    Конвейер анализа ТЗ: промпт -> LLM -> парсинг -> слияние в модель.
+    
+    Не зависит от HTTP соединения, поэтому используется и обработчиком
+    запросов, и фоновыми задачами генерации.
+    """
+    
+    def generate_llm_prompt(self, text):
+        """
+        Генерирует промпт для LLM (Ollama) для анализа ТЗ
+        """
+        prompt = (
+            "Анализируй текст ТЗ и верни JSON-массив действий. Каждое действие — объект в массиве.\n"
+            "Каждый объект - это конкретная одна цель, конкретного действующего лица в конкретном месте системе\n"
+            "Формат каждого объекта: {\"action_actor\": \"кто\", \"action_action\": \"что делает(глагол в настоящем времени + объект из ТЗ   - Примеры: 'создает контакт', 'редактирует документ', 'отправляет уведомление' )\", \"action_place\": \"где (Пример: на главной странице, на форме редактирования )\", \"init_states\": [(начальные состояния объектов перед действием   - Пример: [{\"object_name\": \"контакт\", \"state_name\": \"не существует\"}]  )], \"final_states\": [конечные состояния объектов после действия  - Пример: [{\"object_name\": \"контакт\", \"state_name\": \"создан\"}] ]}\n"
+            "action_action должен быть строкой: 'глагол + объект'.\n"
+            "init_states/final_states: массив объектов {\"object_name\": \"...\", \"state_name\": \"...\"}.\n"
+            "Верни ТОЛЬКО JSON-массив без комментариев.\n\n"
+            "Текст ТЗ:\n"
+            f"{text[:PROMPT_TEXT_LIMIT]}"
+            "\n\n"
+            "JSON-массив действий:"
+        )
+        
+        return prompt
+    
+    def _llm_payload(self, prompt, stream=False):
+        """Тело запроса к Ollama /api/generate"""
+        return {
+            "model": "llama3.2",
+            "prompt": prompt,
+            "stream": stream,
+            "options": {
+                "temperature": 0.3,
+                "num_predict": 2000  # Увеличили для больших ответов
             }
-            
-            self.wfile.write(json.dumps(test_data, indent=2, ensure_ascii=False).encode())
-            logger.info(f"✅ Test Manager: возвращено {len(test_data['tests'])} тестов")
-            
-        elif self.path.startswith("/api/test-manager/tests/"):
-            # Эндпоинт для получения тестов для конкретного действия
-            action_id = self.path.replace("/api/test-manager/tests/", "")
-            
-            self.send_response(200)
-            self.send_header("Content-Type", "application/json")
-            self._set_cors_headers()
-            self.end_headers()
-            
-            # Заглушка для демонстрации
-            test_data = {
-                "action_id": action_id,
-                "action_name": f"Действие {action_id}",
-                "tests": [
-                    {
-                        "id": f"action_test_001_{action_id}",
-                        "name": "Тест выполнения действия",
-                        "description": f"Проверяет выполнение действия {action_id}",
-                        "type": "functional",
-                        "priority": "high"
-                    },
-                    {
-                        "id": f"action_test_002_{action_id}",
-                        "name": "Тест валидации параметров",
-                        "description": f"Проверяет параметры действия {action_id}",
-                        "type": "validation",
-                        "priority": "medium"
-                    },
-                    {
-                        "id": f"action_test_003_{action_id}",
-                        "name": "Тест результата действия",
-                        "description": f"Проверяет результат выполнения действия {action_id}",
-                        "type": "functional",
-                        "priority": "high"
-                    }
-                ],
-                "total": 3,
-                "timestamp": datetime.datetime.now().isoformat()
+        }
+    
+    def query_llm(self, prompt):
+        """
+        Отправляет запрос к Ollama LLM (без внешних зависимостей)
+        
+        Успешные ответы кэшируются на диске по хэшу промпта, модели и
+        параметров; одинаковые одновременные запросы выполняются один раз.
+        """
+        payload = self._llm_payload(prompt)
+        with tracing.span("llm", prompt_chars=len(prompt)):
+            return llm_cache.get_or_compute(payload, lambda: self._query_llm_uncached(payload))
+    
+    def _query_llm_uncached(self, payload):
+        """Выполняет запрос к Ollama /api/generate без кэша"""
+        started = time.perf_counter()
+        try:
+            with tracing.span("ollama_generate"):
+                result = ollama_client.generate(payload, timeout=LLM_TIMEOUT)
+            llm_requests.inc(mode="generate", result="ok")
+            return {
+                "success": True,
+                "response": result.get("response", "")
             }
             
-            self.wfile.write(json.dumps(test_data, indent=2, ensure_ascii=False).encode())
-            logger.info(f"✅ Test Manager: возвращено {len(test_data['tests'])} тестов для действия {action_id}")
-            
-        elif self.path == "/api/latest-model":
-            # Эндпоинт для получения последней сохраненной модели
-            try:
-                # Ищем JSON файлы моделей
-                model_files = []
-                for root, dirs, files in os.walk('.'):
-                    for file in files:
-                        if file.endswith('.json') and ('model' in file.lower() or file.startswith('test_project')):
-                            model_files.append(os.path.join(root, file))
-                
-                if not model_files:
-                    # Используем test_project.json как fallback
-                    with open('test_project.json', 'r', encoding='utf-8') as f:
-                        model_data = json.load(f)
-                else:
-                    # Берем самый новый файл
-                    latest_file = max(model_files, key=os.path.getmtime)
-                    with open(latest_file, 'r', encoding='utf-8') as f:
-                        model_data = json.load(f)
-                
-                self.send_response(200)
-                self.send_header("Content-Type", "application/json")
-                self._set_cors_headers()
-                self.end_headers()
-                self.wfile.write(json.dumps(model_data, ensure_ascii=False).encode())
-                
-                logger.info(f"✅ Возвращена последняя модель из {latest_file if 'latest_file' in locals() else 'test_project.json'}")
-                
-            except Exception as e:
-                logger.error(f"❌ Ошибка получения модели: {e}")
-                self.send_response(500)
-                self.send_header("Content-Type", "application/json")
-                self._set_cors_headers()
-                self.end_headers()
-                self.wfile.write(json.dumps({"error": str(e)}).encode())
-            
-        else:
-            self.send_response(404)
-            self.send_header("Content-Type", "application/json")
-            self._set_cors_headers()
-            self.end_headers()
-            self.wfile.write(json.dumps({"error": "Not found", "path": self.path}).encode())
+        except LLMUnavailableError as e:
+            # Ollama не запущен, недоступен или circuit breaker разомкнут
+            print(f"❌ Ollama недоступен: {e}")
+            llm_requests.inc(mode="generate", result="unavailable")
+            return {
+                "success": False,
+                "error": str(e)
+            }
+        except Exception as e:
+            print(f"❌ Ошибка при запросе к LLM: {e}")
+            llm_requests.inc(mode="generate", result="error")
+            return {
+                "success": False,
+                "error": str(e)
+            }
+        finally:
+            llm_request_seconds.observe(time.perf_counter() - started, mode="generate")
     
-    def do_POST(self):
-        if self.path == "/api/generate-model" or self.path == "/api/generate":
-            try:
-                content_length = int(self.headers.get('Content-Length', 0))
-                post_data = self.rfile.read(content_length)
-                data = json.loads(post_data.decode('utf-8'))
-                text = data.get('text', '')
-                model_name = data.get('model_name', 'unnamed_model')
-                
-                print(f"📥 POST /api/generate-model")
-                print(f"   📄 Текст: {text[:100]}...")
-                print(f"   🏷️  Имя модели: {model_name}")
-                
-                self.send_response(200)
-                self.send_header("Content-Type", "application/json")
-                self._set_cors_headers()
-                self.end_headers()
-                
-                # 1. Генерируем промпт для LLM
-                prompt = self.generate_llm_prompt(text)
-                print(f"   📝 Промпт для LLM (первые 200 символов): {prompt[:200]}...")
-                
-                # 2. Проверяем доступность LLM (проверяем эндпоинт здоровья Ollama)
-                print("   🤖 Проверяю доступность Ollama...")
-                
-                try:
-                    import urllib.request
-                    import socket
-                    # Пробуем подключиться к Ollama health endpoint
-                    req = urllib.request.Request("http://localhost:11434/api/tags")
-                    # Устанавливаем timeout через socket
-                    socket.setdefaulttimeout(5)
-                    try:
-                        with urllib.request.urlopen(req) as response:
-                            # Если дошли сюда - Ollama доступен
-                            print("   ✅ Ollama доступен")
-                    finally:
-                        # Всегда сбрасываем timeout
-                        socket.setdefaulttimeout(None)
-                except Exception as e:
-                    # Ollama не доступен - возвращаем ошибку
-                    error_msg = f"Ollama не доступен: {e}"
-                    print(f"   ❌ {error_msg}")
-                    
-                    self.send_response(200)
-                    self.send_header("Content-Type", "application/json")
-                    self._set_cors_headers()
-                    self.end_headers()
-                    
-                    error_response = {
-                        "success": False,
-                        "status": 503,
-                        "error": "Ollama не доступен",
-                        "details": "Для анализа ТЗ требуется запущенный Ollama с моделью llama3.2",
-                        "help": [
-                            "1. Установите Ollama: https://ollama.ai/",
-                            "2. Запустите: ollama serve",
-                            "3. Скачайте модель: ollama pull llama3.2",
-                            "4. Попробуйте снова"
-                        ]
-                    }
-                    
-                    self.wfile.write(json.dumps(error_response, indent=2, ensure_ascii=False).encode())
-                    return
-                
-                # 3. LLM доступен - отправляем реальный запрос
-                print("   🤖 Отправляю запрос к LLM для анализа ТЗ...")
-                print(f"   📄 Промпт для LLM (первые 500 символов):\n{prompt[:500]}...")
-                llm_response = self.query_llm(prompt)
-                
-                actions_data = []
-                
-                if llm_response["success"]:
-                    print("   ✅ LLM ответил успешно!")
-                    print(f"   📄 Ответ LLM (первые 500 символов):\n{llm_response['response'][:500]}...")
-                    print(f"   📏 Длина ответа LLM: {len(llm_response['response'])} символов")
-                    
-                    # 4. Парсим ответ LLM
-                    actions_data = self.parse_llm_response(llm_response["response"])
-                    
-                    print(f"   📊 Результат парсинга: {len(actions_data)} действий")
-                    
-                    if actions_data:
-                        print(f"   📋 LLM нашел {len(actions_data)} действий")
-                        
-                        # 5. Добавляем каждое действие в модель
-                        for i, action_data in enumerate(actions_data):
-                            print(f"   🔍 Обработка действия {i+1}/{len(actions_data)}...")
-                            success = self.add_action_to_model(action_data, model_name)
-                            if not success:
-                                print(f"   ❌ Ошибка при обработке действия {i+1}")
-                    else:
-                        print("   ❌ LLM не вернул корректные действия")
-                        print("   ℹ️  Возвращаю пустую модель")
-                        
-                        # Возвращаем успешный ответ с пустой моделью
-                        self.send_response(200)
-                        self.send_header("Content-Type", "application/json")
-                        self._set_cors_headers()
-                        self.end_headers()
-                        
-                        # Пустая модель
-                        empty_model = {
-                            "model_actions": [],
-                            "model_objects": [],
-                            "model_connections": []
-                        }
-                        
-                        success_response = {
-                            "success": True,
-                            "model": empty_model,
-                            "note": "LLM не смог извлечь действия из документа"
-                        }
-                        
-                        self.wfile.write(json.dumps(success_response, indent=2, ensure_ascii=False).encode())
-                        return
-                else:
-                    print(f"   ❌ Ошибка LLM: {llm_response.get('error', 'неизвестно')}")
-                    
-                    # Возвращаем ошибку LLM (всегда 200 OK)
-                    self.send_response(200)
-                    self.send_header("Content-Type", "application/json")
-                    self._set_cors_headers()
-                    self.end_headers()
-                    
-                    error_response = {
-                        "success": False,
-                        "status": 500,  # Internal Server Error в JSON
-                        "error": "Ошибка LLM",
-                        "details": llm_response.get("error", "Неизвестная ошибка LLM")
-                    }
-                    
-                    self.wfile.write(json.dumps(error_response, indent=2, ensure_ascii=False).encode())
-                    return
-                
-                # 5. Загружаем финальную модель для ответа
-                model = {
-                    "model_actions": [],
-                    "model_objects": [],
-                    "model_connections": []
-                }
-                
-                filename = f"models/{model_name}.json"
-                if os.path.exists(filename):
-                    with open(filename, 'r', encoding='utf-8') as f:
-                        model = json.load(f)
-                
-                response = {
-                    "success": True,
-                    "model": model,
-                    "statistics": {
-                        "actions": len(model.get("model_actions", [])),
-                        "objects": len(model.get("model_objects", [])),
-                        "connections": len(model.get("model_connections", []))
-                    }
-                }
-                
-                self.wfile.write(json.dumps(response, indent=2, ensure_ascii=False).encode())
-                print(f"   ✅ Ответ отправлен")
-                
-            except Exception as e:
-                logger.error(f"❌ Ошибка при генерации модели: {str(e)}")
-                self.send_response(500)
-                self.send_header("Content-Type", "application/json")
-                self._set_cors_headers()
-                self.end_headers()
-                self.wfile.write(json.dumps({"error": str(e), "status": "error"}).encode())
+    def query_llm_stream(self, prompt, cancel=None):
+        """
+        Отправляет запрос к Ollama в потоковом режиме ("stream": true)
         
-        elif self.path == "/api/generate-tests":
-            try:
-                content_length = int(self.headers.get('Content-Length', 0))
-                post_data = self.rfile.read(content_length) if content_length > 0 else b'{}'
-                data = json.loads(post_data.decode('utf-8'))
-                
-                # Получаем параметры
-                model_data = data.get('model', {})
-                action_ids = data.get('action_ids', None)  # None = все действия
-                generate_zip = data.get('generate_zip', True)
-                
-                # Если модель не предоставлена, используем последнюю сохраненную
-                if not model_data:
-                    # Ищем последний файл модели
-                    model_files = [f for f in os.listdir('.') if f.endswith('.json') and 'model' in f.lower()]
-                    if model_files:
-                        latest_model = sorted(model_files)[-1]
-                        with open(latest_model, 'r', encoding='utf-8') as f:
-                            model_data = json.load(f)
-                    else:
-                        # Используем test_project.json как fallback
-                        try:
-                            with open('test_project.json', 'r', encoding='utf-8') as f:
-                                model_data = json.load(f)
-                        except:
-                            # Используем example.json как последний fallback
-                            with open('example.json', 'r', encoding='utf-8') as f:
-                                model_data = json.load(f)
-                
-                # Импортируем адаптированный генератор тестов
-                try:
-                    sys.path.append('.')
-                    from test_generator_adapted import generate_tests as adapted_generate_tests
-                    
-                    # Обертка для совместимости
-                    def generate_tests(model, action_ids=None):
-                        tests_dict, zip_buffer, archive_name = adapted_generate_tests(model, action_ids)
-                        summary = f"Сгенерировано {len(tests_dict)} тестов с использованием адаптированного алгоритма"
-                        return tests_dict, zip_buffer, archive_name, summary
-                        
-                except ImportError as e:
-                    logger.error(f"❌ Не удалось импортировать адаптированный генератор тестов: {e}")
-                    # Создаем простой генератор inline
-                    import io
-                    import zipfile
-                    from datetime import datetime
-                    
-                    def simple_test_generator(model, selected_actions=None):
-                        # Простая заглушка
-                        tests = {}
-                        if selected_actions:
-                            for action_id in selected_actions:
-                                tests[f'test_{action_id}.md'] = f"# Test for {action_id}\n\nSimple test stub"
-                        else:
-                            tests['test_all.md'] = "# All tests\n\nSimple test stub"
-                        
-                        # Создаем ZIP
-                        zip_buffer = io.BytesIO()
-                        with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zipf:
-                            for filename, content in tests.items():
-                                zipf.writestr(filename, content.encode('utf-8'))
-                        
-                        zip_buffer.seek(0)
-                        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-                        summary = f"Сгенерировано {len(tests)} тестов с использованием простого генератора"
-                        return tests, zip_buffer, f'tests_{timestamp}.zip', summary
-                    
-                    generate_tests = simple_test_generator
-                
-                # Генерируем тесты
-                tests_dict, zip_buffer, archive_name, summary = generate_tests(model_data, action_ids)
-                
-                if generate_zip and zip_buffer:
-                    # Возвращаем ZIP архив
-                    self.send_response(200)
-                    self.send_header("Content-Type", "application/zip")
-                    self.send_header("Content-Disposition", f"attachment; filename=\"{archive_name}\"")
-                    self._set_cors_headers()
-                    self.end_headers()
-                    
-                    self.wfile.write(zip_buffer.getvalue())
-                    
-                    logger.info(f"✅ Сгенерирован ZIP архив тестов: {archive_name} ({len(tests_dict)} файлов)")
-                else:
-                    # Возвращаем JSON с информацией о тестах
-                    self.send_response(200)
-                    self.send_header("Content-Type", "application/json")
-                    self._set_cors_headers()
-                    self.end_headers()
-                    
-                    response = {
-                        "success": True,
-                        "total_tests": len(tests_dict),
-                        "files": list(tests_dict.keys()),
-                        "summary": summary,
-                        "download_url": f"/api/download-tests/{archive_name}" if zip_buffer else None
-                    }
-                    
-                    self.wfile.write(json.dumps(response, indent=2, ensure_ascii=False).encode())
-                    
-                    logger.info(f"✅ Сгенерировано {len(tests_dict)} тестов")
-                
-            except Exception as e:
-                logger.error(f"❌ Ошибка генерации тестов: {e}")
-                self.send_response(500)
-                self.send_header("Content-Type", "application/json")
-                self._set_cors_headers()
-                self.end_headers()
-                self.wfile.write(json.dumps({
-                    "success": False,
-                    "error": str(e)
-                }).encode())
+        Ollama отвечает NDJSON: по строке на порцию токенов. Если задан
+        cancel (threading.Event) и он установлен, чтение прекращается, а
+        соединение с Ollama закрывается, не дожидаясь конца генерации.
         
-        elif self.path.startswith("/api/download-tests/"):
-            # Эндпоинт для скачивания ранее сгенерированных тестов
-            try:
-                filename = self.path.replace("/api/download-tests/", "")
-                
-                # В реальной реализации здесь можно брать файл из кэша
-                # Сейчас просто возвращаем ошибку
-                self.send_response(404)
-                self.send_header("Content-Type", "application/json")
-                self._set_cors_headers()
-                self.end_headers()
-                self.wfile.write(json.dumps({
-                    "success": False,
-                    "error": "Файл не найден. Сгенерируйте тесты заново."
-                }).encode())
-                
-            except Exception as e:
-                logger.error(f"❌ Ошибка скачивания тестов: {e}")
-                self.send_response(500)
-                self.send_header("Content-Type", "application/json")
-                self._set_cors_headers()
-                self.end_headers()
-                self.wfile.write(json.dumps({"error": str(e)}).encode())
+        Yields:
+            Фрагменты текста ответа по мере генерации
         
-        else:
-            self.send_response(404)
-            self.send_header("Content-Type", "application/json")
-            self._set_cors_headers()
-            self.end_headers()
-            self.wfile.write(json.dumps({"error": "Not found", "path": self.path}).encode())
-    
-    def log_message(self, format, *args):
-        """Переопределяем логирование для вывода в наш логгер"""
-        logger.info(f"{self.address_string()} - {format % args}")
-    
-    def generate_llm_prompt(self, text):
+        Raises:
+            LLMUnavailableError если Ollama недоступен,
+            RuntimeError если Ollama вернул ошибку в потоке
         """
-        Генерирует промпт для LLM (Ollama) для анализа ТЗ
-        """
-        prompt = (
-            "Анализируй текст ТЗ и верни JSON-массив действий. Каждое действие — объект в массиве.\n"
-            "Каждый объект - это конкретная одна цель, конкретного действующего лица в конкретном месте системе\n"
-            "Формат каждого объекта: {\"action_actor\": \"кто\", \"action_action\": \"что делает(глагол в настоящем времени + объект из ТЗ   - Примеры: 'создает контакт', 'редактирует документ', 'отправляет уведомление' )\", \"action_place\": \"где (Пример: на главной странице, на форме редактирования )\", \"init_states\": [(начальные состояния объектов перед действием   - Пример: [{\"object_name\": \"контакт\", \"state_name\": \"не существует\"}]  )], \"final_states\": [конечные состояния объектов после действия  - Пример: [{\"object_name\": \"контакт\", \"state_name\": \"создан\"}] ]}\n"
-            "action_action должен быть строкой: 'глагол + объект'.\n"
-            "init_states/final_states: массив объектов {\"object_name\": \"...\", \"state_name\": \"...\"}.\n"
-            "Верни ТОЛЬКО JSON-массив без комментариев.\n\n"
-            "Текст ТЗ:\n"
-            f"{text[:1500]}"
-            "\n\n"
-            "JSON-массив действий:"
-        )
+        payload = self._llm_payload(prompt, stream=True)
+        cached = llm_cache.get(payload)
+        if cached is not None:
+            # Ответ уже есть в кэше - отдаем его одним фрагментом
+            yield cached
+            return
         
-        return prompt
-    
-    def query_llm(self, prompt):
-        """
-        Отправляет запрос к Ollama LLM (без внешних зависимостей)
-        """
+        parts = []
+        started = time.perf_counter()
+        # incomplete - поток закончился без "done" или клиент перестал читать
+        result = "incomplete"
+        
+        # timeout ограничивает паузу между порциями, а не всю генерацию
+        stream = ollama_client.generate_stream(payload, timeout=LLM_TIMEOUT)
         try:
-            # Используем встроенные модули
-            import urllib.request
-            import json as json_module
-            
-            ollama_url = "http://localhost:11434/api/generate"
-            
-            payload = {
-                "model": "llama3.2",
-                "prompt": prompt,
-                "stream": False,
-                "options": {
-                    "temperature": 0.3,
-                    "num_predict": 2000  # Увеличили для больших ответов
-                }
-            }
-            
-            # Создаем HTTP запрос
-            data = json_module.dumps(payload).encode('utf-8')
-            req = urllib.request.Request(
-                ollama_url,
-                data=data,
-                headers={'Content-Type': 'application/json'},
-                method='POST'
-            )
-            
-            # Отправляем запрос
-            with urllib.request.urlopen(req, timeout=30) as response:
-                response_data = response.read().decode('utf-8')
-                result = json_module.loads(response_data)
-                
-                return {
-                    "success": True,
-                    "response": result.get("response", "")
-                }
+            for chunk in stream:
+                if cancel is not None and cancel.is_set():
+                    result = "cancelled"
+                    break
+                if chunk.get("error"):
+                    raise RuntimeError(chunk["error"])
                 
-        except urllib.error.URLError as e:
-            # Ollama не запущен или недоступен
-            print(f"❌ Ollama недоступен: {e}")
-            return {
-                "success": False,
-                "error": f"Ollama недоступен: {e}"
-            }
-        except Exception as e:
-            print(f"❌ Ошибка при запросе к LLM: {e}")
-            return {
-                "success": False,
-                "error": str(e)
-            }
+                fragment = chunk.get("response", "")
+                if fragment:
+                    parts.append(fragment)
+                    yield fragment
+                if chunk.get("done"):
+                    # В кэш попадает только полностью полученный ответ
+                    llm_cache.put(payload, "".join(parts))
+                    result = "ok"
+                    break
+        except LLMUnavailableError:
+            result = "unavailable"
+            raise
+        except Exception:
+            result = "error"
+            raise
+        finally:
+            # Брошенный поток закрывает соединение (см. OllamaClient.generate_stream)
+            stream.close()
+            llm_requests.inc(mode="stream", result=result)
+            llm_request_seconds.observe(time.perf_counter() - started, mode="stream")
     
     def _fix_incomplete_json(self, json_str):
         """
@@ -701,7 +618,19 @@ class SimpleAPIHandler(http.server.BaseHTTPRequestHandler):
     def parse_llm_response(self, response):
         """
         Парсит ответ LLM и извлекает массив действий
+        
+        Время разбора и его исход (найдены ли действия) учитываются в метриках.
         """
+        started = time.perf_counter()
+        with tracing.span("parse", chars=len(response)) as attrs:
+            actions = self._parse_llm_response(response)
+            attrs["actions"] = len(actions)
+        llm_parse_seconds.observe(time.perf_counter() - started)
+        llm_parse_results.inc(result="actions" if actions else "empty")
+        return actions
+    
+    def _parse_llm_response(self, response):
+        """Тело parse_llm_response"""
         try:
             print(f"🔄 Начинаю парсинг ответа LLM...")
             print(f"📏 Длина ответа для парсинга: {len(response)} символов")
@@ -797,24 +726,28 @@ class SimpleAPIHandler(http.server.BaseHTTPRequestHandler):
             # Пытаемся "починить" неполный JSON
             try:
                 # Ищем и закрываем незакрытые массивы/объекты
-                fixed_response = self._fix_incomplete_json(response)
+                with tracing.span("fix_json"):
+                    fixed_response = self._fix_incomplete_json(response)
                 print(f"🔄 Пытаюсь исправить JSON...")
                 data = json.loads(fixed_response)
                 
                 if isinstance(data, list):
                     print(f"✅ Удалось исправить JSON, найдено {len(data)} действий")
+                    llm_json_repairs.inc(result="fixed")
                     return data
                 else:
                     print(f"❌ Исправленный JSON не является массивом")
+                    llm_json_repairs.inc(result="failed")
                     return []
             except Exception as fix_error:
                 print(f"❌ Не удалось исправить JSON: {fix_error}")
+                llm_json_repairs.inc(result="failed")
                 return []
         except Exception as e:
             print(f"❌ Ошибка при парсинге LLM ответа: {e}")
             return []
     
-    def add_action_to_model(self, action_data, model_name):
+    def add_action_to_model(self, action_data, model_name, normalized=False):
         """
         Добавляет действие в модель с правильными ID и структурой
         
@@ -825,304 +758,1664 @@ class SimpleAPIHandler(http.server.BaseHTTPRequestHandler):
             "init_states": [{"object_name": "пользователь", "state_name": "авторизован"}],
             "final_states": [{"object_name": "задача", "state_name": "создана"}]
         }
+        
+        normalized=True - action_data уже прошло _normalize_action_data
+        и повторно не нормализуется.
+        
+        Возвращает action_id добавленного (или уже существующего) действия,
+        False при ошибке.
         """
+        started = time.perf_counter()
         try:
-            # 1. Загружаем существующую модель или создаем новую
-            filename = f"models/{model_name}.json"
+            with tracing.span("add_action"), model_store.lock(model_name):
+                action_id = self._add_action_to_model_locked(action_data, model_name, normalized)
+            model_merged_actions.inc(operation="add_action")
+            return action_id
+            
+        except Exception as e:
+            print(f"❌ Ошибка при добавлении действия в модель: {e}")
+            import traceback
+            traceback.print_exc()
+            return False
+        finally:
+            # Вместе с ожиданием блокировки модели
+            model_merge_seconds.observe(time.perf_counter() - started, operation="add_action")
+    
+    def _new_model(self, model_name):
+        """Пустая модель для первого сохранения"""
+        return {
+            "version": "1.0",
+            "metadata": {
+                "name": model_name,
+                "generated_at": datetime.datetime.now().isoformat(),
+                "source": "api_main.py",
+                "chunks_processed": 1
+            },
+            "model_actions": [],
+            "model_objects": [],
+            "model_connections": []
+        }
+    
+    def _add_action_to_model_locked(self, action_data, model_name, normalized=False):
+        """Тело add_action_to_model; вызывается под model_store.lock(model_name)"""
+        # 1. Загружаем существующую модель из памяти или создаем новую
+        filename = model_store.path_for(model_name)
+        model = model_store.get(model_name)
+        
+        if model is None:
+            model = self._new_model(model_name)
+            model_store.put(model_name, model)
+        
+        # Индексы по естественным ключам и счетчики ID (строятся один раз на модель)
+        index = model_store.index(model_name, model)
+        
+        # 2. Логируем полученные данные
+        print(f"   🔍 Получены данные действия:")
+        print(f"   Keys: {list(action_data.keys())}")
+        print(f"   Data: {json.dumps(action_data, ensure_ascii=False)[:200]}...")
+        
+        # 3. Нормализуем ключи (обрабатываем разные форматы от LLM)
+        normalized_data = action_data if normalized else self._normalize_action_data(action_data)
+        print(f"   🔧 Нормализованные данные: {json.dumps(normalized_data, ensure_ascii=False)[:200]}...")
+        
+        action_id = self._apply_action(index, normalized_data)
+        
+        # Сохраняем модель в памяти; запись на диск - model_store.flush()
+        model_store.put(model_name, model, index=index)
+        
+        print(f"   💾 Модель обновлена: {filename}")
+        return action_id
+    
+    def _apply_action(self, index, normalized_data):
+        """
+        Добавляет нормализованное действие, его объекты, состояния и связи
+        в модель index.model
+        
+        Returns:
+            action_id добавленного (или уже существующего) действия
+        """
+        actor = normalized_data["action_actor"]
+        action = normalized_data["action_action"]
+        place = normalized_data.get("action_place", "")
+        
+        # 1. Проверяем, существует ли уже такое действие
+        action_id = index.find_action(actor, action, place)
+        if action_id:
+            print(f"   🔄 Действие уже существует: {action_id}")
+        
+        # 2. Если действие новое, создаем его
+        if not action_id:
+            # Создаем действие с полями для графа
+            action_label = f"{actor} {action}"
+            if place:
+                action_label += f" ({place})"
+            
+            new_action = index.add_action({
+                # Новая структура
+                "action_actor": actor,
+                "action_action": action,
+                "action_place": place,
+                # Совместимость со старым кодом (для graph-manager.js)
+                "action_name": action_label,  # ← ДЛЯ ГРАФА!
+                "action_links": {
+                    "manual": "Из LLM анализа",
+                    "API": "",
+                    "UI": ""
+                }
+            })
+            action_id = new_action["action_id"]
+            # Дополнительные поля для графа
+            new_action["graph_data"] = {
+                "id": action_id,
+                "label": action_label,
+                "type": "action",
+                "actor": actor,
+                "action": action,
+                "place": place
+            }
+            
+            print(f"   ✅ Создано новое действие: {action_id}")
+        
+        # 3. Обрабатываем init_states и final_states
+        all_state_pairs = []
+        
+        if normalized_data.get("init_states"):
+            for state in normalized_data["init_states"]:
+                all_state_pairs.append({
+                    "type": "init",
+                    "object_name": state.get("object_name", "объект"),
+                    "state_name": state.get("state_name", "начальное состояние")
+                })
+            print(f"   📋 Найдено {len(normalized_data['init_states'])} начальных состояний")
+        
+        if normalized_data.get("final_states"):
+            for state in normalized_data["final_states"]:
+                all_state_pairs.append({
+                    "type": "final",
+                    "object_name": state.get("object_name", "объект"),
+                    "state_name": state.get("state_name", "конечное состояние")
+                })
+            print(f"   📋 Найдено {len(normalized_data['final_states'])} конечных состояний")
+        
+        # 4. Для каждого состояния находим или создаем объект и состояние
+        for state_pair in all_state_pairs:
+            obj_name = state_pair["object_name"]
+            state_name = state_pair["state_name"]
+            
+            # Ищем существующий объект, иначе создаем новый
+            obj_found = index.find_object(obj_name)
+            if not obj_found:
+                obj_found = index.add_object(obj_name)
+                print(f"   ✅ Создан новый объект: {obj_name} ({obj_found['object_id']})")
+            
+            # Ищем существующее состояние в объекте, иначе создаем новое
+            state_id = index.find_state(obj_found, state_name)
+            if not state_id:
+                state_id = index.add_state(obj_found, state_name)
+                print(f"   ✅ Добавлено новое состояние: {obj_name}.{state_name} ({state_id})")
+            
+            # 5. Создаем связь
+            if state_pair["type"] == "init":
+                # init_state → action
+                connection = {
+                    "connection_out": f"{obj_found['object_id']}{state_id}",
+                    "connection_in": action_id,
+                    "description": f"{obj_name} {state_name} → {actor} {action}",
+                    "type": "triggers"
+                }
+            else:  # final
+                # action → final_state
+                connection = {
+                    "connection_out": action_id,
+                    "connection_in": f"{obj_found['object_id']}{state_id}",
+                    "description": f"{actor} {action} → {obj_name} {state_name}",
+                    "type": "results_in"
+                }
+            
+            # Проверяем, не существует ли уже такая связь
+            if not index.has_connection(connection["connection_out"], connection["connection_in"]):
+                index.add_connection(connection)
+                print(f"   🔗 Создана связь: {connection['description']}")
+        
+        return action_id
+    
+    def merge_actions_into_model(self, actions_data, model_name, on_progress=None):
+        """
+        Сливает весь результат LLM в модель одной транзакцией
+        
+        Все действия нормализуются заранее; некорректные пропускаются.
+        Изменения применяются к копии модели с общим индексом объектов и
+        состояний и подменяют модель в хранилище только если прошли целиком,
+        после чего модель один раз записывается на диск. Ошибка посередине
+        оставляет модель в памяти и на диске без изменений.
+        
+        Args:
+            actions_data: Список действий из parse_llm_response
+            model_name: Имя модели (models/{model_name}.json)
+            on_progress: Необязательный callback(processed, total)
+            
+        Returns:
+            {"success": True, "model": копия модели, "action_ids": [...], "skipped": [...]}
+            или {"success": False, "error": ...}
+        """
+        # 1. Нормализуем все действия до изменения модели
+        normalized_actions = []
+        skipped = []
+        for i, action_data in enumerate(actions_data):
+            try:
+                if not isinstance(action_data, dict):
+                    raise ValueError(f"ожидался объект, получено {type(action_data).__name__}")
+                normalized_actions.append(self._normalize_action_data(action_data))
+            except Exception as e:
+                print(f"   ⚠️  Действие {i+1} пропущено: {e}")
+                skipped.append({"index": i, "error": str(e)})
+        
+        total = len(normalized_actions)
+        
+        with model_store.lock(model_name):
+            # 2. Применяем действия к рабочей копии модели
+            current = model_store.get(model_name)
+            working = copy.deepcopy(current) if current is not None else self._new_model(model_name)
+            index = ModelIndex(working)
+            
+            action_ids = []
+            try:
+                for i, normalized_data in enumerate(normalized_actions):
+                    print(f"   🔍 Обработка действия {i+1}/{total}...")
+                    action_ids.append(self._apply_action(index, normalized_data))
+                    if on_progress:
+                        on_progress(i + 1, total)
+            except Exception as e:
+                print(f"❌ Ошибка при слиянии действий, модель не изменена: {e}")
+                import traceback
+                traceback.print_exc()
+                return {"success": False, "error": str(e)}
+            
+            # 3. Фиксируем результат и записываем модель один раз
+            model_store.put(model_name, working, index=index)
+            model_store.flush(model_name)
+            model = copy.deepcopy(working)
+        
+        print(f"   💾 Модель обновлена: {model_store.path_for(model_name)} ({len(action_ids)} действий)")
+        return {
+            "success": True,
+            "model": model,
+            "action_ids": action_ids,
+            "skipped": skipped
+        }
+    
+    def simple_text_analysis(self, text):
+        """
+        УПРАЗДНЕН - теперь используем LLM анализ
+        """
+        print("⚠️  simple_text_analysis УПРАЗДНЕН")
+        print("   Используйте LLM анализ через generate_llm_prompt()")
+        return {
+            "model_actions": [],
+            "model_objects": [],
+            "model_connections": [],
+            "analysis_metadata": {
+                "analysis_method": "deprecated",
+                "warning": "Используйте LLM анализ"
+            }
+        }
+    
+    def save_model_to_file(self, model, model_name):
+        """Сохраняет модель в файл JSON"""
+        try:
+            # Создаем папку models если ее нет
+            if not os.path.exists(model_store.directory):
+                os.makedirs(model_store.directory)
+                print("📁 Создана папка models")
+            
+            # Формируем полную модель с метаданными
+            full_model = {
+                "version": "1.0",
+                "metadata": {
+                    "name": model_name,
+                    "generated_at": datetime.datetime.now().isoformat(),
+                    "source": "api_main.py",
+                    "chunks_processed": 1
+                },
+                "model_actions": model.get("model_actions", []),
+                "model_objects": model.get("model_objects", []),
+                "model_connections": model.get("model_connections", [])
+            }
+            
+            # Сохраняем в файл
+            filename = model_store.path_for(model_name)
+            with model_store.lock(model_name):
+                model_store.put(model_name, full_model)
+                model_store.flush(model_name)
+            
+            print(f"   💾 Модель сохранена: {filename}")
+            return filename
+            
+        except Exception as e:
+            print(f"❌ Ошибка при сохранении модели: {e}")
+            return None
+    
+    def check_llm_available(self):
+        """
+        Проверяет доступность Ollama через эндпоинт /api/tags
+        
+        Результат кэшируется клиентом на OLLAMA_HEALTH_TTL секунд, поэтому
+        каждый запрос генерации не делает отдельный проверочный запрос.
+        
+        Returns:
+            (доступен, текст ошибки или None)
+        """
+        with tracing.span("tags_probe") as attrs:
+            available, error = ollama_client.health()
+            attrs["available"] = available
+        return available, error
+    
+    def query_llm_chunks(self, prompts, concurrency=DEFAULT_LLM_CONCURRENCY, on_complete=None):
+        """
+        Отправляет промпты в LLM параллельно, не более concurrency запросов одновременно
+        
+        Args:
+            prompts: Список промптов
+            concurrency: Максимальное число одновременных запросов
+            on_complete: Необязательный callback(completed_count) после каждого ответа
+            
+        Returns:
+            Список ответов query_llm в порядке промптов
+        """
+        results = [None] * len(prompts)
+        workers = max(1, min(int(concurrency), len(prompts)))
+        
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers, thread_name_prefix="llm-chunk") as executor:
+            query_llm = tracing.bind(self.query_llm)
+            futures = {executor.submit(query_llm, prompt): i for i, prompt in enumerate(prompts)}
+            for completed, future in enumerate(concurrent.futures.as_completed(futures), 1):
+                index = futures[future]
+                try:
+                    results[index] = future.result()
+                except Exception as e:
+                    results[index] = {"success": False, "error": str(e)}
+                if on_complete:
+                    on_complete(completed)
+        
+        return results
+    
+    def run_generation_pipeline(self, text, model_name, on_stage=None,
+                                llm_concurrency=None, chunk_size=None):
+        """
+        Выполняет полный цикл генерации модели по тексту ТЗ
+        
+        Документ длиннее chunk_size режется на части, которые отправляются
+        в LLM параллельно (не более llm_concurrency запросов одновременно).
+        Действия из всех частей сливаются в одну модель в порядке частей.
+        
+        Args:
+            text: Текст ТЗ
+            model_name: Имя модели (models/{model_name}.json)
+            on_stage: Необязательный callback(stage, **details), вызывается
+                при переходе к этапам prompt, llm, parse, merge
+            llm_concurrency: Число одновременных запросов к LLM
+                (по умолчанию LLM_CONCURRENCY или 4)
+            chunk_size: Максимальный размер части текста (по умолчанию PROMPT_TEXT_LIMIT)
+            
+        Returns:
+            dict - тело ответа /api/generate-model
+        """
+        def report(stage, **details):
+            if on_stage:
+                on_stage(stage, **details)
+        
+        if llm_concurrency is None:
+            llm_concurrency = DEFAULT_LLM_CONCURRENCY
+        chunk_size = min(int(chunk_size or PROMPT_TEXT_LIMIT), PROMPT_TEXT_LIMIT)
+        
+        # 1. Генерируем промпты для LLM (по одному на часть документа)
+        chunks = split_text_into_chunks(text, chunk_size)
+        report("prompt", chunks=len(chunks))
+        prompts = [self.generate_llm_prompt(chunk) for chunk in chunks]
+        print(f"   📋 Текст разбит на {len(chunks)} частей")
+        print(f"   📝 Промпт для LLM (первые 200 символов): {prompts[0][:200]}...")
+        
+        # 2. Проверяем доступность LLM (проверяем эндпоинт здоровья Ollama)
+        report("llm", completed=0, chunks=len(chunks))
+        print("   🤖 Проверяю доступность Ollama...")
+        available, probe_error = self.check_llm_available()
+        if not available:
+            # Ollama не доступен - возвращаем ошибку
+            print(f"   ❌ Ollama не доступен: {probe_error}")
+            return {
+                "success": False,
+                "status": 503,
+                "error": "Ollama не доступен",
+                "details": "Для анализа ТЗ требуется запущенный Ollama с моделью llama3.2",
+                "help": [
+                    "1. Установите Ollama: https://ollama.ai/",
+                    "2. Запустите: ollama serve",
+                    "3. Скачайте модель: ollama pull llama3.2",
+                    "4. Попробуйте снова"
+                ]
+            }
+        print("   ✅ Ollama доступен")
+        
+        # 3. LLM доступен - отправляем реальные запросы
+        print(f"   🤖 Отправляю {len(prompts)} запросов к LLM (одновременно до {llm_concurrency})...")
+        with tracing.span("llm_chunks", chunks=len(chunks), concurrency=llm_concurrency):
+            llm_responses = self.query_llm_chunks(
+                prompts,
+                concurrency=llm_concurrency,
+                on_complete=lambda completed: report("llm", completed=completed, chunks=len(chunks))
+            )
+        
+        failed_chunks = [
+            {"chunk": i + 1, "length": len(chunks[i]), "error": llm_response.get("error", "неизвестно")}
+            for i, llm_response in enumerate(llm_responses)
+            if not llm_response["success"]
+        ]
+        
+        if len(failed_chunks) == len(chunks):
+            print(f"   ❌ Ошибка LLM: {failed_chunks[0]['error']}")
+            return {
+                "success": False,
+                "status": 500,  # Internal Server Error в JSON
+                "error": "Ошибка LLM",
+                "details": failed_chunks[0]["error"]
+            }
+        
+        print("   ✅ LLM ответил успешно!")
+        if failed_chunks:
+            print(f"   ⚠️  Не удалось обработать частей: {len(failed_chunks)}")
+        
+        # 4. Парсим ответы LLM
+        report("parse")
+        actions_data = []
+        for llm_response in llm_responses:
+            if llm_response["success"]:
+                print(f"   📏 Длина ответа LLM: {len(llm_response['response'])} символов")
+                actions_data.extend(self.parse_llm_response(llm_response["response"]))
+        print(f"   📊 Результат парсинга: {len(actions_data)} действий")
+        
+        chunk_stats = None
+        if len(chunks) > 1:
+            chunk_stats = {
+                "total": len(chunks),
+                "processed": len(chunks) - len(failed_chunks),
+                "failed": failed_chunks,
+                "llm_concurrency": llm_concurrency
+            }
+        
+        if not actions_data:
+            print("   ❌ LLM не вернул корректные действия")
+            print("   ℹ️  Возвращаю пустую модель")
+            response = {
+                "success": True,
+                "model": {
+                    "model_actions": [],
+                    "model_objects": [],
+                    "model_connections": []
+                },
+                "note": "LLM не смог извлечь действия из документа"
+            }
+            if chunk_stats:
+                response["chunks"] = chunk_stats
+            return response
+        
+        print(f"   📋 LLM нашел {len(actions_data)} действий")
+        
+        # 5. Сливаем все действия в модель одной транзакцией
+        report("merge", processed=0, total=len(actions_data))
+        with model_merge_seconds.time(operation="merge_actions"), tracing.span("merge", actions=len(actions_data)):
+            merge_result = self.merge_actions_into_model(
+                actions_data,
+                model_name,
+                on_progress=lambda processed, total: report("merge", processed=processed, total=total)
+            )
+        if not merge_result["success"]:
+            return {
+                "success": False,
+                "status": 500,
+                "error": "Ошибка при слиянии действий в модель",
+                "details": merge_result["error"]
+            }
+        model = merge_result["model"]
+        model_merged_actions.inc(len(merge_result["action_ids"]), operation="merge_actions")
+        
+        response = {
+            "success": True,
+            "model": model,
+            "statistics": {
+                "actions": len(model.get("model_actions", [])),
+                "objects": len(model.get("model_objects", [])),
+                "connections": len(model.get("model_connections", []))
+            }
+        }
+        if merge_result["skipped"]:
+            response["skipped_actions"] = merge_result["skipped"]
+        if chunk_stats:
+            response["chunks"] = chunk_stats
+        return response
+    
+    def _actions_from_stream_object(self, obj):
+        """Возвращает действия из объекта, выделенного ActionStreamParser"""
+        if not isinstance(obj, dict):
+            return []
+        if any(key in obj for key in ("action_actor", "actor", "action_action", "action")):
+            return [obj]
+        # Обертка вида {"actions": [...]} - разбираем как обычный ответ
+        return self.parse_llm_response(json.dumps(obj, ensure_ascii=False))
+    
+    def run_streaming_pipeline(self, text, model_name, emit,
+                               llm_concurrency=None, chunk_size=None):
+        """
+        Генерирует модель в потоковом режиме
+        
+        Ответ Ollama читается по мере генерации, каждое действие добавляется в
+        модель сразу после закрывающей скобки и сообщается клиенту. Части
+        длинного документа обрабатываются параллельно, поэтому при нескольких
+        частях действия сливаются в порядке поступления.
+        
+        Args:
+            text: Текст ТЗ
+            model_name: Имя модели (models/{model_name}.json)
+            emit: callback(event, data) для отправки события клиенту
+                (stage, action, chunk, error, done)
+            llm_concurrency: Число одновременных запросов к LLM
+            chunk_size: Максимальный размер части текста
+            
+        Returns:
+            dict - итоговый ответ (тот же формат, что у /api/generate-model)
+        """
+        if llm_concurrency is None:
+            llm_concurrency = DEFAULT_LLM_CONCURRENCY
+        chunk_size = min(int(chunk_size or PROMPT_TEXT_LIMIT), PROMPT_TEXT_LIMIT)
+        
+        chunks = split_text_into_chunks(text, chunk_size)
+        prompts = [self.generate_llm_prompt(chunk) for chunk in chunks]
+        emit("stage", {"stage": "prompt", "chunks": len(chunks)})
+        
+        available, probe_error = self.check_llm_available()
+        if not available:
+            print(f"   ❌ Ollama не доступен: {probe_error}")
+            response = {
+                "success": False,
+                "status": 503,
+                "error": "Ollama не доступен",
+                "details": "Для анализа ТЗ требуется запущенный Ollama с моделью llama3.2"
+            }
+            emit("error", response)
+            return response
+        
+        emit("stage", {"stage": "llm", "chunks": len(chunks)})
+        events = queue.Queue()
+        # Устанавливается, когда результат больше не нужен (клиент отключился)
+        cancelled = threading.Event()
+        
+        def stream_chunk(index, prompt):
+            parser = ActionStreamParser()
+            found = 0
+            try:
+                with tracing.span("llm_stream", chunk=index + 1) as attrs:
+                    for fragment in self.query_llm_stream(prompt, cancel=cancelled):
+                        for obj in parser.feed(fragment):
+                            for action_data in self._actions_from_stream_object(obj):
+                                events.put(("action", index, action_data))
+                                found += 1
+                    attrs["actions"] = found
+                if cancelled.is_set():
+                    return
+                
+                # Поток не дал ни одного целого объекта - разбираем текст целиком
+                # (parse_llm_response умеет чинить обрезанный JSON)
+                if found == 0:
+                    for action_data in self.parse_llm_response(parser.text):
+                        events.put(("action", index, action_data))
+                events.put(("chunk_done", index, None))
+            except Exception as e:
+                events.put(("chunk_done", index, str(e)))
+        
+        workers = max(1, min(int(llm_concurrency), len(prompts)))
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers, thread_name_prefix="llm-stream")
+        failed_chunks = []
+        merged = 0
+        
+        try:
+            for index, prompt in enumerate(prompts):
+                executor.submit(tracing.bind(stream_chunk), index, prompt)
+            
+            pending = len(prompts)
+            while pending:
+                kind, index, payload = events.get()
+                
+                if kind == "action":
+                    # Одна нормализация и для события, и для слияния в модель
+                    action_data = self._normalize_action_data(payload)
+                    action_id = self.add_action_to_model(action_data, model_name, normalized=True)
+                    if not action_id:
+                        continue
+                    merged += 1
+                    emit("action", {
+                        "chunk": index + 1,
+                        "action_id": action_id,
+                        "action": action_data,
+                        "merged": merged
+                    })
+                else:
+                    pending -= 1
+                    if payload:
+                        print(f"   ❌ Ошибка потока LLM (часть {index + 1}): {payload}")
+                        failed_chunks.append({"chunk": index + 1, "length": len(chunks[index]), "error": payload})
+                    emit("chunk", {
+                        "chunk": index + 1,
+                        "completed": len(prompts) - pending,
+                        "chunks": len(prompts),
+                        "error": payload
+                    })
+        finally:
+            # Уже запущенные части останавливаются по cancelled и отпускают соединения
+            cancelled.set()
+            executor.shutdown(wait=False, cancel_futures=True)
+        
+        if len(failed_chunks) == len(chunks):
+            response = {
+                "success": False,
+                "status": 500,
+                "error": "Ошибка LLM",
+                "details": failed_chunks[0]["error"]
+            }
+            emit("error", response)
+            return response
+        
+        with model_store.lock(model_name):
+            model_store.flush(model_name)
+            model = model_store.snapshot(model_name) or {
+                "model_actions": [],
+                "model_objects": [],
+                "model_connections": []
+            }
+        
+        response = {
+            "success": True,
+            "model": model,
+            "statistics": {
+                "actions": len(model.get("model_actions", [])),
+                "objects": len(model.get("model_objects", [])),
+                "connections": len(model.get("model_connections", []))
+            }
+        }
+        if merged == 0:
+            response["note"] = "LLM не смог извлечь действия из документа"
+        if len(chunks) > 1:
+            response["chunks"] = {
+                "total": len(chunks),
+                "processed": len(chunks) - len(failed_chunks),
+                "failed": failed_chunks,
+                "llm_concurrency": llm_concurrency
+            }
+        emit("done", response)
+        return response
+
+
+class GenerationJobManager:
+    """
+    Фоновые задачи генерации модели.
+    
+    POST /api/jobs/generate-model сразу возвращает job_id, а конвейер
+    выполняется в отдельном пуле. Клиент опрашивает статус (текущий этап:
+    queued, prompt, llm, parse, merge, done) и забирает результат, не держа
+    HTTP соединение открытым на время запроса к LLM.
+    """
+    
+    def __init__(self, service, workers=DEFAULT_JOB_WORKERS, max_finished_jobs=200):
+        self.service = service
+        self.max_finished_jobs = max_finished_jobs
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=max(1, int(workers)),
+            thread_name_prefix="generation-job"
+        )
+        self._jobs = OrderedDict()
+        self._results = {}
+        self._lock = threading.Lock()
+    
+    def submit(self, text, model_name, **options):
+        """
+        Ставит генерацию в очередь и возвращает статус новой задачи
+        
+        options передаются в run_generation_pipeline (llm_concurrency, chunk_size)
+        """
+        job_id = uuid.uuid4().hex
+        job = {
+            "job_id": job_id,
+            "model_name": model_name,
+            "status": "queued",
+            "stage": "queued",
+            "progress": {},
+            "text_length": len(text),
+            "created_at": datetime.datetime.now().isoformat(),
+            "started_at": None,
+            "finished_at": None,
+            "error": None
+        }
+        
+        with self._lock:
+            self._jobs[job_id] = job
+            self._prune_finished()
+        
+        trace = tracing.current()
+        self._executor.submit(self._run_job, job_id, text, model_name, options,
+                              trace.request_id if trace is not None else None)
+        logger.info(f"📥 Задача генерации {job_id} поставлена в очередь (модель: {model_name})")
+        return self.get_status(job_id)
+    
+    def _run_job(self, job_id, text, model_name, options, parent_id=None):
+        self._update(job_id, status="running", started_at=datetime.datetime.now().isoformat())
+        
+        def on_stage(stage, **details):
+            self._update(job_id, stage=stage, progress=details)
+        
+        # Задача - отдельная трасса; parent_id связывает ее с запросом постановки
+        trace = tracing.Trace(job_id, "job", parent_id=parent_id, model_name=model_name)
+        try:
+            with tracing.activate(trace):
+                result = self.service.run_generation_pipeline(text, model_name, on_stage=on_stage, **options)
+            error = None if result.get("success") else result.get("error")
+        except Exception as e:
+            logger.error(f"❌ Ошибка в задаче генерации {job_id}: {e}")
+            result = {"success": False, "status": 500, "error": str(e)}
+            error = str(e)
+        trace.finish(error=error)
+        trace_log.write(trace)
+        
+        with self._lock:
+            self._results[job_id] = result
+        self._update(
+            job_id,
+            status="failed" if error else "done",
+            stage="done",
+            error=error,
+            finished_at=datetime.datetime.now().isoformat()
+        )
+        logger.info(f"✅ Задача генерации {job_id} завершена: {'ошибка' if error else 'успешно'}")
+    
+    def _update(self, job_id, **fields):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                job.update(fields)
+    
+    def _prune_finished(self):
+        """Удаляет самые старые завершенные задачи сверх лимита (вызывается под блокировкой)"""
+        finished = [job_id for job_id, job in self._jobs.items() if job["status"] in ("done", "failed")]
+        for job_id in finished[:max(0, len(finished) - self.max_finished_jobs)]:
+            del self._jobs[job_id]
+            self._results.pop(job_id, None)
+    
+    def get_status(self, job_id):
+        """Возвращает копию статуса задачи или None"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            status = dict(job)
+            status["progress"] = dict(job["progress"])
+        status["status_url"] = f"/api/jobs/{job_id}"
+        status["result_url"] = f"/api/jobs/{job_id}/result"
+        return status
+    
+    def get_result(self, job_id):
+        """Возвращает результат завершенной задачи или None"""
+        with self._lock:
+            return self._results.get(job_id)
+    
+    def list_jobs(self):
+        """Возвращает статусы всех известных задач, от новых к старым"""
+        with self._lock:
+            job_ids = list(self._jobs.keys())
+        statuses = [self.get_status(job_id) for job_id in reversed(job_ids)]
+        return [status for status in statuses if status is not None]
+
+
+generation_jobs = GenerationJobManager(ModelGenerationService())
+
+
+def tests_summary(total_tests, report):
+    """Текстовая сводка генерации тестов по отчету truncation_report()"""
+    summary = f"Сгенерировано {total_tests} тестов с использованием адаптированного алгоритма"
+    if not report:
+        return summary
+    if report["truncated"]:
+        summary += f" (сценарии обрезаны для {len(report['truncated_actions'])} действий)"
+    if report.get("precheck") and report["precheck"]["action"] == "capped":
+        summary += (f"; модель дает {report['precheck']['total_scenarios']} сценариев, "
+                    f"лимит на действие уменьшен до {report['precheck']['max_scenarios_per_action']}")
+    if report.get("sampling"):
+        summary += (f"; случайная выборка до {report['sampling']['sample_size']} сценариев "
+                    f"на действие (seed={report['sampling']['seed']})")
+    if report.get("coverage"):
+        coverage = report["coverage"]
+        summary += (f"; выбрано {coverage['selected']} из {coverage['candidates']} сценариев, "
+                    f"покрытие действий {coverage['actions']['ratio']:.0%}, "
+                    f"переходов {coverage['transitions']['ratio']:.0%}")
+    return summary
+
+
+class ChunkedWriter:
+    """
+    Файлоподобная запись в сокет блоками chunked transfer encoding
+    
+    Мелкие записи (заголовки ZIP) копятся в буфере и уходят блоками
+    не меньше buffer_size. Без chunked данные пишутся как есть. Если
+    задан copy_to, те же байты пишутся и туда (архив для кэша).
+    """
+    
+    def __init__(self, wfile, chunked=True, buffer_size=64 * 1024, copy_to=None):
+        self.wfile = wfile
+        self.chunked = chunked
+        self.buffer_size = buffer_size
+        self.copy_to = copy_to
+        self.buffer = bytearray()
+        self.bytes_written = 0
+    
+    def write(self, data):
+        self.buffer += data
+        if len(self.buffer) >= self.buffer_size:
+            self._send_buffer()
+        return len(data)
+    
+    def flush(self):
+        self._send_buffer()
+        self.wfile.flush()
+    
+    def _send_buffer(self):
+        if not self.buffer:
+            return
+        if self.copy_to is not None:
+            self.copy_to.write(self.buffer)
+        if self.chunked:
+            self.wfile.write(f"{len(self.buffer):x}\r\n".encode("ascii"))
+            self.wfile.write(self.buffer)
+            self.wfile.write(b"\r\n")
+        else:
+            self.wfile.write(self.buffer)
+        self.bytes_written += len(self.buffer)
+        self.buffer = bytearray()
+    
+    def close(self, trailers=None):
+        """Дописывает буфер и завершающий блок с трейлерами"""
+        self._send_buffer()
+        if self.chunked:
+            self.wfile.write(b"0\r\n")
+            for name, value in (trailers or {}).items():
+                self.wfile.write(f"{name}: {value}\r\n".encode("latin-1"))
+            self.wfile.write(b"\r\n")
+        self.wfile.flush()
+
+
+class SimpleAPIHandler(ModelGenerationService, http.server.BaseHTTPRequestHandler):
+    
+    def send_response(self, code, message=None):
+        """Запоминает статус ответа для метрик"""
+        self.response_status = code
+        super().send_response(code, message)
+    
+    def end_headers(self):
+        """Добавляет к заголовкам ответа ID запроса и время этапов трассы (Server-Timing)"""
+        trace = getattr(self, "trace", None)
+        if trace is not None:
+            self.send_header("X-Request-ID", trace.request_id)
+            self.send_header("Server-Timing", trace.server_timing())
+        super().end_headers()
+    
+    def _set_cors_headers(self):
+        """Устанавливает CORS заголовки"""
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.send_header("Access-Control-Allow-Methods", "GET, POST, OPTIONS")
+        self.send_header("Access-Control-Allow-Headers", "Content-Type, X-Request-ID")
+        self.send_header("Access-Control-Expose-Headers",
+                         "Content-Disposition, X-Tests-Truncated, X-Tests-Cache, X-Request-ID, Server-Timing")
+        self.send_header("Timing-Allow-Origin", "*")
+    
+    def _send_json(self, status, payload):
+        """Отправляет JSON ответ с CORS заголовками"""
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self._set_cors_headers()
+        self.end_headers()
+        self.wfile.write(json.dumps(payload, indent=2, ensure_ascii=False).encode())
+    
+    def _stream_tests_zip(self, generator, action_ids=None, cache_key=None, options=None):
+        """
+        Отдает ZIP архив тестов по мере генерации (chunked transfer encoding)
+        
+        Размер архива заранее неизвестен, поэтому ответ идет блоками
+        HTTP/1.1 chunked и соединение закрывается после него; клиенту
+        HTTP/1.0 архив отдается до закрытия соединения. Признак обрезки
+        сценариев известен только в конце и передается трейлером
+        X-Tests-Truncated (и в README.md архива). При ошибке посреди
+        генерации поток обрывается без завершающего блока.
+        
+        Если задан cache_key, архив одновременно пишется во временный файл
+        кэша и сохраняется, когда отдан целиком и воспроизводим.
+        """
+        archive_name = generator.archive_name()
+        chunked = self.request_version == "HTTP/1.1"
+        if chunked:
+            self.protocol_version = "HTTP/1.1"
+        
+        self.send_response(200)
+        self.send_header("Content-Type", "application/zip")
+        self.send_header("Content-Disposition", f"attachment; filename=\"{archive_name}\"")
+        if chunked:
+            self.send_header("Transfer-Encoding", "chunked")
+            self.send_header("Trailer", "X-Tests-Truncated, Server-Timing")
+        if cache_key:
+            self.send_header("X-Tests-Cache", "miss")
+        self.send_header("Connection", "close")
+        self._set_cors_headers()
+        self.end_headers()
+        self.close_connection = True
+        
+        copy_file, tmp_path = tests_cache.open_temp() if cache_key else (None, None)
+        writer = ChunkedWriter(self.wfile, chunked=chunked, copy_to=copy_file)
+        try:
+            with tracing.span("tests_render") as attrs:
+                filenames = generator.write_zip_archive(writer, action_ids)
+                attrs["files"] = len(filenames)
+            report = generator.truncation_report()
+            trailers = {"X-Tests-Truncated": "true" if report["truncated"] else "false"}
+            if self.trace is not None:
+                trailers["Server-Timing"] = self.trace.server_timing()
+            writer.close(trailers)
+            logger.info(f"✅ Отдан потоком ZIP архив тестов: {archive_name} "
+                        f"({len(filenames)} файлов, {writer.bytes_written} байт)")
+            
+            if copy_file is not None:
+                copy_file.close()
+                if tests_cache.is_reproducible(options or {}, report):
+                    tests_cache.commit(cache_key, tmp_path, {
+                        "archive_name": archive_name,
+                        "files": filenames,
+                        "summary": tests_summary(len(filenames), report),
+                        "truncation": report
+                    })
+                    tmp_path = None
+        except (BrokenPipeError, ConnectionResetError):
+            logger.warning(f"⚠️  Клиент отключился во время загрузки архива {archive_name}")
+        except Exception as e:
+            logger.error(f"❌ Ошибка генерации тестов, архив {archive_name} оборван: {e}")
+        finally:
+            if copy_file is not None:
+                copy_file.close()
+                if tmp_path is not None:
+                    tests_cache.discard(tmp_path)
+    
+    def _send_cached_tests(self, key, cached):
+        """Отдает архив тестов из кэша (cached - результат tests_cache.get)"""
+        path, meta = cached
+        truncation = meta.get("truncation")
+        with open(path, "rb") as f:
+            self.send_response(200)
+            self.send_header("Content-Type", "application/zip")
+            self.send_header("Content-Disposition", f"attachment; filename=\"{meta['archive_name']}\"")
+            self.send_header("Content-Length", str(os.fstat(f.fileno()).st_size))
+            if truncation:
+                self.send_header("X-Tests-Truncated", "true" if truncation["truncated"] else "false")
+            self.send_header("X-Tests-Cache", "hit")
+            self._set_cors_headers()
+            self.end_headers()
+            shutil.copyfileobj(f, self.wfile, 64 * 1024)
+        logger.info(f"✅ Отдан ZIP архив тестов из кэша: {meta['archive_name']} ({key[:12]})")
+    
+    def _download_tests(self, filename):
+        """Скачивание архива, ранее сгенерированного /api/generate-tests"""
+        key = filename[:-len(".zip")] if filename.endswith(".zip") else filename
+        cached = tests_cache.get(key)
+        if cached is None:
+            self._send_json(404, {
+                "success": False,
+                "error": "Файл не найден. Сгенерируйте тесты заново."
+            })
+            return
+        try:
+            self._send_cached_tests(key, cached)
+        except FileNotFoundError as e:
+            # Запись вытеснена между проверкой и чтением
+            logger.warning(f"⚠️  Архив {key[:12]} недоступен: {e}")
+            self._send_json(404, {"success": False, "error": "Файл не найден. Сгенерируйте тесты заново."})
+    
+    @instrumented
+    def do_OPTIONS(self):
+        """Обработка CORS preflight запросов"""
+        self.send_response(200)
+        self._set_cors_headers()
+        self.send_header("Content-Type", "application/json")
+        self.end_headers()
+    
+    @instrumented
+    def do_GET(self):
+        if self.path == "/api/health" or self.path == "/api/status":
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self._set_cors_headers()
+            self.end_headers()
+            
+            response = {
+                "status": "healthy",
+                "timestamp": datetime.datetime.now().isoformat(),
+                "service": "Graph Editor API",
+                "version": "1.0.0",
+                "endpoints": {
+                    "health": "/api/health",
+                    "generate": "/api/generate (POST)",
+                    "status": "/api/status",
+                    "generate_stream": "/api/generate-model/stream (POST, text/event-stream)",
+                    "metrics": "/api/metrics (Prometheus)",
+                    "models": "/api/models",
+                    "model_stats": "/api/models/<name>/stats",
+                    "download_tests": "/api/download-tests/<key>.zip",
+                    "latest_model": "/api/latest-model",
+                    "jobs": {
+                        "submit": "/api/jobs/generate-model (POST)",
+                        "status": "/api/jobs/<job_id>",
+                        "result": "/api/jobs/<job_id>/result"
+                    },
+                    "test_manager": {
+                        "all_tests": "/api/test-manager/tests",
+                        "action_tests": "/api/test-manager/tests/<action_id>"
+                    }
+                }
+            }
+            
+            self.wfile.write(json.dumps(response, indent=2).encode())
+            logger.info(f"✅ Health check - {datetime.datetime.now()}")
+            
+        elif self.path == "/api/test-manager/tests":
+            # Эндпоинт для получения всех тестов
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self._set_cors_headers()
+            self.end_headers()
+            
+            # Заглушка для демонстрации
+            test_data = {
+                "tests": [
+                    {
+                        "id": "test_001",
+                        "name": "Тест проверки соединения",
+                        "description": "Проверяет установку соединения с API",
+                        "type": "integration",
+                        "priority": "high"
+                    },
+                    {
+                        "id": "test_002",
+                        "name": "Тест загрузки графа",
+                        "description": "Проверяет корректность загрузки структуры графа",
+                        "type": "functional",
+                        "priority": "medium"
+                    },
+                    {
+                        "id": "test_003",
+                        "name": "Тест валидации действий",
+                        "description": "Проверяет валидность действий в графе",
+                        "type": "validation",
+                        "priority": "high"
+                    },
+                    {
+                        "id": "test_004",
+                        "name": "Тест целостности данных",
+                        "description": "Проверяет целостность данных модели",
+                        "type": "data",
+                        "priority": "medium"
+                    }
+                ],
+                "total": 4,
+                "timestamp": datetime.datetime.now().isoformat()
+            }
+            
+            self.wfile.write(json.dumps(test_data, indent=2, ensure_ascii=False).encode())
+            logger.info(f"✅ Test Manager: возвращено {len(test_data['tests'])} тестов")
+            
+        elif self.path.startswith("/api/test-manager/tests/"):
+            # Эндпоинт для получения тестов для конкретного действия
+            action_id = self.path.replace("/api/test-manager/tests/", "")
+            
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self._set_cors_headers()
+            self.end_headers()
+            
+            # Заглушка для демонстрации
+            test_data = {
+                "action_id": action_id,
+                "action_name": f"Действие {action_id}",
+                "tests": [
+                    {
+                        "id": f"action_test_001_{action_id}",
+                        "name": "Тест выполнения действия",
+                        "description": f"Проверяет выполнение действия {action_id}",
+                        "type": "functional",
+                        "priority": "high"
+                    },
+                    {
+                        "id": f"action_test_002_{action_id}",
+                        "name": "Тест валидации параметров",
+                        "description": f"Проверяет параметры действия {action_id}",
+                        "type": "validation",
+                        "priority": "medium"
+                    },
+                    {
+                        "id": f"action_test_003_{action_id}",
+                        "name": "Тест результата действия",
+                        "description": f"Проверяет результат выполнения действия {action_id}",
+                        "type": "functional",
+                        "priority": "high"
+                    }
+                ],
+                "total": 3,
+                "timestamp": datetime.datetime.now().isoformat()
+            }
+            
+            self.wfile.write(json.dumps(test_data, indent=2, ensure_ascii=False).encode())
+            logger.info(f"✅ Test Manager: возвращено {len(test_data['tests'])} тестов для действия {action_id}")
+            
+        elif self.path == "/api/latest-model":
+            # Эндпоинт для получения последней сохраненной модели
+            try:
+                # Самая новая модель из реестра models/ (без обхода дерева)
+                latest = model_store.registry.latest()
+                model_data = model_store.snapshot(latest["name"]) if latest else None
+                source = latest["path"] if model_data is not None else 'test_project.json'
+                
+                if model_data is None:
+                    # Используем test_project.json как fallback
+                    with open('test_project.json', 'r', encoding='utf-8') as f:
+                        model_data = json.load(f)
+                
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self._set_cors_headers()
+                self.end_headers()
+                self.wfile.write(json.dumps(model_data, ensure_ascii=False).encode())
+                
+                logger.info(f"✅ Возвращена последняя модель из {source}")
+                
+            except Exception as e:
+                logger.error(f"❌ Ошибка получения модели: {e}")
+                self.send_response(500)
+                self.send_header("Content-Type", "application/json")
+                self._set_cors_headers()
+                self.end_headers()
+                self.wfile.write(json.dumps({"error": str(e)}).encode())
+        
+        elif self.path == "/api/models":
+            # Реестр сохраненных моделей, от новых к старым
+            self._send_json(200, {"models": model_store.registry.list()})
+        
+        elif self.path.startswith("/api/models/"):
+            # Сложность модели без перечисления сценариев: /api/models/<name>/stats
+            parsed = urlparse(self.path)
+            parts = parsed.path[len("/api/models/"):].split("/")
+            # Имена моделей обычно кириллические и приходят в %-кодировке
+            model_name = unquote(parts[0])
+            if (len(parts) != 2 or parts[1] != "stats" or not model_name or model_name in (".", "..")
+                    or "/" in model_name or "\\" in model_name):
+                self._send_json(404, {"success": False, "error": "Not found", "path": self.path})
+                return
             
-            if os.path.exists(filename):
-                with open(filename, 'r', encoding='utf-8') as f:
-                    model = json.load(f)
+            query = parse_qs(parsed.query)
+            try:
+                cycle_policy = query.get("cycle_policy", ["break"])[0]
+                top = int(query.get("top", ["10"])[0])
                 
-                # Извлекаем существующие данные
-                existing_actions = model.get("model_actions", [])
-                existing_objects = model.get("model_objects", [])
-                existing_connections = model.get("model_connections", [])
+                compiled = model_store.compiled(model_name)
+                if compiled is None:
+                    self._send_json(404, {"success": False, "error": "Модель не найдена", "model": model_name})
+                    return
                 
-                # Определяем следующий ID действий
-                if existing_actions:
-                    last_action_id = existing_actions[-1]["action_id"]
-                    next_action_num = int(last_action_id[1:]) + 1
-                else:
-                    next_action_num = 1
-            else:
-                # Создаем новую модель
-                model = {
-                    "version": "1.0",
-                    "metadata": {
-                        "name": model_name,
-                        "generated_at": datetime.datetime.now().isoformat(),
-                        "source": "api_main.py",
-                        "chunks_processed": 1
-                    },
-                    "model_actions": [],
-                    "model_objects": [],
-                    "model_connections": []
-                }
-                existing_actions = []
-                existing_objects = []
-                existing_connections = []
-                next_action_num = 1
-            
-            # 2. Логируем полученные данные
-            print(f"   🔍 Получены данные действия:")
-            print(f"   Keys: {list(action_data.keys())}")
-            print(f"   Data: {json.dumps(action_data, ensure_ascii=False)[:200]}...")
-            
-            # 3. Нормализуем ключи (обрабатываем разные форматы от LLM)
-            normalized_data = self._normalize_action_data(action_data)
-            print(f"   🔧 Нормализованные данные: {json.dumps(normalized_data, ensure_ascii=False)[:200]}...")
+                sys.path.append('.')
+                from test_generator_adapted import model_complexity
+                stats = model_complexity(None, cycle_policy=cycle_policy, top=top, compiled=compiled)
+                self._send_json(200, {"success": True, "model": model_name, "stats": stats})
+                logger.info(f"✅ Сложность модели {model_name}: {stats['total_scenarios']} сценариев")
+                
+            except ValueError as e:
+                # Неверный параметр или цикл в модели при cycle_policy=error
+                self._send_json(400, {"success": False, "error": str(e), "cycle": getattr(e, "cycle", None)})
+            except Exception as e:
+                logger.error(f"❌ Ошибка расчета сложности модели: {e}")
+                self._send_json(500, {"success": False, "error": str(e)})
             
-            # 4. Проверяем, существует ли уже такое действие
-            action_id = None
-            for existing_action in existing_actions:
-                if (existing_action.get("action_actor") == normalized_data["action_actor"] and
-                    existing_action.get("action_action") == normalized_data["action_action"] and
-                    existing_action.get("action_place") == normalized_data.get("action_place", "")):
-                    
-                    action_id = existing_action["action_id"]
-                    print(f"   🔄 Действие уже существует: {action_id}")
-                    break
+        elif self.path == "/api/metrics":
+            body = metrics.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", METRICS_CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self._set_cors_headers()
+            self.end_headers()
+            self.wfile.write(body)
+        
+        elif self.path == "/api/llm/status":
+            self._send_json(200, ollama_client.stats())
+        
+        elif self.path == "/api/cache/llm":
+            self._send_json(200, llm_cache.stats())
+        
+        elif self.path == "/api/cache/tests":
+            stats = tests_cache.stats()
+            stats["sessions"] = generation_sessions.stats()
+            self._send_json(200, stats)
+        
+        elif self.path.startswith("/api/download-tests/"):
+            # Скачивание архива по download_url из /api/generate-tests
+            try:
+                self._download_tests(self.path.replace("/api/download-tests/", "", 1))
+            except Exception as e:
+                logger.error(f"❌ Ошибка скачивания тестов: {e}")
+                self._send_json(500, {"success": False, "error": str(e)})
+        
+        elif self.path == "/api/jobs":
+            self._send_json(200, {"jobs": generation_jobs.list_jobs()})
+        
+        elif self.path.startswith("/api/jobs/"):
+            # Статус и результат фоновой задачи генерации
+            job_path = self.path.replace("/api/jobs/", "", 1)
+            want_result = job_path.endswith("/result")
+            job_id = job_path[:-len("/result")] if want_result else job_path
             
-            # 5. Если действие новое, создаем его
-            if not action_id:
-                action_id = f"a{next_action_num:05d}"
-                next_action_num += 1
+            status = generation_jobs.get_status(job_id)
+            if status is None:
+                self._send_json(404, {"success": False, "error": "Задача не найдена", "job_id": job_id})
+            elif not want_result:
+                self._send_json(200, status)
+            elif status["status"] in ("done", "failed"):
+                self._send_json(200, generation_jobs.get_result(job_id))
+            else:
+                # Результат еще не готов - возвращаем текущий статус
+                self._send_json(202, status)
+        
+        else:
+            self.send_response(404)
+            self.send_header("Content-Type", "application/json")
+            self._set_cors_headers()
+            self.end_headers()
+            self.wfile.write(json.dumps({"error": "Not found", "path": self.path}).encode())
+    
+    @instrumented
+    def do_POST(self):
+        if self.path == "/api/generate-model" or self.path == "/api/generate":
+            try:
+                content_length = int(self.headers.get('Content-Length', 0))
+                post_data = self.rfile.read(content_length)
+                data = json.loads(post_data.decode('utf-8'))
+                text = data.get('text', '')
+                model_name = data.get('model_name', 'unnamed_model')
+                
+                print(f"📥 POST /api/generate-model")
+                print(f"   📄 Текст: {text[:100]}...")
+                print(f"   🏷️  Имя модели: {model_name}")
                 
-                # Создаем действие с полями для графа
-                action_label = f"{normalized_data['action_actor']} {normalized_data['action_action']}"
-                if normalized_data.get("action_place"):
-                    action_label += f" ({normalized_data['action_place']})"
+                response = self.run_generation_pipeline(
+                    text,
+                    model_name,
+                    llm_concurrency=data.get('llm_concurrency'),
+                    chunk_size=data.get('chunk_size')
+                )
                 
-                new_action = {
-                    "action_id": action_id,
-                    # Новая структура
-                    "action_actor": normalized_data["action_actor"],
-                    "action_action": normalized_data["action_action"],
-                    "action_place": normalized_data.get("action_place", ""),
-                    # Совместимость со старым кодом (для graph-manager.js)
-                    "action_name": action_label,  # ← ДЛЯ ГРАФА!
-                    "action_links": {
-                        "manual": "Из LLM анализа",
-                        "API": "",
-                        "UI": ""
-                    },
-                    # Дополнительные поля для графа
-                    "graph_data": {
-                        "id": action_id,
-                        "label": action_label,
-                        "type": "action",
-                        "actor": normalized_data["action_actor"],
-                        "action": normalized_data["action_action"],
-                        "place": normalized_data.get("action_place", "")
-                    }
-                }
+                # Ошибки LLM возвращаются в JSON (всегда 200 OK)
+                self._send_json(200, response)
+                print(f"   ✅ Ответ отправлен")
                 
-                existing_actions.append(new_action)
-                print(f"   ✅ Создано новое действие: {action_id}")
+            except Exception as e:
+                logger.error(f"❌ Ошибка при генерации модели: {str(e)}")
+                self.send_response(500)
+                self.send_header("Content-Type", "application/json")
+                self._set_cors_headers()
+                self.end_headers()
+                self.wfile.write(json.dumps({"error": str(e), "status": "error"}).encode())
+        
+        elif self.path == "/api/generate-model/stream":
+            # Потоковая генерация: события server-sent events по мере разбора ответа LLM
+            try:
+                content_length = int(self.headers.get('Content-Length', 0))
+                post_data = self.rfile.read(content_length)
+                data = json.loads(post_data.decode('utf-8'))
+            except Exception as e:
+                self._send_json(400, {"success": False, "error": f"Некорректный запрос: {e}"})
+                return
             
-            # 4. Обрабатываем init_states и final_states
-            all_state_pairs = []
+            text = data.get('text', '')
+            model_name = data.get('model_name', 'unnamed_model')
+            print(f"📥 POST /api/generate-model/stream")
+            print(f"   🏷️  Имя модели: {model_name}")
             
-            # Собираем все состояния из normalized_data
-            if "init_states" in normalized_data and normalized_data["init_states"]:
-                for state in normalized_data["init_states"]:
-                    all_state_pairs.append({
-                        "type": "init",
-                        "object_name": state.get("object_name", "объект"),
-                        "state_name": state.get("state_name", "начальное состояние")
-                    })
-                print(f"   📋 Найдено {len(normalized_data['init_states'])} начальных состояний")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream; charset=utf-8")
+            self.send_header("Cache-Control", "no-cache")
+            self.send_header("Connection", "close")
+            self._set_cors_headers()
+            self.end_headers()
+            self.close_connection = True
             
-            if "final_states" in normalized_data and normalized_data["final_states"]:
-                for state in normalized_data["final_states"]:
-                    all_state_pairs.append({
-                        "type": "final",
-                        "object_name": state.get("object_name", "объект"),
-                        "state_name": state.get("state_name", "конечное состояние")
-                    })
-                print(f"   📋 Найдено {len(normalized_data['final_states'])} конечных состояний")
+            def emit(event, payload):
+                message = f"event: {event}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+                self.wfile.write(message.encode('utf-8'))
+                self.wfile.flush()
             
-            # 5. Для каждого состояния находим или создаем объект и состояние
-            for state_pair in all_state_pairs:
-                obj_name = state_pair["object_name"]
-                state_name = state_pair["state_name"]
+            try:
+                self.run_streaming_pipeline(
+                    text,
+                    model_name,
+                    emit,
+                    llm_concurrency=data.get('llm_concurrency'),
+                    chunk_size=data.get('chunk_size')
+                )
+            except (BrokenPipeError, ConnectionResetError):
+                logger.warning(f"⚠️  Клиент отключился во время потоковой генерации модели {model_name}")
+            except Exception as e:
+                logger.error(f"❌ Ошибка потоковой генерации модели: {e}")
+                try:
+                    emit("error", {"success": False, "status": 500, "error": str(e)})
+                except OSError:
+                    pass
+        
+        elif self.path == "/api/jobs/generate-model":
+            # Асинхронная генерация: сразу возвращаем job_id
+            try:
+                content_length = int(self.headers.get('Content-Length', 0))
+                post_data = self.rfile.read(content_length)
+                data = json.loads(post_data.decode('utf-8'))
+                text = data.get('text', '')
+                model_name = data.get('model_name', 'unnamed_model')
+                
+                job = generation_jobs.submit(
+                    text,
+                    model_name,
+                    llm_concurrency=data.get('llm_concurrency'),
+                    chunk_size=data.get('chunk_size')
+                )
+                self._send_json(202, {"success": True, **job})
+                
+            except Exception as e:
+                logger.error(f"❌ Ошибка постановки задачи генерации: {e}")
+                self._send_json(500, {"success": False, "error": str(e)})
+        
+        elif self.path == "/api/generate-tests":
+            try:
+                content_length = int(self.headers.get('Content-Length', 0))
+                post_data = self.rfile.read(content_length) if content_length > 0 else b'{}'
+                data = json.loads(post_data.decode('utf-8'))
+                
+                # Получаем параметры
+                model_data = data.get('model', {})
+                action_ids = data.get('action_ids', None)  # None = все действия
+                generate_zip = data.get('generate_zip', True)
+                # Ограничения перечисления сценариев (0 - без ограничения)
+                max_scenarios = data.get('max_scenarios_per_action', TESTS_MAX_SCENARIOS)
+                time_budget = data.get('time_budget', TESTS_TIME_BUDGET)
+                # Обработка циклов в модели: break, skip или error
+                cycle_policy = data.get('cycle_policy', 'break')
+                # Выбор сценариев: all - все пути, coverage - минимальный покрывающий набор
+                selection = data.get('selection', 'all')
+                # Предварительный подсчет сценариев: cap - ограничить, reject - отклонить
+                max_total_scenarios = data.get('max_total_scenarios', TESTS_MAX_TOTAL_SCENARIOS)
+                on_limit = data.get('on_scenario_limit', 'cap')
+                # Равномерная случайная выборка сценариев на действие вместо перечисления
+                sample_size = data.get('sample_size')
+                seed = data.get('seed')
+                # Рендеринг файлов в пуле процессов (на результат не влияет)
+                processes = data.get('processes', TESTS_PROCESSES)
+                
+                # Если модель не предоставлена, используем последнюю сохраненную
+                compiled = None
+                session_key = data.get('session') or (model_data.get('metadata') or {}).get('name')
+                if not model_data:
+                    # Берем самую новую модель из реестра models/ вместе с ее
+                    # скомпилированным представлением (строится раз на версию)
+                    latest = model_store.registry.latest()
+                    model_data = None
+                    if latest:
+                        session_key = session_key or latest["name"]
+                        with model_store.lock(latest["name"]):
+                            model_data = model_store.snapshot(latest["name"])
+                            compiled = model_store.compiled(latest["name"])
+                    if model_data is None:
+                        # Используем test_project.json как fallback
+                        try:
+                            with open('test_project.json', 'r', encoding='utf-8') as f:
+                                model_data = json.load(f)
+                        except:
+                            # Используем example.json как последний fallback
+                            with open('example.json', 'r', encoding='utf-8') as f:
+                                model_data = json.load(f)
                 
-                # Ищем существующий объект
-                obj_found = None
-                obj_index = -1
+                generator_options = {
+                    "max_scenarios_per_action": max_scenarios,
+                    "time_budget": time_budget,
+                    "cycle_policy": cycle_policy,
+                    "selection": selection,
+                    "max_total_scenarios": max_total_scenarios,
+                    "on_limit": on_limit,
+                    "sample_size": sample_size,
+                    "seed": seed
+                }
                 
-                for i, obj in enumerate(existing_objects):
-                    if obj["object_name"].lower() == obj_name.lower():
-                        obj_found = obj
-                        obj_index = i
-                        break
+                # Повторная генерация для неизменной модели - из кэша архивов
+                cache_key = None
+                if tests_cache.enabled:
+                    with tracing.span("tests_cache") as attrs:
+                        cache_key = tests_cache.key_for(model_data, action_ids, generator_options)
+                        cached = tests_cache.get(cache_key)
+                        attrs["hit"] = cached is not None
+                    if cached is not None:
+                        if generate_zip:
+                            try:
+                                self._send_cached_tests(cache_key, cached)
+                                return
+                            except FileNotFoundError:
+                                # Запись вытеснена между проверкой и чтением
+                                pass
+                        else:
+                            meta = cached[1]
+                            self._send_json(200, {
+                                "success": True,
+                                "total_tests": len(meta["files"]),
+                                "files": meta["files"],
+                                "summary": meta["summary"],
+                                "truncation": meta["truncation"],
+                                "download_url": f"/api/download-tests/{cache_key}.zip",
+                                "cached": True
+                            })
+                            logger.info(f"✅ Тесты отданы из кэша ({cache_key[:12]})")
+                            return
                 
-                # Если объект не найден, создаем новый
-                if not obj_found:
-                    # Определяем следующий ID объекта
-                    if existing_objects:
-                        last_obj_id = existing_objects[-1]["object_id"]
-                        next_obj_num = int(last_obj_id[1:]) + 1
-                    else:
-                        next_obj_num = 1
+                # Импортируем адаптированный генератор тестов
+                try:
+                    sys.path.append('.')
+                    from test_generator_adapted import generate_tests_with_report, create_test_generator, count_scenarios
                     
-                    obj_id = f"o{next_obj_num:05d}"
+                    # Обертка для совместимости
+                    def generate_tests(model, action_ids=None):
+                        if session is not None:
+                            with tracing.span("tests_prepare") as attrs:
+                                generator = session.prepare(model, action_ids, compiled=compiled, processes=processes)
+                                attrs.update(session.last_update)
+                            tests_session_updates.inc(mode=session.last_update["mode"])
+                            with tracing.span("tests_render"):
+                                tests_dict = dict(generator.iter_tests(action_ids))
+                                zip_buffer, archive_name = generator.create_zip_archive(tests_dict)
+                            report = generator.truncation_report()
+                        else:
+                            with tracing.span("tests_render"):
+                                tests_dict, zip_buffer, archive_name, report = generate_tests_with_report(
+                                    model, action_ids, processes=processes, compiled=compiled, **generator_options
+                                )
+                        tests_scenarios.observe(sum(count_scenarios(content) for content in tests_dict.values()))
+                        return tests_dict, zip_buffer, archive_name, tests_summary(len(tests_dict), report), report
+                        
+                except ImportError as e:
+                    logger.error(f"❌ Не удалось импортировать адаптированный генератор тестов: {e}")
+                    create_test_generator = None
+                    # Создаем простой генератор inline
+                    import io
+                    import zipfile
+                    from datetime import datetime
                     
-                    new_obj = {
-                        "object_id": obj_id,
-                        "object_name": obj_name,
-                        "resource_state": []
-                    }
+                    def simple_test_generator(model, selected_actions=None):
+                        # Простая заглушка
+                        tests = {}
+                        if selected_actions:
+                            for action_id in selected_actions:
+                                tests[f'test_{action_id}.md'] = f"# Test for {action_id}\n\nSimple test stub"
+                        else:
+                            tests['test_all.md'] = "# All tests\n\nSimple test stub"
+                        
+                        # Создаем ZIP
+                        zip_buffer = io.BytesIO()
+                        with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zipf:
+                            for filename, content in tests.items():
+                                zipf.writestr(filename, content.encode('utf-8'))
+                        
+                        zip_buffer.seek(0)
+                        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+                        summary = f"Сгенерировано {len(tests)} тестов с использованием простого генератора"
+                        return tests, zip_buffer, f'tests_{timestamp}.zip', summary, None
                     
-                    existing_objects.append(new_obj)
-                    obj_found = new_obj
-                    obj_index = len(existing_objects) - 1
-                    print(f"   ✅ Создан новый объект: {obj_name} ({obj_id})")
+                    generate_tests = simple_test_generator
                 
-                # Ищем существующее состояние в объекте
-                state_found = False
-                state_id = None
+                # Сессия модели: при правках модели заново строятся только
+                # файлы затронутых действий; если сессия занята другим
+                # запросом, генератор строится с нуля
+                session = None
+                if create_test_generator is not None:
+                    session = generation_sessions.acquire(session_key or f"client:{self.client_address[0]}", generator_options)
+                try:
+                    started = time.perf_counter()
+                    if generate_zip and create_test_generator is not None:
+                        # ZIP отдается потоком: ошибки запроса проверяются до
+                        # заголовков, файлы генерируются и сжимаются по одному
+                        with tracing.span("tests_prepare") as attrs:
+                            if session is not None:
+                                generator = session.prepare(model_data, action_ids, compiled=compiled, processes=processes)
+                                attrs.update(session.last_update)
+                                tests_session_updates.inc(mode=session.last_update["mode"])
+                            else:
+                                generator = create_test_generator(
+                                    model_data, action_ids, processes=processes, compiled=compiled, **generator_options
+                                )
+                        self._stream_tests_zip(generator, action_ids, cache_key, generator_options)
+                        tests_generation_seconds.observe(time.perf_counter() - started, output="zip")
+                        tests_scenarios.observe(generator.scenarios_written)
+                        if session is not None:
+                            logger.info(f"🔁 Сессия тестов: {session.stats()}")
+                        return
                 
-                for state in obj_found["resource_state"]:
-                    if state["state_name"].lower() == state_name.lower():
-                        state_found = True
-                        state_id = state["state_id"]
-                        break
+                    # Генерируем тесты
+                    tests_dict, zip_buffer, archive_name, summary, truncation = generate_tests(model_data, action_ids)
+                    tests_generation_seconds.observe(time.perf_counter() - started,
+                                                     output="zip" if generate_zip else "json")
                 
-                # Если состояние не найдено, создаем новое
-                if not state_found:
-                    # Определяем следующий ID состояния
-                    if obj_found["resource_state"]:
-                        last_state_id = obj_found["resource_state"][-1]["state_id"]
-                        next_state_num = int(last_state_id[1:]) + 1
+                    if generate_zip and zip_buffer:
+                        # Возвращаем ZIP архив
+                        self.send_response(200)
+                        self.send_header("Content-Type", "application/zip")
+                        self.send_header("Content-Disposition", f"attachment; filename=\"{archive_name}\"")
+                        if truncation:
+                            self.send_header("X-Tests-Truncated", "true" if truncation["truncated"] else "false")
+                        self._set_cors_headers()
+                        self.end_headers()
+                    
+                        self.wfile.write(zip_buffer.getvalue())
+                    
+                        logger.info(f"✅ Сгенерирован ZIP архив тестов: {archive_name} ({len(tests_dict)} файлов)")
                     else:
-                        next_state_num = 1
+                        # Архив сохраняется в кэш, чтобы его можно было скачать по
+                        # download_url; невоспроизводимый - под случайным ключом
+                        download_url = None
+                        if zip_buffer and tests_cache.enabled:
+                            if cache_key is None or not tests_cache.is_reproducible(generator_options, truncation):
+                                cache_key = tests_cache.unique_key()
+                            tests_cache.put(cache_key, zip_buffer.getvalue(), {
+                                "archive_name": archive_name,
+                                "files": list(tests_dict.keys()),
+                                "summary": summary,
+                                "truncation": truncation
+                            })
+                            download_url = f"/api/download-tests/{cache_key}.zip"
+                    
+                        # Возвращаем JSON с информацией о тестах
+                        self.send_response(200)
+                        self.send_header("Content-Type", "application/json")
+                        self._set_cors_headers()
+                        self.end_headers()
                     
-                    state_id = f"s{next_state_num:05d}"
+                        response = {
+                            "success": True,
+                            "total_tests": len(tests_dict),
+                            "files": list(tests_dict.keys()),
+                            "summary": summary,
+                            "truncation": truncation,
+                            "download_url": download_url,
+                            "cached": False,
+                            "session": session.stats() if session is not None else None
+                        }
                     
-                    new_state = {
-                        "state_id": state_id,
-                        "state_name": state_name
-                    }
+                        self.wfile.write(json.dumps(response, indent=2, ensure_ascii=False).encode())
                     
-                    existing_objects[obj_index]["resource_state"].append(new_state)
-                    print(f"   ✅ Добавлено новое состояние: {obj_name}.{state_name} ({state_id})")
-                
-                # 6. Создаем связь
-                connection_id = None
-                
-                if state_pair["type"] == "init":
-                    # init_state → action
-                    connection_id = f"c{len(existing_connections) + 1:05d}"
-                    connection = {
-                        "connection_id": connection_id,
-                        "connection_out": f"{obj_found['object_id']}{state_id}",
-                        "connection_in": action_id,
-                        "description": f"{obj_name} {state_name} → {action_data['action_actor']} {action_data['action_action']}",
-                        "type": "triggers"
-                    }
-                else:  # final
-                    # action → final_state
-                    connection_id = f"c{len(existing_connections) + 1:05d}"
-                    connection = {
-                        "connection_id": connection_id,
-                        "connection_out": action_id,
-                        "connection_in": f"{obj_found['object_id']}{state_id}",
-                        "description": f"{action_data['action_actor']} {action_data['action_action']} → {obj_name} {state_name}",
-                        "type": "results_in"
-                    }
-                
-                # Проверяем, не существует ли уже такая связь
-                connection_exists = False
-                for conn in existing_connections:
-                    if (conn["connection_out"] == connection["connection_out"] and
-                        conn["connection_in"] == connection["connection_in"]):
-                        connection_exists = True
-                        break
+                        logger.info(f"✅ Сгенерировано {len(tests_dict)} тестов")
+                finally:
+                    if session is not None:
+                        session.release()
                 
-                if not connection_exists:
-                    existing_connections.append(connection)
-                    print(f"   🔗 Создана связь: {connection['description']}")
-            
-            # 7. Обновляем модель
-            model["model_actions"] = existing_actions
-            model["model_objects"] = existing_objects
-            model["model_connections"] = existing_connections
-            
-            # 8. Сохраняем модель
-            with open(filename, 'w', encoding='utf-8') as f:
-                json.dump(model, f, ensure_ascii=False, indent=2)
-            
-            print(f"   💾 Модель обновлена: {filename}")
-            return True
+            except ValueError as e:
+                # Некорректный запрос: неверный JSON, неизвестная политика или
+                # режим выбора сценариев, цикл в модели при cycle_policy=error
+                # или превышение лимита сценариев при on_scenario_limit=reject
+                logger.warning(f"⚠️ Тесты не сгенерированы: {e}")
+                self._send_json(400, {
+                    "success": False,
+                    "error": str(e),
+                    "cycle": getattr(e, "cycle", None),
+                    "complexity": getattr(e, "complexity", None)
+                })
             
-        except Exception as e:
-            print(f"❌ Ошибка при добавлении действия в модель: {e}")
-            import traceback
-            traceback.print_exc()
-            return False
+            except Exception as e:
+                logger.error(f"❌ Ошибка генерации тестов: {e}")
+                self.send_response(500)
+                self.send_header("Content-Type", "application/json")
+                self._set_cors_headers()
+                self.end_headers()
+                self.wfile.write(json.dumps({
+                    "success": False,
+                    "error": str(e)
+                }).encode())
+        
+        elif self.path.startswith("/api/download-tests/"):
+            # Скачивание ранее сгенерированных тестов (то же, что GET)
+            try:
+                self._download_tests(self.path.replace("/api/download-tests/", "", 1))
+            except Exception as e:
+                logger.error(f"❌ Ошибка скачивания тестов: {e}")
+                self._send_json(500, {"success": False, "error": str(e)})
+        
+        else:
+            self.send_response(404)
+            self.send_header("Content-Type", "application/json")
+            self._set_cors_headers()
+            self.end_headers()
+            self.wfile.write(json.dumps({"error": "Not found", "path": self.path}).encode())
     
-    def simple_text_analysis(self, text):
-        """
-        УПРАЗДНЕН - теперь используем LLM анализ
-        """
-        print("⚠️  simple_text_analysis УПРАЗДНЕН")
-        print("   Используйте LLM анализ через generate_llm_prompt()")
-        return {
-            "model_actions": [],
-            "model_objects": [],
-            "model_connections": [],
-            "analysis_metadata": {
-                "analysis_method": "deprecated",
-                "warning": "Используйте LLM анализ"
-            }
-        }
+    def log_message(self, format, *args):
+        """Переопределяем логирование для вывода в наш логгер"""
+        logger.info(f"{self.address_string()} - {format % args}")
+
+
+class ThreadPoolHTTPServer(socketserver.TCPServer):
+    """
+    TCP сервер, обрабатывающий запросы в ограниченном пуле потоков.
     
-    def save_model_to_file(self, model, model_name):
-        """Сохраняет модель в файл JSON"""
+    Долгий запрос к LLM занимает один рабочий поток и не блокирует
+    /api/health, /api/latest-model и остальные быстрые эндпоинты.
+    Соединения сверх размера пула ждут в очереди исполнителя.
+    """
+    
+    def __init__(self, server_address, handler_class, workers=DEFAULT_WORKERS):
+        self.workers = max(1, int(workers))
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=self.workers,
+            thread_name_prefix="api-worker"
+        )
         try:
-            # Создаем папку models если ее нет
-            if not os.path.exists("models"):
-                os.makedirs("models")
-                print("📁 Создана папка models")
-            
-            # Формируем полную модель с метаданными
-            full_model = {
-                "version": "1.0",
-                "metadata": {
-                    "name": model_name,
-                    "generated_at": datetime.datetime.now().isoformat(),
-                    "source": "api_main.py",
-                    "chunks_processed": 1
-                },
-                "model_actions": model.get("model_actions", []),
-                "model_objects": model.get("model_objects", []),
-                "model_connections": model.get("model_connections", [])
-            }
-            
-            # Сохраняем в файл
-            filename = f"models/{model_name}.json"
-            with open(filename, 'w', encoding='utf-8') as f:
-                json.dump(full_model, f, ensure_ascii=False, indent=2)
-            
-            print(f"   💾 Модель сохранена: {filename}")
-            return filename
-            
-        except Exception as e:
-            print(f"❌ Ошибка при сохранении модели: {e}")
-            return None
+            super().__init__(server_address, handler_class)
+        except Exception:
+            self._executor.shutdown(wait=False)
+            raise
+    
+    def process_request(self, request, client_address):
+        """Передает соединение в пул вместо обработки в потоке accept"""
+        self._executor.submit(self._process_request_worker, request, client_address)
+    
+    def _process_request_worker(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+    
+    def server_close(self):
+        super().server_close()
+        self._executor.shutdown(wait=False, cancel_futures=True)
 
-def run_server(port=5001):
+
+def run_server(port=5001, workers=DEFAULT_WORKERS):
     """Запуск тестового сервера"""
     handler = SimpleAPIHandler
+    model_store.start()
     
     for p in range(port, port + 20):
         try:
-            with socketserver.TCPServer(("0.0.0.0", p), handler) as httpd:
+            with ThreadPoolHTTPServer(("0.0.0.0", p), handler, workers=workers) as httpd:
                 write_port_to_file(p)
                 print(f"🚀 API запущен на порту {p}")
                 print(f"🔗 URL: http://localhost:{p}/api/health")
+                print(f"🧵 Рабочих потоков: {httpd.workers}")
                 print("📝 Логи записываются в: api.log")
                 print("-" * 50)
                 
@@ -1137,7 +2430,15 @@ def run_server(port=5001):
                 raise e
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="API сервер Graph Editor")
+    parser.add_argument("--port", type=int, default=5001, help="Первый порт для поиска свободного (по умолчанию 5001)")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS,
+                        help="Размер пула рабочих потоков (по умолчанию API_WORKERS или 16)")
+    args = parser.parse_args()
+    
     print("🚀 ТЕСТОВЫЙ API - ГАРАНТИРОВАННЫЙ ВЫВОД ЛОГОВ")
     print("=" * 50)
     print("Это сообщение ДОЛЖНО быть видно сразу!")
-    run_server()
\ No newline at end of file
+    configure_logging()
+    init_services()
+    run_server(port=args.port, workers=args.workers)
@@ -0,0 +1,23 @@
+"""
+Микробенчмарки генераторов тестов и конвейера анализа ТЗ
+
+Модели для замеров строятся генератором synthetic.py с заданными
+размером, глубиной и ветвлением - в формате test_project.json
+(model_actions/objects/connections), в простом формате example.json и
+в виде ответа LLM. Запуск из корня репозитория:
+
+    python -m benchmarks --output results.json
+    python -m benchmarks --compare results.json
+
+Результаты - JSON со временем каждого замера по размерам модели; с
+--compare замеры сравниваются с прошлым запуском и замедления выше
+допуска дают ненулевой код возврата.
+"""
+
+import os
+import sys
+
+# Модули репозитория лежат в корне, на уровень выше пакета
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
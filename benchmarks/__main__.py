@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+"""
+Запуск бенчмарков: python -m benchmarks [--benchmarks ...] [--sizes ...]
+
+Каждый бенчмарк прогоняется по своему ряду размеров модели (--sizes
+заменяет ряд для всех). Для каждого размера замер повторяется --repeat
+раз на свежих данных; в результат попадают все времена, минимум и
+медиана, а также медиана на одно действие - по ней видно, как растет
+время с размером модели.
+"""
+
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks import ROOT, synthetic
+
+# Параметры синтетических моделей по умолчанию (synthetic.llm_actions)
+DEFAULT_PARAMS = {"depth": 6, "fan_in": 2, "producers": 2}
+
+BENCHMARKS = {}
+
+
+def benchmark(name, sizes, **params):
+    """Регистрирует бенчмарк: setup(size, params) -> функция одного замера"""
+    def register(setup):
+        BENCHMARKS[name] = {"setup": setup, "sizes": sizes, "params": dict(DEFAULT_PARAMS, **params)}
+        return setup
+    return register
+
+
+_api = None
+
+
+def api_main():
+    """
+    Модуль api_main со службами, созданными во временном каталоге
+
+    init_services() создает каталоги кэшей в текущем каталоге - они не
+    должны попадать в рабочую копию.
+    """
+    global _api
+    if _api is None:
+        cwd = os.getcwd()
+        os.chdir(tempfile.mkdtemp(prefix="bench_api_"))
+        try:
+            import api_main as module
+            module.init_services()
+        finally:
+            os.chdir(cwd)
+        _api = module
+    return _api
+
+
+@benchmark("bdd_generator_simple", sizes=(100, 300, 1000, 3000))
+def bench_bdd_generator_simple(size, params):
+    """BDDGeneratorSimple: все файлы модели example.json, не больше 200 сценариев на действие"""
+    from test_generator_adapted import BDDGeneratorSimple
+    model = synthetic.flat_model(size, **params)
+
+    def run():
+        files = BDDGeneratorSimple(model, max_scenarios_per_action=200).generate_all_bdd_files()
+        return {"files": len(files), "bytes": sum(len(content) for content in files.values())}
+    return run
+
+
+@benchmark("test_generator", sizes=(40, 160, 320, 640), depth=3, fan_in=1, producers=1)
+def bench_test_generator(size, params):
+    """
+    TestGenerator (test_generator.py): все тесты модели test_project.json
+
+    Старый генератор перебирает пути без ограничений и уже при fan_in=2
+    не укладывается в минуты, поэтому модели без ветвления.
+    """
+    from test_generator import TestGenerator
+    model = synthetic.project_model(size, **params)
+
+    def run():
+        tests = TestGenerator(model).generate_all_tests()
+        return {"files": len(tests)}
+    return run
+
+
+@benchmark("convert_to_simple_format", sizes=(300, 1000, 3000, 10000))
+def bench_convert_to_simple_format(size, params):
+    """BDDGeneratorAdapted._convert_to_simple_format вместе с разбором модели (CompiledModel)"""
+    from compiled_model import CompiledModel
+    from test_generator_adapted import BDDGeneratorAdapted
+    model = synthetic.project_model(size, **params)
+    generator = BDDGeneratorAdapted(model)
+
+    def run():
+        generator.compiled = CompiledModel(model)
+        return {"actions": len(generator._convert_to_simple_format())}
+    return run
+
+
+@benchmark("add_action_to_model", sizes=(100, 300, 1000, 3000))
+def bench_add_action_to_model(size, params):
+    """ModelGenerationService.add_action_to_model: size действий подряд в пустую модель"""
+    api = api_main()
+    from model_store import ModelStore
+    actions = synthetic.llm_actions(size, **params)
+    service = api.ModelGenerationService()
+
+    def run():
+        # Отдельное хранилище на замер: модель каждый раз начинается с нуля
+        store = api.model_store = ModelStore(tempfile.mkdtemp(prefix="bench_models_"), flush_interval=0)
+        with contextlib.redirect_stdout(io.StringIO()):
+            for action in actions:
+                service.add_action_to_model(action, "bench")
+        return {"actions": len(store.get("bench")["model_actions"])}
+    return run
+
+
+@benchmark("parse_llm_response", sizes=(100, 300, 1000, 3000))
+def bench_parse_llm_response(size, params):
+    """ModelGenerationService.parse_llm_response: ответ LLM в обертке ```json"""
+    api = api_main()
+    text = synthetic.llm_response(size, **params)
+    service = api.ModelGenerationService()
+
+    def run():
+        with contextlib.redirect_stdout(io.StringIO()):
+            actions = service.parse_llm_response(text)
+        return {"actions": len(actions), "chars": len(text)}
+    return run
+
+
+def measure(name, size, params, repeat):
+    """Замер одного бенчмарка на модели размера size"""
+    setup = BENCHMARKS[name]["setup"]
+    times = []
+    metrics = None
+    for _ in range(repeat):
+        run = setup(size, params)
+        started = time.perf_counter()
+        metrics = run()
+        times.append(time.perf_counter() - started)
+    median = statistics.median(times)
+    return {
+        "benchmark": name,
+        "size": size,
+        "params": params,
+        "times_s": [round(value, 6) for value in times],
+        "min_s": round(min(times), 6),
+        "median_s": round(median, 6),
+        "per_action_us": round(median / size * 1e6, 3),
+        "metrics": metrics
+    }
+
+
+def environment():
+    """Сведения о машине и версии кода для сравнения результатов"""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                                text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count()
+    }
+
+
+def compare(results, baseline, tolerance):
+    """
+    Сравнивает медианы с прошлым запуском
+
+    Returns:
+        Список замедлений больше tolerance раз: (benchmark, size, было, стало)
+    """
+    previous = {(item["benchmark"], item["size"]): item for item in baseline.get("results", [])}
+    regressions = []
+    for item in results:
+        old = previous.get((item["benchmark"], item["size"]))
+        if old is None or old["params"] != item["params"] or not old["median_s"]:
+            continue
+        ratio = item["median_s"] / old["median_s"]
+        item["baseline_median_s"] = old["median_s"]
+        item["ratio"] = round(ratio, 3)
+        if ratio > tolerance:
+            regressions.append((item["benchmark"], item["size"], old["median_s"], item["median_s"]))
+    return regressions
+
+
+def parse_list(value, cast):
+    return [cast(part) for part in value.split(",") if part.strip()]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="Бенчмарки генераторов тестов Graph Editor")
+    parser.add_argument("--benchmarks", type=lambda value: parse_list(value, str), default=list(BENCHMARKS),
+                        help=f"Бенчмарки через запятую (по умолчанию все: {', '.join(BENCHMARKS)})")
+    parser.add_argument("--sizes", type=lambda value: parse_list(value, int),
+                        help="Размеры моделей через запятую (по умолчанию - свой ряд у каждого бенчмарка)")
+    parser.add_argument("--depth", type=int, help="Число слоев модели")
+    parser.add_argument("--fan-in", type=int, help="Начальных состояний у действия")
+    parser.add_argument("--producers", type=int, help="Действий, создающих одно состояние")
+    parser.add_argument("--repeat", type=int, default=3, help="Повторов каждого замера")
+    parser.add_argument("--output", "-o", help="Файл результатов JSON (по умолчанию - stdout)")
+    parser.add_argument("--compare", help="Результаты прошлого запуска для сравнения")
+    parser.add_argument("--tolerance", type=float, default=1.5,
+                        help="Допустимое замедление относительно --compare (во сколько раз)")
+    args = parser.parse_args(argv)
+
+    unknown = [name for name in args.benchmarks if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"неизвестные бенчмарки: {', '.join(unknown)}")
+
+    overrides = {key: value for key, value in
+                 (("depth", args.depth), ("fan_in", args.fan_in), ("producers", args.producers))
+                 if value is not None}
+
+    # Генераторы пишут в лог каждое действие; в замер это не входит
+    logging.disable(logging.INFO)
+
+    results = []
+    for name in args.benchmarks:
+        spec = BENCHMARKS[name]
+        params = dict(spec["params"], **overrides)
+        for size in args.sizes or spec["sizes"]:
+            result = measure(name, size, params, args.repeat)
+            results.append(result)
+            print(f"{name:26} {size:>7} {result['median_s'] * 1000:>10.2f} мс "
+                  f"{result['per_action_us']:>10.2f} мкс/действие", file=sys.stderr)
+
+    regressions = []
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+
+    report = {"environment": environment(), "results": results}
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    for name, size, old, new in regressions:
+        print(f"Замедление: {name} size={size}: {old * 1000:.2f} -> {new * 1000:.2f} мс", file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+"""
+Проверка эквивалентности алгоритмов путей на случайных моделях
+
+На --models случайных моделях в простом формате ({action_name:
+{"init_states": [...], "final_states": [...]}}) сверяются:
+
+- PathEngine (path_engine.py) с рекурсивным алгоритмом исходного
+  BDDGeneratorSimple - на моделях без циклов;
+- число путей PathCounter (model_stats.py) с len(ways_to_action) движка;
+- PathSampler.path(действие, i) (path_sampling.py) с i-м путем движка;
+- PathEngine.update_model после случайной правки с новым движком.
+
+Счетчик, выборка и обновление проверяются и на моделях с циклами при
+политике "skip": для "break" счетчики приближенные. Модели воспроизводимы
+по --seed.
+
+    python -m benchmarks.equivalence --models 300 --cyclic 400 --seed 1
+
+Отчет - JSON со сводкой по проверкам и первыми расхождениями. Любое
+расхождение дает код возврата 1.
+"""
+
+import argparse
+import copy
+import json
+import logging
+import random
+import sys
+
+from model_stats import PathCounter
+from path_engine import PathEngine
+from path_sampling import PathSampler
+
+CHECKS = ("reference", "counter", "sampler", "update")
+
+# Сколько расхождений каждой проверки попадает в отчет
+MAX_REPORTED = 10
+
+
+class ReferencePaths:
+    """Рекурсивный алгоритм путей исходного BDDGeneratorSimple (только без циклов)"""
+
+    def __init__(self, model):
+        self.model = model
+        self.states = {}
+        for action_name, action_data in model.items():
+            for final_state in action_data.get("final_states", []):
+                self.states.setdefault(final_state, {"actions": []})["actions"].append(action_name)
+        self.ways_to_action_cache = {}
+        self.ways_to_state_cache = {}
+
+    def get_ways_to_action(self, action_name):
+        if action_name in self.ways_to_action_cache:
+            return self.ways_to_action_cache[action_name]
+
+        init_states = self.model.get(action_name, {}).get("init_states", [])
+        if not init_states:
+            self.ways_to_action_cache[action_name] = []
+            return []
+
+        ways_to_states = {}
+        for init_state in init_states:
+            if init_state not in self.states:
+                self.ways_to_action_cache[action_name] = []
+                return []
+            ways_to_state = self.get_ways_to_state(init_state)
+            if not ways_to_state:
+                self.ways_to_action_cache[action_name] = []
+                return []
+            ways_to_states[init_state] = ways_to_state
+
+        final_ways = []
+        for ways_to_state in ways_to_states.values():
+            if len(final_ways) == 0:
+                final_ways = ways_to_state
+                continue
+            final_ways = [list(dict.fromkeys(way_left + way_right))
+                          for way_left in final_ways for way_right in ways_to_state]
+
+        self.ways_to_action_cache[action_name] = final_ways
+        return final_ways
+
+    def get_ways_to_state(self, state_name):
+        if state_name in self.ways_to_state_cache:
+            return self.ways_to_state_cache[state_name]
+
+        all_ways_to_state = []
+        for action_name in self.states.get(state_name, {"actions": []})["actions"]:
+            prereq_paths = self.get_ways_to_action(action_name)
+            if len(prereq_paths) == 0:
+                all_ways_to_state.append([action_name])
+            else:
+                all_ways_to_state.extend(path + [action_name] for path in prereq_paths)
+
+        self.ways_to_state_cache[state_name] = all_ways_to_state
+        return all_ways_to_state
+
+
+def random_model(rng, cyclic=False, max_actions=12, max_states=10):
+    """
+    Случайная модель в простом формате
+
+    Без циклов: у действий и состояний случайные ранги, начальные состояния
+    действия - ранга ниже его собственного, конечные - не ниже, поэтому
+    любая зависимость ведет к действию меньшего ранга. С cyclic=True часть
+    действий рангов не учитывает, и через них возникают циклы.
+    """
+    levels = 4
+    states = [f"s{number}" for number in range(rng.randint(2, max_states))]
+    state_rank = {state: rng.randrange(levels) for state in states}
+    model = {}
+    for number in range(rng.randint(2, max_actions)):
+        rank = rng.randrange(levels)
+        free = cyclic and rng.random() < 0.3
+        inputs = states if free else [s for s in states if state_rank[s] < rank]
+        outputs = states if free else [s for s in states if state_rank[s] >= rank]
+        init_states = rng.sample(inputs, min(len(inputs), rng.randint(0, 3)))
+        # Изредка - состояние, которое никто не создает, или повтор
+        if init_states and rng.random() < 0.1:
+            init_states.append(rng.choice(["missing", init_states[0]]))
+        final_states = rng.sample(outputs, min(len(outputs), rng.randint(1, 2)))
+        model[f"a{number}"] = {"init_states": init_states, "final_states": final_states}
+    return model
+
+
+def edit_model(model, rng, cyclic=False):
+    """Копия модели с одним измененным, добавленным или удаленным действием"""
+    model = copy.deepcopy(model)
+    action_name = rng.choice(list(model))
+    edit = rng.choice(("remove", "add", "rewire"))
+    if edit == "remove" and len(model) > 1:
+        del model[action_name]
+    elif edit == "add":
+        # Новое действие без начальных состояний циклов не создает
+        model[f"a{len(model) + 100}"] = {"init_states": [], "final_states": [rng.choice(_states(model))]}
+    else:
+        init_states = model[action_name]["init_states"]
+        if init_states:
+            init_states.pop(rng.randrange(len(init_states)))
+        elif cyclic:
+            init_states.append(rng.choice(_states(model)))
+    return model
+
+
+def _states(model):
+    """Состояния, которые создает хотя бы одно действие (или одно новое, если таких нет)"""
+    return sorted({state for data in model.values() for state in data["final_states"]}) or ["s_new"]
+
+
+def check_model(model, cycle_policy, reference=True):
+    """
+    Сверяет алгоритмы на одной модели
+
+    Returns:
+        {проверка: описание первого расхождения} (пусто - все совпало)
+    """
+    engine = PathEngine(model, cycle_policy=cycle_policy)
+    counter = PathCounter(model, cycle_policy=cycle_policy)
+    sampler = PathSampler(counter)
+    expected = ReferencePaths(model) if reference else None
+
+    failures = {}
+    for action_name in model:
+        ways = engine.ways_to_action(action_name)
+        if expected is not None and "reference" not in failures:
+            reference_ways = expected.get_ways_to_action(action_name)
+            if ways != reference_ways:
+                failures["reference"] = {"action": action_name, "engine": ways, "expected": reference_ways}
+        count = counter.ways_to_action(action_name)
+        if count != len(ways):
+            # Выборка опирается на счетчики: при неверном числе путей ее не проверить
+            failures.setdefault("counter", {"action": action_name, "count": count, "paths": len(ways)})
+        elif "sampler" not in failures:
+            for index, way in enumerate(ways):
+                path = sampler.path(action_name, index)
+                if path != way:
+                    failures["sampler"] = {"action": action_name, "index": index, "path": path, "expected": way}
+                    break
+    return failures
+
+
+def check_update(model, edited, cycle_policy):
+    """Движок после update_model(edited) против нового движка; None - совпало"""
+    engine = PathEngine(model, cycle_policy=cycle_policy)
+    engine.analyze()
+    engine.update_model(edited)
+    fresh = PathEngine(edited, cycle_policy=cycle_policy)
+    for action_name in edited:
+        ways = engine.ways_to_action(action_name)
+        expected = fresh.ways_to_action(action_name)
+        if ways != expected:
+            return {"action": action_name, "updated": ways, "expected": expected}
+    return None
+
+
+def run(models, cyclic_models, seed):
+    """
+    Прогон проверок
+
+    Returns:
+        {проверка: {"models": проверено, "failures": [расхождения]}}
+    """
+    rng = random.Random(seed)
+    results = {check: {"models": 0, "mismatches": 0, "failures": []} for check in CHECKS}
+
+    def record(check, number, kind, failure):
+        results[check]["models"] += 1
+        if failure is None:
+            return
+        results[check]["mismatches"] += 1
+        if len(results[check]["failures"]) < MAX_REPORTED:
+            results[check]["failures"].append({"model": number, "kind": kind, **failure})
+
+    plan = [("acyclic", "break")] * models + [("cyclic", "skip")] * cyclic_models
+    for number, (kind, cycle_policy) in enumerate(plan):
+        cyclic = kind == "cyclic"
+        model = random_model(rng, cyclic=cyclic)
+        failures = check_model(model, cycle_policy, reference=not cyclic)
+        checks = ("counter", "sampler") if cyclic else ("reference", "counter", "sampler")
+        for check in checks:
+            failure = failures.get(check)
+            record(check, number, kind, dict(failure, model_data=model) if failure else None)
+        edited = edit_model(model, rng, cyclic=cyclic)
+        failure = check_update(model, edited, cycle_policy)
+        record("update", number, kind, dict(failure, model_data=edited) if failure else None)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.equivalence",
+                                     description="Сверка движка, счетчика и выборки путей на случайных моделях")
+    parser.add_argument("--models", type=int, default=300, help="Моделей без циклов")
+    parser.add_argument("--cyclic", type=int, default=400, help="Моделей с циклами (политика skip)")
+    parser.add_argument("--seed", type=int, default=0, help="Зерно моделей")
+    parser.add_argument("--output", "-o", help="Файл отчета JSON (по умолчанию - stdout)")
+    args = parser.parse_args(argv)
+
+    # Движок предупреждает о каждом найденном цикле
+    logging.disable(logging.WARNING)
+
+    results = run(args.models, args.cyclic, args.seed)
+    mismatches = sum(result["mismatches"] for result in results.values())
+    report = {
+        "seed": args.seed,
+        "models": args.models,
+        "cyclic": args.cyclic,
+        "mismatches": mismatches,
+        "checks": results
+    }
+    print(json.dumps({check: {"models": result["models"], "mismatches": result["mismatches"]}
+                      for check, result in results.items()}, ensure_ascii=False), file=sys.stderr)
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
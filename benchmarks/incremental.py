@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+Проверка инкрементальной генерации тестов: совпадение с полной и выигрыш
+
+Сессия GenerationSession (generation_sessions.py) получает синтетическую
+модель и затем --steps ее случайных правок, как при редактировании
+графа: добавление и удаление действия, переименование действия, перенос
+и удаление связи. После каждой правки файлы тестов сессии сравниваются с
+файлами генератора, построенного по той же модели с нуля, и замеряется
+время обоих. Правки воспроизводимы по --seed.
+
+    python -m benchmarks.incremental --size 300 --depth 3 --steps 50 --seed 1
+
+Отчет - JSON по шагам (правка, режим обновления сессии, сколько файлов
+построено заново, время инкрементальной и полной генерации) и сводка.
+Любое расхождение файлов дает код возврата 1.
+"""
+
+import argparse
+import copy
+import json
+import logging
+import random
+import statistics
+import sys
+import time
+
+from benchmarks import synthetic
+from path_engine import CYCLE_POLICIES
+from test_generator_adapted import create_test_generator
+from generation_sessions import GenerationSession
+
+EDITS = ("add_action", "remove_action", "rename_action", "rewire", "remove_connection")
+
+
+def _next_id(items, field, prefix):
+    number = max((int(item[field][1:]) for item in items), default=0) + 1
+    return f"{prefix}{number:05d}"
+
+
+def _layers(model):
+    """ID состояний по слоям: в synthetic.py у каждого слоя свой объект, по порядку"""
+    return [[obj["object_id"] + state["state_id"] for state in obj["resource_state"]]
+            for obj in model["model_objects"]]
+
+
+def _layer_of(layers, state_id):
+    return next(number for number, states in enumerate(layers) if state_id in states)
+
+
+def edit_model(model, rng):
+    """
+    Случайная правка модели на месте
+
+    Правки сохраняют слоистость synthetic.py (действие слоя k требует
+    состояния слоя k - 1 и создает состояние слоя k), поэтому модель
+    остается без циклов, а число путей - сравнимым с исходным.
+
+    Returns:
+        Описание правки (строка)
+    """
+    actions = model["model_actions"]
+    connections = model["model_connections"]
+    layers = _layers(model)
+    edit = rng.choice(EDITS)
+
+    if edit == "add_action" or len(actions) < 2:
+        action_id = _next_id(actions, "action_id", "a")
+        action = {
+            "action_id": action_id,
+            "action_actor": "Пользователь",
+            "action_action": f"правка {action_id}",
+            "action_place": "Редактор"
+        }
+        action["action_name"] = synthetic.action_name(action)
+        actions.append(action)
+        layer = rng.randrange(len(layers))
+        inputs = layers[layer - 1] if layer else []
+        for state in rng.sample(inputs, min(len(inputs), rng.randint(1, 2))):
+            connections.append({"connection_id": _next_id(connections, "connection_id", "c"),
+                                "connection_out": state, "connection_in": action_id, "type": "triggers"})
+        connections.append({"connection_id": _next_id(connections, "connection_id", "c"),
+                            "connection_out": action_id, "connection_in": rng.choice(layers[layer]), "type": "results_in"})
+        return f"add_action {action_id}"
+
+    if edit == "remove_action":
+        action_id = rng.choice(actions)["action_id"]
+        model["model_actions"] = [a for a in actions if a["action_id"] != action_id]
+        model["model_connections"] = [c for c in connections
+                                      if action_id not in (c["connection_out"], c["connection_in"])]
+        return f"remove_action {action_id}"
+
+    if edit == "rename_action":
+        action = rng.choice(actions)
+        action["action_action"] += " (изм.)"
+        action["action_name"] = synthetic.action_name(action)
+        return f"rename_action {action['action_id']}"
+
+    if not connections:
+        return "noop"
+    connection = rng.choice(connections)
+    if edit == "rewire":
+        side = "connection_out" if connection["type"] == "triggers" else "connection_in"
+        connection[side] = rng.choice(layers[_layer_of(layers, connection[side])])
+        return f"rewire {connection['connection_id']}"
+    connections.remove(connection)
+    return f"remove_connection {connection['connection_id']}"
+
+
+def timed_files(generator):
+    """(время, {имя файла: содержимое}) перебора всех файлов генератора"""
+    started = time.perf_counter()
+    files = dict(generator.iter_tests())
+    return time.perf_counter() - started, files
+
+
+def run(size, steps, seed, options, params, processes=1):
+    """
+    Прогон правок
+
+    Returns:
+        (шаги, число расхождений)
+    """
+    rng = random.Random(seed)
+    model = synthetic.project_model(size, seed=seed, **params)
+    session = GenerationSession(options)
+    session.prepare(copy.deepcopy(model), processes=processes)
+    timed_files(session.generator)
+
+    results = []
+    mismatches = 0
+    for step in range(1, steps + 1):
+        edit = edit_model(model, rng)
+
+        started = time.perf_counter()
+        generator = session.prepare(copy.deepcopy(model), processes=processes)
+        prepare_s = time.perf_counter() - started
+        render_s, incremental_files = timed_files(generator)
+        update = session.stats()
+
+        started = time.perf_counter()
+        full_generator = create_test_generator(copy.deepcopy(model), processes=processes, **options)
+        build_s = time.perf_counter() - started
+        full_render_s, full_files = timed_files(full_generator)
+
+        differing = sorted(name for name in incremental_files.keys() | full_files.keys()
+                           if incremental_files.get(name) != full_files.get(name))
+        if differing:
+            mismatches += 1
+            print(f"Расхождение на шаге {step} ({edit}): {', '.join(differing[:5])}", file=sys.stderr)
+
+        results.append({
+            "step": step,
+            "edit": edit,
+            "mode": update["mode"],
+            "changed_actions": update["changed_actions"],
+            "rendered": update.get("rendered"),
+            "reused": update.get("reused"),
+            "files": len(full_files),
+            "incremental_s": round(prepare_s + render_s, 6),
+            "full_s": round(build_s + full_render_s, 6),
+            "match": not differing,
+            "differing_files": differing[:20]
+        })
+    return results, mismatches
+
+
+def summary(results):
+    """Сводка: число шагов по режимам и медианы времени"""
+    incremental = [r["incremental_s"] for r in results]
+    full = [r["full_s"] for r in results]
+    modes = {}
+    for result in results:
+        modes[result["mode"]] = modes.get(result["mode"], 0) + 1
+    return {
+        "steps": len(results),
+        "mismatches": sum(1 for r in results if not r["match"]),
+        "modes": modes,
+        "incremental_median_s": round(statistics.median(incremental), 6) if incremental else None,
+        "full_median_s": round(statistics.median(full), 6) if full else None,
+        "speedup": round(sum(full) / sum(incremental), 2) if incremental and sum(incremental) else None
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.incremental",
+                                     description="Инкрементальная генерация тестов против полной на случайных правках")
+    parser.add_argument("--size", type=int, default=300, help="Число действий исходной модели")
+    parser.add_argument("--depth", type=int, default=3, help="Число слоев модели")
+    parser.add_argument("--fan-in", type=int, default=2, help="Начальных состояний у действия")
+    parser.add_argument("--producers", type=int, default=2, help="Действий, создающих одно состояние")
+    parser.add_argument("--steps", type=int, default=30, help="Число правок")
+    parser.add_argument("--seed", type=int, default=0, help="Зерно модели и правок")
+    parser.add_argument("--cycle-policy", choices=CYCLE_POLICIES, default="break", help="Обработка циклов")
+    parser.add_argument("--max-scenarios", type=int, help="Максимум сценариев на действие")
+    parser.add_argument("--processes", type=int, default=1, help="Процессы рендеринга (0 - по числу CPU)")
+    parser.add_argument("--output", "-o", help="Файл отчета JSON (по умолчанию - stdout)")
+    args = parser.parse_args(argv)
+
+    # Генераторы пишут в лог каждое действие; в замер это не входит
+    logging.disable(logging.WARNING)
+
+    options = {"cycle_policy": args.cycle_policy}
+    if args.max_scenarios:
+        options["max_scenarios_per_action"] = args.max_scenarios
+    params = {"depth": args.depth, "fan_in": args.fan_in, "producers": args.producers}
+
+    results, mismatches = run(args.size, args.steps, args.seed, options, params, args.processes or None)
+    report = {
+        "size": args.size,
+        "seed": args.seed,
+        "params": params,
+        "options": options,
+        "summary": summary(results),
+        "steps": results
+    }
+    print(json.dumps(report["summary"], ensure_ascii=False), file=sys.stderr)
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
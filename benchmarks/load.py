@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+"""
+Нагрузочный прогон api_main.py: параллельные запросы и задержки по эндпоинтам
+
+Потоки-клиенты выбирают эндпоинт по весам --mix и шлют запросы, пока не
+истечет --duration или не будет отправлено --requests запросов. Время
+запроса - от отправки до чтения ответа целиком (для ZIP и SSE - до
+конца потока). В отчете по каждому эндпоинту: число запросов и ошибок,
+пропускная способность и задержки p50/p95/p99.
+
+    python -m benchmarks.mock_ollama --port 11434 &
+    OLLAMA_URL=http://127.0.0.1:11434 python api_main.py --port 5000 &
+    python -m benchmarks.load --url http://127.0.0.1:5000 --concurrency 8 --duration 30
+
+Эндпоинты:
+- generate-model - POST /api/generate-model с текстом ТЗ; к тексту
+  добавляются метка прогона и номер запроса, чтобы не попадать в кэш
+  ответов LLM (--repeat-text - одинаковый текст);
+- generate-model-stream - POST /api/generate-model/stream (SSE);
+- generate-tests - POST /api/generate-tests с моделью --tests-model; в
+  режиме edit (по умолчанию) клиент перед каждым запросом добавляет в
+  свою копию модели действие, как при правке графа, в режиме same
+  модель не меняется (повторы отдаются из кэша архивов).
+"""
+
+import argparse
+import copy
+import http.client
+import json
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from urllib.parse import urlparse
+
+from benchmarks import ROOT
+
+ENDPOINTS = {
+    "generate-model": "/api/generate-model",
+    "generate-model-stream": "/api/generate-model/stream",
+    "generate-tests": "/api/generate-tests"
+}
+
+DEFAULT_TEXT = (
+    "Пользователь создает документ в реестре документов. Пользователь изменяет реквизиты документа "
+    "и прикрепляет файл. Руководитель назначает ответственного, секретарь регистрирует документ."
+)
+
+
+def percentile(sorted_values, q):
+    """Перцентиль q (0..100) по отсортированному списку, метод ближайшего ранга"""
+    if not sorted_values:
+        return None
+    rank = max(1, -(-len(sorted_values) * q // 100))
+    return sorted_values[int(rank) - 1]
+
+
+class Endpoint:
+    """Счетчики одного эндпоинта (пополняются из нескольких потоков)"""
+
+    def __init__(self, name):
+        self.name = name
+        self.latencies = []
+        self.errors = 0
+        self.statuses = {}
+        self.bytes = 0
+        self._lock = threading.Lock()
+
+    def record(self, latency, status, size, ok):
+        with self._lock:
+            self.latencies.append(latency)
+            self.statuses[status] = self.statuses.get(status, 0) + 1
+            self.bytes += size
+            if not ok:
+                self.errors += 1
+
+    def report(self, elapsed):
+        latencies = sorted(self.latencies)
+        ms = lambda value: round(value * 1000, 2) if value is not None else None
+        return {
+            "requests": len(latencies),
+            "errors": self.errors,
+            "statuses": {str(status): count for status, count in sorted(self.statuses.items(), key=str)},
+            "throughput_rps": round(len(latencies) / elapsed, 3) if elapsed else None,
+            "bytes": self.bytes,
+            "latency_ms": {
+                "mean": ms(sum(latencies) / len(latencies)) if latencies else None,
+                "p50": ms(percentile(latencies, 50)),
+                "p95": ms(percentile(latencies, 95)),
+                "p99": ms(percentile(latencies, 99)),
+                "max": ms(latencies[-1] if latencies else None)
+            }
+        }
+
+
+class LoadDriver:
+    """Параллельные клиенты api_main.py"""
+
+    def __init__(self, url, mix, concurrency=4, duration=None, requests=None, text=DEFAULT_TEXT,
+                 repeat_text=False, tests_model=None, tests_mode="edit", generate_zip=True,
+                 timeout=300.0, seed=None):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "127.0.0.1"
+        self.port = parsed.port or 80
+        self.mix = mix
+        self.concurrency = concurrency
+        self.duration = duration
+        self.requests = requests
+        self.text = text
+        self.repeat_text = repeat_text
+        self.tests_model = tests_model
+        self.tests_mode = tests_mode
+        self.generate_zip = generate_zip
+        self.timeout = timeout
+        self.seed = seed
+        self.endpoints = {name: Endpoint(name) for name in mix}
+        self.run_id = uuid.uuid4().hex[:8]
+        self._sent = 0
+        self._lock = threading.Lock()
+        self._deadline = None
+
+    def _next_number(self):
+        """Номер следующего запроса или None, если запросы закончились"""
+        with self._lock:
+            if self.requests is not None and self._sent >= self.requests:
+                return None
+            if self._deadline is not None and time.monotonic() >= self._deadline:
+                return None
+            self._sent += 1
+            return self._sent
+
+    def _body(self, name, number, worker, state):
+        if name == "generate-tests":
+            model = state["model"]
+            if self.tests_mode == "edit":
+                self._edit_model(model, number, state["rng"])
+            return {"model": model, "generate_zip": self.generate_zip}
+        text = self.text if self.repeat_text else f"{self.text}\n\nЗапрос {self.run_id}-{number}."
+        return {"text": text, "model_name": f"load_worker_{worker}"}
+
+    @staticmethod
+    def _edit_model(model, number, rng):
+        """Добавляет действие, которому нужно одно из существующих состояний"""
+        action_id = f"load{number:06d}"
+        model["model_actions"].append({"action_id": action_id, "action_name": f"Нагрузочное действие {number}"})
+        states = [obj["object_id"] + state["state_id"]
+                  for obj in model.get("model_objects", []) for state in obj.get("resource_state", [])]
+        if states:
+            model["model_connections"].append({"connection_out": rng.choice(states), "connection_in": action_id})
+
+    def _request(self, name, body):
+        """Отправляет запрос и читает ответ целиком; (статус, байт, успех)"""
+        conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        try:
+            data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+            conn.request("POST", ENDPOINTS[name], body=data, headers={"Content-Type": "application/json"})
+            response = conn.getresponse()
+            payload = response.read()
+            return response.status, len(payload), self._ok(name, response.status, payload)
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _ok(name, status, payload):
+        """Успешен ли ответ: /api/generate-model отвечает 200 и при ошибке LLM"""
+        if status >= 400:
+            return False
+        if name == "generate-model":
+            try:
+                return json.loads(payload.decode("utf-8")).get("success", True) is not False
+            except ValueError:
+                return False
+        if name == "generate-model-stream":
+            return b"event: error" not in payload
+        return True
+
+    def _worker(self, worker):
+        rng = random.Random(None if self.seed is None else self.seed + worker)
+        names = list(self.mix)
+        weights = [self.mix[name] for name in names]
+        state = {"rng": rng, "model": copy.deepcopy(self.tests_model) if self.tests_model else None}
+        if state["model"] is not None:
+            # Своя сессия генерации тестов у каждого клиента
+            state["model"].setdefault("metadata", {})["name"] = f"load_worker_{worker}"
+        while True:
+            number = self._next_number()
+            if number is None:
+                return
+            name = rng.choices(names, weights)[0]
+            body = self._body(name, number, worker, state)
+            started = time.perf_counter()
+            try:
+                status, size, ok = self._request(name, body)
+            except (OSError, http.client.HTTPException):
+                status, size, ok = "exception", 0, False
+            self.endpoints[name].record(time.perf_counter() - started, status, size, ok)
+
+    def run(self):
+        """Прогон нагрузки; возвращает отчет"""
+        started = time.monotonic()
+        if self.duration:
+            self._deadline = started + self.duration
+        threads = [threading.Thread(target=self._worker, args=(worker,), daemon=True)
+                   for worker in range(self.concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.monotonic() - started
+        total = sum(len(endpoint.latencies) for endpoint in self.endpoints.values())
+        return {
+            "target": f"http://{self.host}:{self.port}",
+            "concurrency": self.concurrency,
+            "elapsed_s": round(elapsed, 3),
+            "requests": total,
+            "throughput_rps": round(total / elapsed, 3) if elapsed else None,
+            "endpoints": {name: endpoint.report(elapsed) for name, endpoint in self.endpoints.items()}
+        }
+
+
+def parse_mix(value):
+    """'generate-model=1,generate-tests=3' -> {эндпоинт: вес}"""
+    mix = {}
+    for part in value.split(","):
+        if not part.strip():
+            continue
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in ENDPOINTS:
+            raise argparse.ArgumentTypeError(f"неизвестный эндпоинт {name} (ожидается один из {', '.join(ENDPOINTS)})")
+        mix[name] = float(weight) if weight else 1.0
+    if not mix:
+        raise argparse.ArgumentTypeError("пустая смесь эндпоинтов")
+    return mix
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.load", description="Нагрузочный прогон API Graph Editor")
+    parser.add_argument("--url", default="http://127.0.0.1:5000", help="Адрес api_main.py")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix("generate-model=1,generate-tests=1"),
+                        help="Эндпоинты с весами: generate-model=1,generate-model-stream=1,generate-tests=3")
+    parser.add_argument("--concurrency", "-c", type=int, default=4, help="Параллельных клиентов")
+    parser.add_argument("--duration", "-d", type=float, help="Длительность прогона, с (по умолчанию 10, если не задан --requests)")
+    parser.add_argument("--requests", "-n", type=int, help="Всего запросов")
+    parser.add_argument("--text", help="Файл с текстом ТЗ для generate-model")
+    parser.add_argument("--repeat-text", action="store_true", help="Одинаковый текст во всех запросах (кэш ответов LLM)")
+    parser.add_argument("--tests-model", default=os.path.join(ROOT, "test_project.json"), help="Модель для generate-tests")
+    parser.add_argument("--tests-mode", choices=("edit", "same"), default="edit",
+                        help="edit - модель меняется перед каждым запросом, same - одна и та же")
+    parser.add_argument("--json-tests", action="store_true", help="generate-tests с generate_zip=false (ответ JSON)")
+    parser.add_argument("--timeout", type=float, default=300.0, help="Таймаут запроса, с")
+    parser.add_argument("--seed", type=int, help="Зерно выбора эндпоинтов")
+    parser.add_argument("--output", "-o", help="Файл отчета JSON (по умолчанию - stdout)")
+    args = parser.parse_args(argv)
+
+    text = DEFAULT_TEXT
+    if args.text:
+        with open(args.text, encoding="utf-8") as f:
+            text = f.read()
+    tests_model = None
+    if "generate-tests" in args.mix:
+        with open(args.tests_model, encoding="utf-8") as f:
+            tests_model = json.load(f)
+
+    driver = LoadDriver(
+        args.url,
+        args.mix,
+        concurrency=args.concurrency,
+        duration=args.duration if args.duration or args.requests else 10.0,
+        requests=args.requests,
+        text=text,
+        repeat_text=args.repeat_text,
+        tests_model=tests_model,
+        tests_mode=args.tests_mode,
+        generate_zip=not args.json_tests,
+        timeout=args.timeout,
+        seed=args.seed
+    )
+    report = driver.run()
+
+    for name, endpoint in report["endpoints"].items():
+        latency = endpoint["latency_ms"]
+        print(f"{name:22} {endpoint['requests']:>6} запр. {endpoint['errors']:>5} ошиб. "
+              f"{endpoint['throughput_rps']:>8.2f} rps  p50 {latency['p50']} мс  "
+              f"p95 {latency['p95']} мс  p99 {latency['p99']} мс", file=sys.stderr)
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,375 @@
+#!/usr/bin/env python3
+"""
+Локальная замена Ollama для нагрузочных тестов api_main.py
+
+Отвечает на GET /api/tags и POST /api/generate (обычный ответ и поток
+NDJSON, "stream": true) заготовленными наборами действий в формате,
+который просит промпт api_main.py. Задержка ответа, разброс и сбои
+настраиваются:
+
+- latency / jitter - задержка до первого токена (равномерно в
+  latency ± jitter), token_delay - пауза между порциями потока;
+- truncate_rate - ответ обрывается посередине JSON, как при исчерпании
+  num_predict (done_reason = "length");
+- malformed_rate - JSON испорчен: текст вокруг массива, лишние запятые,
+  одинарные кавычки;
+- error_rate - HTTP 500 (в потоке - строка {"error": ...} посреди ответа).
+
+Набор действий выбирается по хэшу промпта: один и тот же текст дает одну
+и ту же модель. Наборы - встроенные, из файла (--actions) или
+синтетические (--synthetic N, benchmarks/synthetic.py).
+
+    python -m benchmarks.mock_ollama --port 11434 --latency 0.5 --jitter 0.2
+    OLLAMA_URL=http://localhost:11434 python api_main.py
+
+GET /mock/stats - счетчики запросов и сбоев; POST /mock/config меняет
+параметры на лету (тело - JSON с теми же именами, что у MockConfig).
+"""
+
+import argparse
+import datetime
+import hashlib
+import http.server
+import json
+import random
+import socketserver
+import threading
+import time
+
+from benchmarks import synthetic
+
+MODEL_NAME = "llama3.2"
+
+
+def _action(actor, action, place, init_states, final_states):
+    return {
+        "action_actor": actor,
+        "action_action": action,
+        "action_place": place,
+        "init_states": [{"object_name": obj, "state_name": state} for obj, state in init_states],
+        "final_states": [{"object_name": obj, "state_name": state} for obj, state in final_states]
+    }
+
+
+# Встроенные наборы действий (как их возвращает LLM на типичные ТЗ)
+CANNED_ACTION_SETS = {
+    "documents": [
+        _action("пользователь", "создает документ", "реестр документов",
+                [("документ", "не существует")], [("документ", "создан")]),
+        _action("пользователь", "изменяет реквизиты документа", "карточка документа",
+                [("документ", "создан")], [("документ", "изменен")]),
+        _action("пользователь", "прикрепляет файл", "карточка документа",
+                [("документ", "создан")], [("документ", "прикреплен к файлу")]),
+        _action("руководитель", "назначает ответственного", "карточка документа",
+                [("документ", "изменен"), ("сотрудник", "активен")], [("документ", "назначен ответственным")]),
+        _action("секретарь", "регистрирует документ", "журнал регистрации",
+                [("документ", "назначен ответственным"), ("документ", "прикреплен к файлу")],
+                [("документ", "зарегистрирован")])
+    ],
+    "tasks": [
+        _action("менеджер", "создает задачу", "доска задач",
+                [("задача", "не существует")], [("задача", "создана")]),
+        _action("менеджер", "назначает исполнителя", "карточка задачи",
+                [("задача", "создана"), ("исполнитель", "свободен")], [("задача", "назначена")]),
+        _action("исполнитель", "берет задачу в работу", "доска задач",
+                [("задача", "назначена")], [("задача", "в работе")]),
+        _action("исполнитель", "закрывает задачу", "карточка задачи",
+                [("задача", "в работе")], [("задача", "выполнена")]),
+        _action("менеджер", "возвращает задачу на доработку", "карточка задачи",
+                [("задача", "выполнена")], [("задача", "в работе")])
+    ],
+    "contacts": [
+        _action("оператор", "создает контакт", "справочник контактов",
+                [("контакт", "не существует")], [("контакт", "создан")]),
+        _action("оператор", "редактирует контакт", "форма редактирования",
+                [("контакт", "создан")], [("контакт", "изменен")]),
+        _action("система", "отправляет уведомление", "почтовый сервис",
+                [("контакт", "изменен")], [("уведомление", "отправлено")]),
+        _action("оператор", "архивирует контакт", "справочник контактов",
+                [("контакт", "создан")], [("контакт", "в архиве")])
+    ]
+}
+
+
+class MockConfig:
+    """Параметры ответов; меняются на лету через POST /mock/config"""
+
+    FIELDS = ("latency", "jitter", "token_delay", "chunk_chars", "truncate_rate", "malformed_rate", "error_rate")
+
+    def __init__(self, latency=0.2, jitter=0.1, token_delay=0.005, chunk_chars=24,
+                 truncate_rate=0.0, malformed_rate=0.0, error_rate=0.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.token_delay = token_delay
+        self.chunk_chars = chunk_chars
+        self.truncate_rate = truncate_rate
+        self.malformed_rate = malformed_rate
+        self.error_rate = error_rate
+
+    def update(self, values):
+        """Меняет известные параметры; неизвестные имена - ValueError"""
+        unknown = set(values) - set(self.FIELDS)
+        if unknown:
+            raise ValueError(f"Неизвестные параметры: {', '.join(sorted(unknown))}")
+        for name, value in values.items():
+            setattr(self, name, type(getattr(self, name))(value))
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.FIELDS}
+
+
+class MockOllama:
+    """Состояние заглушки: наборы действий, параметры, генератор сбоев и счетчики"""
+
+    def __init__(self, action_sets, config, seed=None):
+        self.action_sets = action_sets
+        self.set_names = sorted(action_sets)
+        self.config = config
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.counters = {"tags": 0, "generate": 0, "stream": 0, "truncated": 0, "malformed": 0, "errors": 0}
+
+    def count(self, name):
+        with self._lock:
+            self.counters[name] += 1
+
+    def roll(self, rate):
+        """Случилось ли событие с вероятностью rate"""
+        with self._lock:
+            return rate > 0 and self._rng.random() < rate
+
+    def delay(self):
+        """Задержка до первого токена"""
+        config = self.config
+        with self._lock:
+            spread = self._rng.uniform(-config.jitter, config.jitter) if config.jitter else 0.0
+        return max(0.0, config.latency + spread)
+
+    def actions_for(self, prompt):
+        """Набор действий для промпта (один и тот же для одного текста)"""
+        digest = hashlib.sha256(prompt.encode("utf-8")).digest()
+        name = self.set_names[int.from_bytes(digest[:4], "big") % len(self.set_names)]
+        return name, self.action_sets[name]
+
+    def response_text(self, prompt):
+        """
+        Текст ответа LLM с учетом сбоев
+
+        Returns:
+            (текст, done_reason)
+        """
+        _, actions = self.actions_for(prompt)
+        text = json.dumps(actions, ensure_ascii=False, indent=2)
+        if self.roll(self.config.malformed_rate):
+            self.count("malformed")
+            text = self._malform(text)
+        if self.roll(self.config.truncate_rate):
+            self.count("truncated")
+            with self._lock:
+                cut = self._rng.randint(len(text) // 4, max(len(text) // 4, len(text) - 2))
+            return text[:cut], "length"
+        return text, "stop"
+
+    def _malform(self, text):
+        """Одна из типичных ошибок формата ответа LLM"""
+        with self._lock:
+            kind = self._rng.randrange(4)
+        if kind == 0:
+            return f"Вот результат анализа ТЗ:\n```json\n{text}\n```\nЕсли нужно, уточню детали."
+        if kind == 1:
+            return text.replace("}\n]", "},\n]").replace("]\n  }", "],\n  }")
+        if kind == 2:
+            return text.replace('"', "'")
+        return text.rstrip("]").rstrip() + ",\n"
+
+
+class MockOllamaHandler(http.server.BaseHTTPRequestHandler):
+    """HTTP обработчик заглушки; состояние - self.server.mock"""
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length", 0))
+        return json.loads(self.rfile.read(length).decode("utf-8")) if length else {}
+
+    def do_GET(self):
+        mock = self.server.mock
+        if self.path == "/api/tags":
+            mock.count("tags")
+            self._send_json(200, {"models": [{"name": f"{MODEL_NAME}:latest", "model": f"{MODEL_NAME}:latest"}]})
+        elif self.path == "/mock/stats":
+            self._send_json(200, {"counters": dict(mock.counters), "config": mock.config.as_dict(),
+                                  "action_sets": {name: len(actions) for name, actions in mock.action_sets.items()}})
+        else:
+            self._send_json(404, {"error": f"unknown path {self.path}"})
+
+    def do_POST(self):
+        mock = self.server.mock
+        try:
+            payload = self._read_json()
+        except (ValueError, UnicodeDecodeError) as e:
+            self._send_json(400, {"error": f"invalid JSON: {e}"})
+            return
+
+        if self.path == "/mock/config":
+            try:
+                mock.config.update(payload)
+            except (TypeError, ValueError) as e:
+                self._send_json(400, {"error": str(e)})
+                return
+            self._send_json(200, mock.config.as_dict())
+        elif self.path == "/api/generate":
+            if payload.get("stream", True):
+                self._generate_stream(mock, payload)
+            else:
+                self._generate(mock, payload)
+        else:
+            self._send_json(404, {"error": f"unknown path {self.path}"})
+
+    def _chunk(self, payload):
+        data = (json.dumps(payload, ensure_ascii=False) + "\n").encode("utf-8")
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    @staticmethod
+    def _meta(payload):
+        return {
+            "model": payload.get("model", MODEL_NAME),
+            "created_at": datetime.datetime.now(datetime.timezone.utc).isoformat()
+        }
+
+    def _generate(self, mock, payload):
+        mock.count("generate")
+        started = time.monotonic()
+        time.sleep(mock.delay())
+        if mock.roll(mock.config.error_rate):
+            mock.count("errors")
+            self._send_json(500, {"error": "mock: model runner has unexpectedly stopped"})
+            return
+        text, done_reason = mock.response_text(payload.get("prompt", ""))
+        # Генерация непотокового ответа занимает столько же, сколько поток
+        chunks = -(-len(text) // max(1, mock.config.chunk_chars))
+        time.sleep(mock.config.token_delay * chunks)
+        self._send_json(200, dict(
+            self._meta(payload),
+            response=text,
+            done=True,
+            done_reason=done_reason,
+            total_duration=int((time.monotonic() - started) * 1e9),
+            eval_count=chunks
+        ))
+
+    def _generate_stream(self, mock, payload):
+        mock.count("stream")
+        started = time.monotonic()
+        time.sleep(mock.delay())
+        text, done_reason = mock.response_text(payload.get("prompt", ""))
+        fail_at = None
+        if mock.roll(mock.config.error_rate):
+            mock.count("errors")
+            fail_at = len(text) // 2
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        try:
+            step = max(1, mock.config.chunk_chars)
+            for position in range(0, len(text), step):
+                if fail_at is not None and position >= fail_at:
+                    self._chunk({"error": "mock: model runner has unexpectedly stopped"})
+                    break
+                self._chunk(dict(self._meta(payload), response=text[position:position + step], done=False))
+                if mock.config.token_delay:
+                    time.sleep(mock.config.token_delay)
+            else:
+                self._chunk(dict(
+                    self._meta(payload),
+                    response="",
+                    done=True,
+                    done_reason=done_reason,
+                    total_duration=int((time.monotonic() - started) * 1e9)
+                ))
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+
+
+class MockOllamaServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address, mock):
+        super().__init__(address, MockOllamaHandler)
+        self.mock = mock
+
+
+def load_action_sets(path=None, synthetic_size=None, seed=0):
+    """
+    Наборы действий заглушки
+
+    Args:
+        path: JSON файл - список действий или {имя набора: список действий}
+        synthetic_size: Добавить синтетический набор из стольких действий
+    """
+    action_sets = dict(CANNED_ACTION_SETS)
+    if path:
+        with open(path, encoding="utf-8") as f:
+            loaded = json.load(f)
+        action_sets = loaded if isinstance(loaded, dict) else {"file": loaded}
+    if synthetic_size:
+        action_sets[f"synthetic_{synthetic_size}"] = synthetic.llm_actions(synthetic_size, seed=seed)
+    return action_sets
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.mock_ollama", description="Заглушка Ollama для нагрузочных тестов")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--latency", type=float, default=0.2, help="Задержка до первого токена, с")
+    parser.add_argument("--jitter", type=float, default=0.1, help="Разброс задержки (±), с")
+    parser.add_argument("--token-delay", type=float, default=0.005, help="Пауза между порциями ответа, с")
+    parser.add_argument("--chunk-chars", type=int, default=24, help="Символов в порции потока")
+    parser.add_argument("--truncate-rate", type=float, default=0.0, help="Доля ответов, оборванных посередине JSON")
+    parser.add_argument("--malformed-rate", type=float, default=0.0, help="Доля ответов с испорченным JSON")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Доля ответов с ошибкой (HTTP 500)")
+    parser.add_argument("--actions", help="JSON с наборами действий вместо встроенных")
+    parser.add_argument("--synthetic", type=int, help="Добавить синтетический набор из N действий")
+    parser.add_argument("--seed", type=int, help="Зерно генератора сбоев")
+    args = parser.parse_args(argv)
+
+    config = MockConfig(
+        latency=args.latency,
+        jitter=args.jitter,
+        token_delay=args.token_delay,
+        chunk_chars=args.chunk_chars,
+        truncate_rate=args.truncate_rate,
+        malformed_rate=args.malformed_rate,
+        error_rate=args.error_rate
+    )
+    mock = MockOllama(load_action_sets(args.actions, args.synthetic), config, seed=args.seed)
+    server = MockOllamaServer((args.host, args.port), mock)
+    print(f"🧪 Заглушка Ollama на http://{args.host}:{args.port} "
+          f"(наборов действий: {len(mock.action_sets)}, {json.dumps(config.as_dict())})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
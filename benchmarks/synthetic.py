@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Синтетические модели заданного размера для бенчмарков
+
+Модель - слоистый граф: действия делятся на depth слоев, у каждого слоя
+свой объект, состояния которого создают действия этого слоя. Действие
+слоя k > 0 требует fan_in различных состояний слоя k - 1; каждое
+состояние создают примерно producers действий. Число путей к действиям
+растет с глубиной примерно как producers ** depth, поэтому depth и
+producers задают "тяжесть" модели, а size - ее ширину.
+
+Одни и те же действия выдаются в трех видах:
+- llm_actions() - список действий в формате ответа LLM (init_states и
+  final_states - пары объект/состояние), вход add_action_to_model;
+- project_model() - формат test_project.json с ID вида a00001, o00001,
+  s00001, как у моделей api_main.py;
+- flat_model() - простой формат example.json, вход BDDGeneratorSimple.
+"""
+
+import json
+import math
+import random
+
+
+def llm_actions(size, depth=5, fan_in=2, producers=2, seed=0):
+    """
+    Действия синтетической модели в формате ответа LLM
+
+    Args:
+        size: Число действий
+        depth: Число слоев (не больше size)
+        fan_in: Начальных состояний у действия (кроме первого слоя)
+        producers: Сколько действий в среднем создают одно состояние
+        seed: Зерно генератора (модель воспроизводима)
+
+    Returns:
+        Список {"action_actor", "action_action", "action_place",
+        "init_states": [{"object_name", "state_name"}], "final_states": [...]}
+    """
+    rng = random.Random(seed)
+    depth = max(1, min(depth, size))
+    width = math.ceil(size / depth)
+    states_per_layer = max(1, width // max(1, producers))
+
+    actions = []
+    for number in range(size):
+        layer = number // width
+        position = number % width
+        init_states = []
+        if layer > 0:
+            previous = range(states_per_layer)
+            for state in rng.sample(previous, min(fan_in, len(previous))):
+                init_states.append({"object_name": f"объект {layer - 1}", "state_name": f"состояние {state}"})
+        actions.append({
+            "action_actor": f"пользователь {position % 7}",
+            "action_action": f"выполняет шаг {number}",
+            "action_place": f"экран {layer}",
+            "init_states": init_states,
+            "final_states": [{"object_name": f"объект {layer}", "state_name": f"состояние {position % states_per_layer}"}]
+        })
+    return actions
+
+
+def action_name(action):
+    """Название действия, как его строит api_main.py"""
+    name = f"{action['action_actor']} {action['action_action']}"
+    if action["action_place"]:
+        name += f" ({action['action_place']})"
+    return name
+
+
+def project_model(size, depth=5, fan_in=2, producers=2, seed=0, actions=None):
+    """
+    Модель в формате test_project.json (параметры - как у llm_actions)
+
+    Args:
+        actions: Готовый список llm_actions() (вместо генерации)
+    """
+    if actions is None:
+        actions = llm_actions(size, depth, fan_in, producers, seed)
+
+    model_actions = []
+    model_objects = []
+    model_connections = []
+    objects = {}
+    states = {}
+
+    def state_key(state):
+        obj = objects.get(state["object_name"])
+        if obj is None:
+            obj = objects[state["object_name"]] = {
+                "object_id": f"o{len(objects) + 1:05d}",
+                "object_name": state["object_name"],
+                "resource_state": []
+            }
+            model_objects.append(obj)
+        key = (state["object_name"], state["state_name"])
+        if key not in states:
+            state_id = f"s{len(states) + 1:05d}"
+            obj["resource_state"].append({"state_id": state_id, "state_name": state["state_name"]})
+            states[key] = obj["object_id"] + state_id
+        return states[key]
+
+    def connect(connection_out, connection_in, connection_type):
+        model_connections.append({
+            "connection_id": f"c{len(model_connections) + 1:05d}",
+            "connection_out": connection_out,
+            "connection_in": connection_in,
+            "type": connection_type
+        })
+
+    for number, action in enumerate(actions, 1):
+        action_id = f"a{number:05d}"
+        model_actions.append({
+            "action_id": action_id,
+            "action_actor": action["action_actor"],
+            "action_action": action["action_action"],
+            "action_place": action["action_place"],
+            "action_name": action_name(action)
+        })
+        for state in action["init_states"]:
+            connect(state_key(state), action_id, "triggers")
+        for state in action["final_states"]:
+            connect(action_id, state_key(state), "results_in")
+
+    return {
+        "version": "1.0",
+        "metadata": {"name": f"synthetic_{len(actions)}", "source": "benchmarks/synthetic.py"},
+        "model_actions": model_actions,
+        "model_objects": model_objects,
+        "model_connections": model_connections
+    }
+
+
+def flat_model(size, depth=5, fan_in=2, producers=2, seed=0, actions=None):
+    """
+    Модель в формате example.json: {action_name: {"init_states": [...], "final_states": [...]}}
+
+    Параметры - как у project_model; состояния - подписи "объект состояние".
+    """
+    if actions is None:
+        actions = llm_actions(size, depth, fan_in, producers, seed)
+
+    def labels(states):
+        return [f"{state['object_name']} {state['state_name']}" for state in states]
+
+    return {
+        action_name(action): {
+            "init_states": labels(action["init_states"]),
+            "final_states": labels(action["final_states"])
+        }
+        for action in actions
+    }
+
+
+def llm_response(size, depth=5, fan_in=2, producers=2, seed=0, fenced=True):
+    """
+    Текст ответа LLM с действиями модели (вход parse_llm_response)
+
+    Args:
+        fenced: Обернуть JSON в ```json ... ```, как часто отвечает модель
+    """
+    text = json.dumps(llm_actions(size, depth, fan_in, producers, seed), ensure_ascii=False, indent=2)
+    return f"```json\n{text}\n```" if fenced else text
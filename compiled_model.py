@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Скомпилированное представление модели test_project.json
+
+Модель разбирается один раз за O(V+E): действия, объекты и состояния
+получают целые номера 0..n-1 в порядке появления в модели, связи
+превращаются в массивы смежности по этим номерам. Генераторы тестов
+(test_generator.py, test_generator_adapted.py) и API работают с номерами
+и таблицами поиска вместо повторного разбора строк model_connections.
+
+Состояние определяется так же, как в model_connections: строкой
+object_id + state_id (номера состояний у каждого объекта свои, см.
+ModelIndex.add_state в model_store.py). Составная строка связи ищется в
+таблице state_index целиком, без разрезания по символам.
+"""
+
+# Направления связей в CompiledModel.edges
+ACTION_TO_STATE = 0
+STATE_TO_ACTION = 1
+
+
+class CompiledModel:
+    """
+    Целочисленные массивы и таблицы поиска модели
+
+    Действия:
+        action_ids[a], action_names[a] (None, если названия нет),
+        action_index: action_id -> a
+    Объекты:
+        object_ids[o], object_names[o], object_index: object_id -> o
+    Состояния:
+        state_keys[s] (object_id + state_id), state_ids[s], state_objects[s],
+        state_labels[s] ("объект состояние"), state_index: ключ -> s
+    Связи:
+        edges - (направление, a, s) в порядке model_connections;
+        produces[a] / consumes[a] - состояния, которые действие создает /
+        которые ему требуются; producers[s] / consumers[s] - обратные списки
+        (без повторов, в порядке связей)
+
+    Повторяющиеся ID сводятся к первому номеру, данные берутся из последнего
+    вхождения - как при заполнении словаря по ID. Связи с неизвестными
+    действиями или состояниями и связи между двумя состояниями пропускаются.
+    """
+
+    def __init__(self, model_data):
+        self.action_ids = []
+        self.action_names = []
+        self.action_index = {}
+        for action in model_data.get("model_actions", []):
+            action_id = action.get("action_id")
+            number = self.action_index.get(action_id)
+            if number is None:
+                self.action_index[action_id] = len(self.action_ids)
+                self.action_ids.append(action_id)
+                self.action_names.append(action.get("action_name"))
+            else:
+                self.action_names[number] = action.get("action_name")
+
+        self.object_ids = []
+        self.object_names = []
+        self.object_index = {}
+        self.state_keys = []
+        self.state_ids = []
+        self.state_names = []
+        self.state_objects = []
+        self.state_labels = []
+        self.state_index = {}
+        for obj in model_data.get("model_objects", []):
+            object_id = obj.get("object_id")
+            object_name = obj.get("object_name", "")
+            object_number = self.object_index.get(object_id)
+            if object_number is None:
+                object_number = self.object_index[object_id] = len(self.object_ids)
+                self.object_ids.append(object_id)
+                self.object_names.append(object_name)
+            else:
+                self.object_names[object_number] = object_name
+
+            for state in obj.get("resource_state", []):
+                state_id = state.get("state_id")
+                state_name = state.get("state_name", "")
+                key = f"{object_id}{state_id}"
+                number = self.state_index.get(key)
+                if number is None:
+                    number = self.state_index[key] = len(self.state_keys)
+                    self.state_keys.append(key)
+                    self.state_ids.append(state_id)
+                    self.state_names.append(state_name)
+                    self.state_objects.append(object_number)
+                    self.state_labels.append(f"{object_name} {state_name}")
+                else:
+                    self.state_names[number] = state_name
+                    self.state_objects[number] = object_number
+                    self.state_labels[number] = f"{object_name} {state_name}"
+
+        self.connections = len(model_data.get("model_connections", []))
+        self.edges = []
+        self.produces = [[] for _ in self.action_ids]
+        self.consumes = [[] for _ in self.action_ids]
+        self.producers = [[] for _ in self.state_keys]
+        self.consumers = [[] for _ in self.state_keys]
+        for conn in model_data.get("model_connections", []):
+            conn_out = conn.get("connection_out") or ""
+            conn_in = conn.get("connection_in") or ""
+            if conn_out in self.action_index:
+                state = self.state_index.get(conn_in)
+                if state is not None:
+                    action = self.action_index[conn_out]
+                    self.edges.append((ACTION_TO_STATE, action, state))
+                    self.produces[action].append(state)
+                    self.producers[state].append(action)
+            elif conn_in in self.action_index:
+                state = self.state_index.get(conn_out)
+                if state is not None:
+                    action = self.action_index[conn_in]
+                    self.edges.append((STATE_TO_ACTION, action, state))
+                    self.consumes[action].append(state)
+                    self.consumers[state].append(action)
+
+        # Повторные связи не меняют граф
+        for adjacency in (self.produces, self.consumes, self.producers, self.consumers):
+            for index, targets in enumerate(adjacency):
+                if len(targets) > 1:
+                    adjacency[index] = list(dict.fromkeys(targets))
+
+        # Название действия -> первый номер с таким названием
+        self.name_index = {}
+        for number in range(len(self.action_ids)):
+            self.name_index.setdefault(self.action_label(number), number)
+
+    def action_label(self, action):
+        """Название действия для сценариев ("Действие <id>", если названия нет)"""
+        name = self.action_names[action]
+        return name if name is not None else f"Действие {self.action_ids[action]}"
+
+    def find_action(self, action_id):
+        """Номер действия по action_id или None"""
+        return self.action_index.get(action_id)
+
+    def find_action_by_name(self, action_name):
+        """Номер первого действия с таким названием или None"""
+        return self.name_index.get(action_name)
+
+    def simple_model(self):
+        """
+        Модель в формате PathEngine и BDDGeneratorSimple
+
+        Returns:
+            {action_name: {"init_states": [...], "final_states": [...]}};
+            состояния - подписи "объект состояние" без повторов, в порядке связей
+        """
+        simple_model = {}
+        labels = self.state_labels
+        for action in range(len(self.action_ids)):
+            simple_model[self.action_label(action)] = {
+                "init_states": list(dict.fromkeys(labels[state] for state in self.consumes[action])),
+                "final_states": list(dict.fromkeys(labels[state] for state in self.produces[action]))
+            }
+        return simple_model
+
+    def stats(self):
+        """Размер модели"""
+        return {
+            "actions": len(self.action_ids),
+            "objects": len(self.object_ids),
+            "states": len(self.state_keys),
+            "connections": self.connections,
+            "edges": len(self.edges)
+        }
@@ -0,0 +1,488 @@
+#!/usr/bin/env python3
+"""
+Дисковый кэш с адресацией по содержимому для API Graph Editor
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def content_key(data):
+    """
+    Возвращает sha256 канонического JSON представления data
+
+    Ключи словарей сортируются, поэтому одинаковые по содержимому
+    данные дают одинаковый ключ независимо от порядка полей.
+    """
+    canonical = json.dumps(data, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class DiskCache:
+    """
+    Кэш файлов в каталоге с вытеснением по LRU и ограничением размера.
+
+    Каждая запись хранится в отдельном файле {key}{suffix}. Время последнего
+    обращения записывается в atime файла, время создания остается в mtime,
+    поэтому порядок LRU и TTL переживают перезапуск сервера.
+
+    С sidecar_suffix у записи есть второй файл {key}{sidecar_suffix}
+    (сведения о записи). Он учитывается в размере записи, удаляется и
+    вытесняется вместе с ней, а запись без него считается отсутствующей.
+    """
+
+    def __init__(self, directory, max_bytes=256 * 1024 * 1024, max_entries=10000,
+                 ttl=None, suffix=".bin", sidecar_suffix=None):
+        """
+        Args:
+            directory: Каталог кэша (создается при необходимости)
+            max_bytes: Максимальный суммарный размер записей
+            max_entries: Максимальное число записей
+            ttl: Время жизни записи в секундах (None - без ограничения)
+            suffix: Расширение файлов записей
+            sidecar_suffix: Расширение второго файла записи (None - без него)
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.suffix = suffix
+        self.sidecar_suffix = sidecar_suffix
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._lock = threading.Lock()
+        # key -> {"size": байты, "created": mtime}; порядок - от давно использованных к недавним
+        self._index = OrderedDict()
+        self._total_bytes = 0
+
+        os.makedirs(self.directory, exist_ok=True)
+        self._load_index()
+
+    def _load_index(self):
+        """Восстанавливает индекс по файлам каталога"""
+        entries = []
+        filenames = set(os.listdir(self.directory))
+        for filename in filenames:
+            if self.sidecar_suffix and filename.endswith(self.sidecar_suffix):
+                # Сведения без записи остаются от прерванной записи или удаления
+                key = filename[:-len(self.sidecar_suffix)]
+                if f"{key}{self.suffix}" not in filenames:
+                    self._remove_file(os.path.join(self.directory, filename))
+                continue
+            if not filename.endswith(self.suffix):
+                continue
+            key = filename[:-len(self.suffix)]
+            try:
+                stat = os.stat(os.path.join(self.directory, filename))
+                size = stat.st_size
+                if self.sidecar_suffix:
+                    size += os.path.getsize(self.sidecar_path_for(key))
+            except OSError:
+                # Запись без сведений неполная
+                self._remove_file(os.path.join(self.directory, filename))
+                continue
+            entries.append((stat.st_atime, key, size, stat.st_mtime))
+
+        for _, key, size, created in sorted(entries):
+            self._index[key] = {"size": size, "created": created}
+            self._total_bytes += size
+
+        with self._lock:
+            self._evict_locked()
+
+        if self._index:
+            logger.info(f"Кэш {self.directory}: загружено {len(self._index)} записей ({self._total_bytes} байт)")
+
+    def path_for(self, key):
+        """Путь к файлу записи"""
+        return os.path.join(self.directory, f"{key}{self.suffix}")
+
+    def sidecar_path_for(self, key):
+        """Путь ко второму файлу записи (сведениям о ней)"""
+        return os.path.join(self.directory, f"{key}{self.sidecar_suffix}")
+
+    @staticmethod
+    def _remove_file(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def _is_expired(self, entry, now):
+        return self.ttl is not None and now - entry["created"] > self.ttl
+
+    def _remove_locked(self, key):
+        entry = self._index.pop(key, None)
+        if entry is None:
+            return
+        self._total_bytes -= entry["size"]
+        self._remove_file(self.path_for(key))
+        if self.sidecar_suffix:
+            self._remove_file(self.sidecar_path_for(key))
+
+    def _evict_locked(self):
+        """Удаляет устаревшие и самые давно использованные записи сверх лимитов"""
+        now = time.time()
+        if self.ttl is not None:
+            for key in [k for k, entry in self._index.items() if self._is_expired(entry, now)]:
+                self._remove_locked(key)
+                self.evictions += 1
+
+        while self._index and (self._total_bytes > self.max_bytes or len(self._index) > self.max_entries):
+            oldest_key = next(iter(self._index))
+            self._remove_locked(oldest_key)
+            self.evictions += 1
+
+    def lookup(self, key):
+        """
+        Проверяет наличие записи и отмечает обращение к ней
+
+        Returns:
+            Путь к файлу записи или None
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._index.get(key)
+            if entry is not None and self._is_expired(entry, now):
+                self._remove_locked(key)
+                self.evictions += 1
+                entry = None
+
+            if entry is not None and self.sidecar_suffix and not os.path.exists(self.sidecar_path_for(key)):
+                # Сведения удалены извне - запись неполная
+                self._remove_locked(key)
+                entry = None
+
+            if entry is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self._index.move_to_end(key)
+            path = self.path_for(key)
+            try:
+                os.utime(path, (now, entry["created"]))
+            except OSError:
+                pass
+            return path
+
+    def get(self, key):
+        """Возвращает содержимое записи (bytes) или None"""
+        path = self.lookup(key)
+        if path is None:
+            return None
+        try:
+            with open(path, "rb") as f:
+                return f.read()
+        except OSError:
+            # Файл удален извне - забываем запись
+            self.forget(key)
+            return None
+
+    def read_sidecar(self, key):
+        """
+        Содержимое второго файла записи (bytes) или None
+
+        Вызывается после успешного lookup(): если файл пропал, запись
+        забывается и обращение считается промахом.
+        """
+        try:
+            with open(self.sidecar_path_for(key), "rb") as f:
+                return f.read()
+        except OSError:
+            self.forget(key)
+            return None
+
+    def forget(self, key):
+        """Удаляет запись, найденную lookup(), но непригодную: обращение становится промахом"""
+        with self._lock:
+            self._remove_locked(key)
+            self.hits -= 1
+            self.misses += 1
+
+    def _write_temp(self, data):
+        """Временный файл в каталоге кэша с содержимым data"""
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+        except Exception:
+            os.remove(tmp_path)
+            raise
+        return tmp_path
+
+    def put(self, key, data, sidecar=None):
+        """Атомарно записывает содержимое (bytes) и сведения о нем под ключом key"""
+        self.commit(key, self._write_temp(data), sidecar)
+
+    def commit(self, key, tmp_path, sidecar=None):
+        """
+        Переносит готовый временный файл из каталога кэша в запись key
+
+        Args:
+            sidecar: Содержимое второго файла записи (bytes, при sidecar_suffix)
+        """
+        if self.sidecar_suffix and sidecar is None:
+            raise ValueError(f"Кэш {self.directory}: запись {key} без сведений")
+        sidecar_tmp = self._write_temp(sidecar) if self.sidecar_suffix else None
+        size = os.path.getsize(tmp_path) + (len(sidecar) if sidecar_tmp else 0)
+        now = time.time()
+        with self._lock:
+            if sidecar_tmp:
+                os.replace(sidecar_tmp, self.sidecar_path_for(key))
+            os.replace(tmp_path, self.path_for(key))
+            old = self._index.pop(key, None)
+            if old is not None:
+                self._total_bytes -= old["size"]
+            self._index[key] = {"size": size, "created": now}
+            self._total_bytes += size
+            self._evict_locked()
+
+    def stats(self):
+        """Счетчики кэша"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "directory": self.directory,
+                "entries": len(self._index),
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+
+class _InFlight:
+    """Ожидание результата запроса, который уже выполняется в другом потоке"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+
+
+class LLMCompletionCache:
+    """
+    Кэш ответов LLM, адресуемый хэшем промпта, имени модели и параметров.
+
+    Одинаковые запросы, пришедшие одновременно, схлопываются в один вызов
+    LLM: остальные потоки ждут его результат. В кэш попадают только
+    успешные ответы.
+    """
+
+    def __init__(self, directory, max_bytes=256 * 1024 * 1024, max_entries=10000, enabled=True):
+        self.enabled = enabled
+        self.store = DiskCache(directory, max_bytes=max_bytes, max_entries=max_entries, suffix=".json")
+        self.collapsed = 0
+        self._lock = threading.Lock()
+        self._in_flight = {}
+
+    def key_for(self, payload):
+        """Ключ кэша для тела запроса к Ollama (prompt, model, options)"""
+        return content_key({
+            "prompt": payload.get("prompt", ""),
+            "model": payload.get("model", ""),
+            "options": payload.get("options", {})
+        })
+
+    def get(self, payload):
+        """Возвращает закэшированный текст ответа или None"""
+        if not self.enabled:
+            return None
+        data = self.store.get(self.key_for(payload))
+        if data is None:
+            return None
+        try:
+            return json.loads(data.decode("utf-8"))["response"]
+        except (ValueError, KeyError):
+            return None
+
+    def put(self, payload, response_text):
+        """Сохраняет текст ответа LLM"""
+        if not self.enabled:
+            return
+        record = {
+            "model": payload.get("model", ""),
+            "options": payload.get("options", {}),
+            "response": response_text,
+            "cached_at": time.time()
+        }
+        self.store.put(self.key_for(payload), json.dumps(record, ensure_ascii=False).encode("utf-8"))
+
+    def get_or_compute(self, payload, compute):
+        """
+        Возвращает ответ из кэша или вычисляет его через compute()
+
+        Args:
+            payload: Тело запроса к Ollama
+            compute: Функция без аргументов, возвращающая
+                {"success": bool, "response": str, ...}
+
+        Returns:
+            Результат compute() или {"success": True, "response": ..., "cached": True}
+        """
+        if not self.enabled:
+            return compute()
+
+        cached = self.get(payload)
+        if cached is not None:
+            return {"success": True, "response": cached, "cached": True}
+
+        key = self.key_for(payload)
+        with self._lock:
+            in_flight = self._in_flight.get(key)
+            owner = in_flight is None
+            if owner:
+                in_flight = _InFlight()
+                self._in_flight[key] = in_flight
+            else:
+                self.collapsed += 1
+
+        if not owner:
+            in_flight.done.wait()
+            return in_flight.result
+
+        try:
+            result = compute()
+            if result.get("success"):
+                self.put(payload, result.get("response", ""))
+            in_flight.result = result
+        except Exception as e:
+            in_flight.result = {"success": False, "error": str(e)}
+            raise
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+            in_flight.done.set()
+
+        return result
+
+    def stats(self):
+        """Счетчики кэша, включая число схлопнутых одновременных запросов"""
+        stats = self.store.stats()
+        with self._lock:
+            stats["collapsed"] = self.collapsed
+            stats["in_flight"] = len(self._in_flight)
+        stats["enabled"] = self.enabled
+        return stats
+
+
+class TestArchiveCache:
+    """
+    Кэш ZIP архивов тестов, адресуемый хэшем модели, списка действий и
+    параметров генератора.
+
+    Архив хранится в {key}.zip, сведения о нем (имя архива, файлы, сводка,
+    отчет об ограничениях) - рядом в {key}.meta.json. Обе части - одна
+    запись DiskCache: они учитываются в лимитах вместе и вытесняются
+    вместе, а запись, у которой нет одной из частей, считается
+    отсутствующей. Повторная генерация тестов для неизменной модели
+    отдается из кэша без перечисления путей, по ключу же архив скачивается
+    через /api/download-tests/{key}.zip.
+    """
+
+    # Меняется при изменении формата архива - старые записи перестают совпадать
+    FORMAT = 1
+
+    def __init__(self, directory, max_bytes=512 * 1024 * 1024, max_entries=1000, ttl=None, enabled=True):
+        self.enabled = enabled
+        self.archives = DiskCache(directory, max_bytes=max_bytes, max_entries=max_entries, ttl=ttl,
+                                  suffix=".zip", sidecar_suffix=".meta.json")
+
+    def key_for(self, model_data, action_ids, options):
+        """Ключ архива: модель, выбранные действия и параметры генератора"""
+        return content_key({
+            "format": self.FORMAT,
+            "model": model_data,
+            "action_ids": action_ids,
+            "options": options
+        })
+
+    @staticmethod
+    def is_valid_key(key):
+        """Похож ли key на ключ записи (защита от путей вне каталога кэша)"""
+        return len(key) == 64 and all(c in "0123456789abcdef" for c in key)
+
+    @staticmethod
+    def is_reproducible(options, report):
+        """
+        Даст ли повторная генерация тот же архив
+
+        Случайная выборка без seed и обрезка по бюджету времени зависят от
+        запуска - такие архивы по ключу запроса не кэшируются.
+        """
+        if options.get("sample_size") is not None and options.get("seed") is None:
+            return False
+        return not (report and report.get("timed_out"))
+
+    @staticmethod
+    def unique_key():
+        """Ключ для архива, который можно скачать, но нельзя получить повторной генерацией"""
+        return hashlib.sha256(os.urandom(32)).hexdigest()
+
+    def get(self, key):
+        """
+        Returns:
+            (путь к архиву, сведения об архиве) или None
+        """
+        if not self.enabled or not self.is_valid_key(key):
+            return None
+        path = self.archives.lookup(key)
+        if path is None:
+            return None
+        data = self.archives.read_sidecar(key)
+        if data is None:
+            return None
+        try:
+            return path, json.loads(data.decode("utf-8"))
+        except ValueError:
+            self.archives.forget(key)
+            return None
+
+    def put(self, key, archive_data, meta):
+        """Сохраняет готовый архив (bytes) и сведения о нем"""
+        if not self.enabled:
+            return
+        self.archives.put(key, archive_data, json.dumps(meta, ensure_ascii=False).encode("utf-8"))
+
+    def open_temp(self):
+        """
+        Временный файл в каталоге кэша для архива, записываемого потоком
+
+        Returns:
+            (файловый объект, путь); после записи - commit() или discard()
+        """
+        fd, tmp_path = tempfile.mkstemp(dir=self.archives.directory, suffix=".tmp")
+        return os.fdopen(fd, "wb"), tmp_path
+
+    def commit(self, key, tmp_path, meta):
+        """Переносит записанный временный файл в кэш под ключом key"""
+        self.archives.commit(key, tmp_path, json.dumps(meta, ensure_ascii=False).encode("utf-8"))
+
+    @staticmethod
+    def discard(tmp_path):
+        """Удаляет недописанный временный файл"""
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+
+    def stats(self):
+        """Счетчики кэша архивов"""
+        stats = self.archives.stats()
+        stats["enabled"] = self.enabled
+        return stats
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Сессии генерации тестов для итеративного редактирования модели
+
+Пока модель правят в редакторе графа, /api/generate-tests раз за разом
+получает почти ту же модель. GenerationSession хранит генератор между
+запросами (BDDGeneratorAdapted с incremental=True): новая версия модели
+сравнивается с предыдущей, пути и файлы действий, не зависящих от
+изменений, остаются, а заново строятся только файлы ниже по графу от
+измененных действий и состояний - время генерации пропорционально
+изменению, а не размеру модели.
+
+Генератор строится с нуля, если:
+- это первый запрос сессии или изменились параметры генерации;
+- выбран покрывающий набор или случайная выборка (зависят от всей модели);
+- в прошлой версии были циклы при политике "break" (пути цикла зависят от
+  порядка обхода) или перечисление остановил бюджет времени;
+- предварительная проверка объема дала другой лимит сценариев на действие.
+"""
+
+import threading
+import logging
+from collections import OrderedDict
+
+from test_generator_adapted import create_test_generator, resolve_processes
+
+logger = logging.getLogger(__name__)
+
+
+class GenerationSession:
+    """
+    Генератор тестов одной модели, переживающий ее правки
+
+    Генератор не потокобезопасен: prepare() и перебор файлов выполняются
+    под self.lock (см. GenerationSessionRegistry.acquire).
+    """
+
+    def __init__(self, options):
+        """
+        Args:
+            options: Параметры create_test_generator() (кроме action_ids, processes, compiled)
+        """
+        self.options = dict(options)
+        self.lock = threading.Lock()
+        self.generator = None
+        self.last_update = None
+
+    @property
+    def supports_updates(self):
+        """Можно ли обновлять генератор при таких параметрах"""
+        return self.options.get("selection", "all") == "all" and not self.options.get("sample_size")
+
+    def _reusable(self):
+        if self.generator is None or not self.supports_updates:
+            return False
+        adapted = self.generator.generator
+        engine = adapted.bdd_generator.engine
+        if engine.timed_out:
+            return False
+        # Счетчик предварительной проверки обходит всю модель и может найти
+        # циклы, до которых перечисление еще не дошло
+        counter = adapted._path_counter
+        cycles = engine.cycles or (counter is not None and counter.cycles)
+        return not (cycles and engine.cycle_policy == "break")
+
+    def prepare(self, model_data, action_ids=None, compiled=None, processes=None):
+        """
+        Генератор тестов для новой версии модели
+
+        Args:
+            model_data: Модель (не нужна, если задан compiled)
+            action_ids: ID действий, для которых будут тесты (None - все)
+            compiled: Готовая CompiledModel модели
+            processes: Процессы рендеринга
+
+        Returns:
+            TestGeneratorAdapted
+
+        Raises:
+            ValueError, ModelCycleError, ScenarioLimitError - как create_test_generator()
+        """
+        try:
+            if self._reusable():
+                generator = self._update(model_data, action_ids, compiled, processes)
+                if generator is not None:
+                    return generator
+            self.generator = create_test_generator(
+                model_data, action_ids, processes=processes, compiled=compiled,
+                incremental=self.supports_updates, **self.options
+            )
+            self.last_update = {"mode": "full", "changed_actions": len(self.generator.generator.simple_model)}
+            return self.generator
+        except BaseException:
+            # Ошибка посреди обхода оставляет генератор в неизвестном состоянии
+            self.generator = None
+            raise
+
+    def _update(self, model_data, action_ids, compiled, processes):
+        """Обновляет генератор до новой версии модели; None - нужен новый генератор"""
+        test_generator = self.generator
+        adapted = test_generator.generator
+        bdd_generator = adapted.bdd_generator
+        limit = bdd_generator.max_scenarios_per_action
+
+        adapted.processes = resolve_processes(processes)
+        changed_actions = adapted.update_model(model_data, compiled)
+        test_generator.model_data = model_data
+
+        # Предварительная проверка - как в create_test_generator, от исходного лимита
+        bdd_generator.max_scenarios_per_action = self.options.get("max_scenarios_per_action") or None
+        bdd_generator.engine.max_paths = bdd_generator.max_scenarios_per_action
+        bdd_generator.precheck = None
+        if self.options.get("max_total_scenarios"):
+            test_generator.precheck(self.options["max_total_scenarios"], self.options.get("on_limit", "cap"), action_ids)
+        elif self.options.get("cycle_policy") == "error":
+            adapted.path_counter().analyze()
+        if bdd_generator.max_scenarios_per_action != limit:
+            # Посчитанные пути обрезаны по другому лимиту
+            logger.info(f"Лимит сценариев на действие изменился ({limit} -> "
+                        f"{bdd_generator.max_scenarios_per_action}), генератор строится заново")
+            return None
+
+        self.last_update = {"mode": "incremental", "changed_actions": len(changed_actions)}
+        return test_generator
+
+    def stats(self):
+        """Как обновлен генератор последним prepare() и сколько файлов построено заново"""
+        if self.last_update is None:
+            return None
+        stats = dict(self.last_update)
+        render_stats = self.generator.generator.render_stats if self.generator is not None else None
+        if render_stats:
+            stats.update(render_stats)
+        return stats
+
+    def release(self):
+        """Освобождает сессию, захваченную GenerationSessionRegistry.acquire()"""
+        self.lock.release()
+
+
+class GenerationSessionRegistry:
+    """Сессии по ключу (например, имени модели) с вытеснением давно не использованных"""
+
+    def __init__(self, max_sessions=8):
+        """
+        Args:
+            max_sessions: Сколько сессий держать в памяти (0 - сессии отключены)
+        """
+        self.max_sessions = max_sessions
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def acquire(self, key, options):
+        """
+        Захватывает сессию ключа с такими параметрами генерации
+
+        Сессия с другими параметрами заменяется новой.
+
+        Returns:
+            GenerationSession под захваченным lock (освобождается release())
+            или None: сессии отключены или сессия занята другим запросом
+        """
+        if self.max_sessions <= 0:
+            return None
+        with self._lock:
+            session = self._sessions.get(key)
+            if session is None or session.options != options:
+                session = self._sessions[key] = GenerationSession(options)
+            self._sessions.move_to_end(key)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+        if not session.lock.acquire(blocking=False):
+            return None
+        return session
+
+    def stats(self):
+        """Число сессий и их ключи"""
+        with self._lock:
+            return {"sessions": len(self._sessions), "max_sessions": self.max_sessions, "keys": list(self._sessions)}
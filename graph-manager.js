@@ -180,90 +180,108 @@ class GraphManager {
 
             this.addMessage(`📝 Имя модели: ${modelName}`, 'bot');
 
-            // Разбиваем текст на чанки по 1000 символов
-            const chunks = this._splitTextIntoChunks(text, 1000);
+            // Документ целиком отправляется фоновой задачей API: сервер сам режет
+            // его на части и обрабатывает их параллельно, а браузер опрашивает
+            // ход задачи. Локальная разбивка с тем же размером нужна только для
+            // сохранения текста необработанных частей.
+            const chunkSize = 1500;
+            const chunks = this._splitTextIntoChunks(text, chunkSize);
             this.addMessage(`📋 Файл разбит на ${chunks.length} частей`, 'bot');
+            this.addMessage(`⏳ Обрабатываю ${chunks.length} частей на сервере...`, 'bot');
 
             let allActions = [];
             let allObjects = [];
             let allConnections = [];
             let failedChunks = []; // Массив для необработанных чанков
 
-            // Обрабатываем каждый чанк
-            for (let i = 0; i < chunks.length; i++) {
-                this.addMessage(`⏳ Обрабатываю часть ${i + 1}/${chunks.length}...`, 'bot');
+            let response;
+            try {
+                response = await this.generateModelViaJob(text, modelName, { chunk_size: chunkSize },
+                    (status) => this._reportJobProgress(status));
+            } catch (error) {
+                console.error('Ошибка задачи генерации:', error);
+                response = { success: false, error: error.message };
+            }
 
-                const response = await this.generateModelFromText(chunks[i], `${modelName}_part${i + 1}`);
+            if (response.success && response.model) {
+                allActions = response.model.model_actions || [];
+                allObjects = response.model.model_objects || [];
+                allConnections = response.model.model_connections || [];
 
-                if (response.success && response.model) {
-                    // Собираем результаты из всех чанков
-                    if (response.model.model_actions) {
-                        allActions = allActions.concat(response.model.model_actions);
-                    }
-                    if (response.model.model_objects) {
-                        allObjects = allObjects.concat(response.model.model_objects);
-                    }
-                    if (response.model.model_connections) {
-                        allConnections = allConnections.concat(response.model.model_connections);
-                    }
-                    this.addMessage(`✅ Часть ${i + 1} обработана (${response.model.model_actions?.length || 0} действий)`, 'bot');
-                } else {
-                    this.addMessage(`⚠️ Не удалось обработать часть ${i + 1}`, 'bot');
-                    // Сохраняем необработанный чанк
+                const failed = (response.chunks && response.chunks.failed) || [];
+                failed.forEach(item => {
                     failedChunks.push({
-                        part: i + 1,
-                        content: chunks[i],
-                        error: 'API вернул success: false'
+                        part: item.chunk,
+                        content: chunks[item.chunk - 1] || '',
+                        error: item.error
                     });
-                }
+                });
+                this.addMessage(`✅ Обработано частей: ${chunks.length - failedChunks.length}/${chunks.length}`, 'bot');
+            } else {
+                // Запрос не удался целиком: ни одна часть не обработана
+                const error = this._describeGenerationError(response.details || response.error || 'API вернул success: false');
+                this.addMessage(`⚠️ ${error}`, 'bot');
+                failedChunks = chunks.map((content, i) => ({ part: i + 1, content: content, error: error }));
             }
 
-                // Создаем объединенную модель
-                if (allActions.length > 0) {
-                    const combinedModel = {
-                        model_actions: allActions,
-                        model_objects: allObjects,
-                        model_connections: allConnections
-                    };
-
-                    this.addMessage("✅ Все части файла проанализированы! Создаю графовую модель...", 'bot');
-                    this.processGraphResponse({ success: true, model: combinedModel });
-
-                    // Сохраняем необработанные чанки в файл
-                    if (failedChunks.length > 0) {
-                        this.saveFailedChunks(failedChunks, modelName);
-                        this.addMessage(`📝 ${failedChunks.length} необработанных частей сохранены в файл ${modelName}_failed_chunks.txt`, 'bot');
-                    }
+            // Создаем объединенную модель
+            if (allActions.length > 0) {
+                const combinedModel = {
+                    model_actions: allActions,
+                    model_objects: allObjects,
+                    model_connections: allConnections
+                };
+
+                this.addMessage("✅ Все части файла проанализированы! Создаю графовую модель...", 'bot');
+                this.processGraphResponse({ success: true, model: combinedModel });
+
+                // Сохраняем необработанные чанки в файл
+                if (failedChunks.length > 0) {
+                    this.saveFailedChunks(failedChunks, modelName);
+                    this.addMessage(`📝 ${failedChunks.length} необработанных частей сохранены в файл ${modelName}_failed_chunks.txt`, 'bot');
+                }
 
-                    this.addMessage(`🎯 Модель "${modelName}" создана! (${allActions.length} действий, ${allObjects.length} объектов, ${allConnections.length} связей, ${failedChunks.length} необработанных частей)`, 'bot');
-                } else {
-                    this.addMessage("⚠️ Не удалось создать модель из файла.", 'bot');
+                this.addMessage(`🎯 Модель "${modelName}" создана! (${allActions.length} действий, ${allObjects.length} объектов, ${allConnections.length} связей, ${failedChunks.length} необработанных частей)`, 'bot');
+            } else {
+                this.addMessage("⚠️ Не удалось создать модель из файла.", 'bot');
 
-                    // Сохраняем необработанные чанки в файл
-                    if (failedChunks.length > 0) {
-                        this.saveFailedChunks(failedChunks, modelName);
-                        this.addMessage(`📝 ${failedChunks.length} необработанных частей сохранены в файл ${modelName}_failed_chunks.txt`, 'bot');
-                    }
+                // Сохраняем необработанные чанки в файл
+                if (failedChunks.length > 0) {
+                    this.saveFailedChunks(failedChunks, modelName);
+                    this.addMessage(`📝 ${failedChunks.length} необработанных частей сохранены в файл ${modelName}_failed_chunks.txt`, 'bot');
                 }
+            }
 
-            } catch (error) {
-                let errorMessage = error.message;
-
-                // Улучшенные сообщения об ошибках
-                if (errorMessage.includes('JSON')) {
-                    errorMessage = 'Ошибка формата данных от сервера. Пропускаю эту часть...';
-                } else if (errorMessage.includes('Network') || errorMessage.includes('fetch')) {
-                    errorMessage = 'Проблема с сетью. Пропускаю эту часть...';
-                } else if (errorMessage.includes('API недоступен')) {
-                    errorMessage = 'API сервер недоступен. Пропускаю эту часть...';
-                } else if (errorMessage.includes('timed out')) {
-                    errorMessage = 'Таймаут LLM. Пропускаю эту часть...';
-                }
+        } catch (error) {
+            this.addMessage(`⚠️ ${this._describeGenerationError(error.message)}`, 'bot');
+            console.error('Ошибка загрузки файла:', error);
+        }
+    }
 
-                this.addMessage(`⚠️ ${errorMessage}`, 'bot');
-                console.error(`Часть ${i + 1} ошибка:`, error);
-                // Продолжаем обработку остальных частей
-            }
+    _describeGenerationError(errorMessage) {
+        // Улучшенные сообщения об ошибках
+        if (errorMessage.includes('JSON')) {
+            return 'Ошибка формата данных от сервера';
+        } else if (errorMessage.includes('Network') || errorMessage.includes('fetch')) {
+            return 'Проблема с сетью';
+        } else if (errorMessage.includes('API недоступен')) {
+            return 'API сервер недоступен';
+        } else if (errorMessage.includes('timed out')) {
+            return 'Таймаут LLM';
+        }
+        return errorMessage;
+    }
+
+    _reportJobProgress(status) {
+        // Сообщаем в чат о смене этапа задачи и о готовых частях документа
+        const progress = status.progress || {};
+        if (status.stage === 'llm' && progress.chunks) {
+            this.addMessage(`⏳ Обработано частей: ${progress.completed || 0}/${progress.chunks}`, 'bot');
+        } else if (status.stage === 'parse') {
+            this.addMessage('⏳ Разбираю ответы LLM...', 'bot');
+        } else if (status.stage === 'merge' && progress.total) {
+            this.addMessage(`⏳ Добавляю действия в модель: ${progress.processed || 0}/${progress.total}`, 'bot');
+        }
     }
 
     handleMouseMove(e) {
@@ -303,7 +321,59 @@ class GraphManager {
         console.log('toggleLLMProvider');
     }
 
-    async generateModelFromText(text, modelName = 'my_model') {
+    async generateModelViaJob(text, modelName = 'my_model', options = {}, onProgress = null) {
+        // Генерация фоновой задачей: POST /api/jobs/generate-model и опрос статуса
+        if (!this.apiAvailable) {
+            throw new Error('API недоступен');
+        }
+
+        const submit = await fetch(`${this.apiBaseUrl}/api/jobs/generate-model`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({
+                text: text,
+                model_name: modelName,
+                ...options
+            }),
+            mode: 'cors'
+        });
+        if (!submit.ok) {
+            throw new Error(`HTTP error: ${submit.status} - ${await submit.text()}`);
+        }
+        const job = await submit.json();
+        console.log(`📥 Задача генерации ${job.job_id} поставлена в очередь`);
+
+        const pollInterval = 1000;
+        let lastProgress = null;
+        while (true) {
+            await new Promise(resolve => setTimeout(resolve, pollInterval));
+
+            const statusResponse = await fetch(`${this.apiBaseUrl}${job.status_url}`, { mode: 'cors' });
+            if (!statusResponse.ok) {
+                throw new Error(`HTTP error: ${statusResponse.status} - ${await statusResponse.text()}`);
+            }
+            const status = await statusResponse.json();
+
+            // Сообщаем только об изменениях хода задачи
+            const progress = JSON.stringify([status.stage, status.progress]);
+            if (onProgress && progress !== lastProgress) {
+                onProgress(status);
+            }
+            lastProgress = progress;
+
+            if (status.status === 'done' || status.status === 'failed') {
+                break;
+            }
+        }
+
+        const resultResponse = await fetch(`${this.apiBaseUrl}${job.result_url}`, { mode: 'cors' });
+        if (!resultResponse.ok) {
+            throw new Error(`HTTP error: ${resultResponse.status} - ${await resultResponse.text()}`);
+        }
+        return await resultResponse.json();
+    }
+
+    async generateModelFromText(text, modelName = 'my_model', options = {}) {
         if (!this.apiAvailable) {
             throw new Error('API недоступен');
         }
@@ -323,7 +393,8 @@ class GraphManager {
                 headers: { 'Content-Type': 'application/json' },
                 body: JSON.stringify({
                     text: text,
-                    model_name: modelName
+                    model_name: modelName,
+                    ...options
                 }),
                 mode: 'cors'
             });
@@ -0,0 +1,349 @@
+#!/usr/bin/env python3
+"""
+Клиент Ollama с пулом keep-alive соединений, кэшем состояния и circuit breaker
+"""
+
+import http.client
+import json
+import queue
+import threading
+import time
+from urllib.parse import urlparse
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class LLMUnavailableError(Exception):
+    """Ollama недоступен или вернул ошибку транспорта"""
+
+
+class CircuitOpenError(LLMUnavailableError):
+    """Запрос отклонен без обращения к Ollama: circuit breaker разомкнут"""
+
+
+class CircuitBreaker:
+    """
+    Размыкатель цепи для запросов к LLM.
+
+    После failure_threshold ошибок подряд цепь размыкается, и запросы
+    отклоняются сразу, не дожидаясь таймаутов. Через reset_timeout секунд
+    пропускается один пробный запрос: успех замыкает цепь, ошибка снова
+    размыкает ее.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold=3, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.rejected = 0
+        self._trial_in_progress = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """Возвращает True, если запрос можно выполнить"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                self._trial_in_progress = False
+            if self.state == self.HALF_OPEN and not self._trial_in_progress:
+                self._trial_in_progress = True
+                return True
+            self.rejected += 1
+            return False
+
+    def retry_after(self):
+        """Секунд до следующего пробного запроса (0, если цепь замкнута)"""
+        with self._lock:
+            if self.state != self.OPEN:
+                return 0.0
+            return max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at))
+
+    def cancel_trial(self):
+        """Снимает отметку пробного запроса, если он завершился без результата"""
+        with self._lock:
+            self._trial_in_progress = False
+
+    def record_success(self):
+        with self._lock:
+            if self.state != self.CLOSED:
+                logger.info("Circuit breaker Ollama замкнут: сервис снова отвечает")
+            self.state = self.CLOSED
+            self.failures = 0
+            self._trial_in_progress = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_in_progress = False
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    logger.warning(f"Circuit breaker Ollama разомкнут после {self.failures} ошибок подряд")
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+
+class OllamaClient:
+    """
+    HTTP клиент Ollama для api_main.py.
+
+    Соединения переиспользуются между запросами (HTTP/1.1 keep-alive),
+    таймаут задается на каждый запрос, а не через глобальный
+    socket.setdefaulttimeout. Результат проверки /api/tags кэшируется
+    на health_ttl секунд.
+    """
+
+    def __init__(self, base_url="http://localhost:11434", pool_size=8, connect_timeout=5.0,
+                 health_ttl=10.0, failure_threshold=3, reset_timeout=30.0):
+        parsed = urlparse(base_url)
+        self.base_url = base_url.rstrip("/")
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port or 11434
+        self.connect_timeout = connect_timeout
+        self.health_ttl = health_ttl
+        self.breaker = CircuitBreaker(failure_threshold=failure_threshold, reset_timeout=reset_timeout)
+
+        self._pool = queue.LifoQueue(maxsize=pool_size)
+        self._health = None  # (проверено в monotonic, доступен, ошибка)
+        self._health_lock = threading.Lock()
+
+        self.requests = 0
+        self.connections_opened = 0
+        self._stats_lock = threading.Lock()
+
+    # --- пул соединений ---
+
+    def _acquire(self, timeout):
+        try:
+            conn = self._pool.get_nowait()
+            reused = True
+        except queue.Empty:
+            conn = http.client.HTTPConnection(self.host, self.port, timeout=self.connect_timeout)
+            reused = False
+            with self._stats_lock:
+                self.connections_opened += 1
+            # Подключение ограничено connect_timeout, а не таймаутом запроса
+            try:
+                conn.connect()
+            except OSError as e:
+                conn.close()
+                raise LLMUnavailableError(f"Ollama недоступен: {e}") from e
+
+        # Таймаут на чтение ответа задается для конкретного запроса
+        conn.timeout = timeout
+        conn.sock.settimeout(timeout)
+        return conn, reused
+
+    def _release(self, conn):
+        try:
+            self._pool.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    def _send(self, method, path, body, timeout):
+        """
+        Отправляет запрос и возвращает (соединение, ответ)
+
+        Соединение из пула могло быть закрыто сервером - такой запрос
+        повторяется один раз на новом соединении.
+        """
+        headers = {"Content-Type": "application/json"} if body is not None else {}
+        data = json.dumps(body).encode("utf-8") if body is not None else None
+
+        for attempt in range(2):
+            conn, reused = self._acquire(timeout)
+            try:
+                conn.request(method, path, body=data, headers=headers)
+                response = conn.getresponse()
+                with self._stats_lock:
+                    self.requests += 1
+                return conn, response
+            except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError) as e:
+                conn.close()
+                if reused and attempt == 0:
+                    continue
+                raise LLMUnavailableError(f"Соединение с Ollama разорвано: {e}") from e
+            except (OSError, http.client.HTTPException) as e:
+                conn.close()
+                raise LLMUnavailableError(f"Ollama недоступен: {e}") from e
+
+    def _call(self, method, path, body=None, timeout=30.0):
+        """Выполняет запрос через circuit breaker и возвращает JSON ответа"""
+        if not self.breaker.allow():
+            raise CircuitOpenError(
+                f"Ollama недоступен (повторная попытка через {self.breaker.retry_after():.0f} с)"
+            )
+
+        try:
+            conn, response = self._send(method, path, body, timeout)
+            try:
+                raw = response.read()
+            except (OSError, http.client.HTTPException) as e:
+                conn.close()
+                raise LLMUnavailableError(f"Ollama недоступен: {e}") from e
+
+            if response.will_close:
+                conn.close()
+            else:
+                self._release(conn)
+
+            if response.status >= 500:
+                raise LLMUnavailableError(f"Ollama вернул HTTP {response.status}: {raw[:200]!r}")
+        except LLMUnavailableError:
+            self.breaker.record_failure()
+            raise
+        except Exception:
+            self.breaker.cancel_trial()
+            raise
+
+        self.breaker.record_success()
+        if response.status >= 400:
+            raise RuntimeError(f"Ollama вернул HTTP {response.status}: {raw.decode('utf-8', 'replace')[:200]}")
+        return json.loads(raw.decode("utf-8"))
+
+    # --- API ---
+
+    def health(self, force=False):
+        """
+        Проверяет доступность Ollama через /api/tags
+
+        Результат кэшируется на health_ttl секунд; при разомкнутой цепи
+        ответ отрицательный без обращения к сети.
+
+        Returns:
+            (доступен, текст ошибки или None)
+        """
+        now = time.monotonic()
+        with self._health_lock:
+            if not force and self._health is not None and now - self._health[0] < self.health_ttl:
+                return self._health[1], self._health[2]
+
+        try:
+            self._call("GET", "/api/tags", timeout=self.connect_timeout)
+            result = (True, None)
+        except Exception as e:
+            result = (False, str(e))
+
+        with self._health_lock:
+            self._health = (time.monotonic(),) + result
+        return result
+
+    def _mark_healthy(self, healthy, error=None):
+        with self._health_lock:
+            self._health = (time.monotonic(), healthy, error)
+
+    def generate(self, payload, timeout=30.0):
+        """
+        Выполняет /api/generate без потоковой передачи
+
+        Returns:
+            JSON ответа Ollama
+        """
+        try:
+            result = self._call("POST", "/api/generate", body=dict(payload, stream=False), timeout=timeout)
+        except LLMUnavailableError as e:
+            self._mark_healthy(False, str(e))
+            raise
+        self._mark_healthy(True)
+        return result
+
+    def generate_stream(self, payload, timeout=30.0):
+        """
+        Выполняет /api/generate в потоковом режиме
+
+        timeout ограничивает паузу между порциями ответа.
+
+        Yields:
+            Разобранные строки NDJSON ответа Ollama
+        """
+        if not self.breaker.allow():
+            raise CircuitOpenError(
+                f"Ollama недоступен (повторная попытка через {self.breaker.retry_after():.0f} с)"
+            )
+
+        try:
+            conn, response = self._send("POST", "/api/generate", dict(payload, stream=True), timeout)
+        except LLMUnavailableError as e:
+            self.breaker.record_failure()
+            self._mark_healthy(False, str(e))
+            raise
+
+        if response.status >= 400:
+            try:
+                raw = response.read()
+            except (OSError, http.client.HTTPException):
+                raw = b""
+            conn.close()
+            if response.status >= 500:
+                self.breaker.record_failure()
+                error = f"Ollama вернул HTTP {response.status}: {raw[:200]!r}"
+                self._mark_healthy(False, error)
+                raise LLMUnavailableError(error)
+            # Ошибка запроса (например, 404 - модель не скачана): Ollama
+            # отвечает, цепь замыкается, как в _call
+            self.breaker.record_success()
+            raise RuntimeError(f"Ollama вернул HTTP {response.status}: {raw.decode('utf-8', 'replace')[:200]}")
+
+        completed = False
+        last_chunk = None
+        try:
+            while True:
+                try:
+                    line = response.readline()
+                except (OSError, http.client.HTTPException) as e:
+                    self.breaker.record_failure()
+                    raise LLMUnavailableError(f"Поток Ollama прерван: {e}") from e
+                if not line:
+                    break
+                line = line.strip()
+                if not line:
+                    continue
+                chunk = json.loads(line.decode("utf-8"))
+                if chunk.get("done"):
+                    # Последняя порция выдается после возврата соединения:
+                    # получив "done", клиент обычно больше не читает генератор
+                    last_chunk = chunk
+                    break
+                yield chunk
+            # Дочитываем остаток, чтобы соединение можно было вернуть в пул
+            response.read()
+            completed = True
+            self.breaker.record_success()
+            self._mark_healthy(True)
+        finally:
+            if completed and not response.will_close:
+                self._release(conn)
+            else:
+                # Поток брошен клиентом или прерван - соединение в неизвестном состоянии
+                conn.close()
+                self.breaker.cancel_trial()
+
+        if last_chunk is not None:
+            yield last_chunk
+
+    def stats(self):
+        """Состояние клиента и circuit breaker"""
+        with self._stats_lock:
+            requests = self.requests
+            opened = self.connections_opened
+        with self._health_lock:
+            health = self._health
+        return {
+            "base_url": self.base_url,
+            "requests": requests,
+            "connections_opened": opened,
+            "idle_connections": self._pool.qsize(),
+            "circuit_state": self.breaker.state,
+            "consecutive_failures": self.breaker.failures,
+            "rejected_requests": self.breaker.rejected,
+            "healthy": health[1] if health else None,
+            "health_checked_ago": round(time.monotonic() - health[0], 3) if health else None
+        }
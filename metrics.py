@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+"""
+Метрики API Graph Editor в текстовом формате Prometheus
+
+Счетчики, измерители и гистограммы с метками хранятся в памяти процесса,
+MetricsRegistry.render() отдает их для /api/metrics (формат exposition
+0.0.4). Значения, которые уже считают другие компоненты (кэши, сессии
+тестов), не дублируются: счетчик или измеритель с callback читает их в
+момент запроса метрик.
+"""
+
+import math
+import threading
+import time
+import logging
+from collections import OrderedDict
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Content-Type ответа /api/metrics
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Границы гистограмм задержек по умолчанию (секунды): от быстрых GET до
+# генерации модели длинным документом
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+
+def format_value(value):
+    """Число в записи Prometheus"""
+    if value != value:
+        return "NaN"
+    if value in (math.inf, -math.inf):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape_label(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _escape_help(text):
+    return text.replace("\\", "\\\\").replace("\n", "\\n")
+
+
+class Metric:
+    """Общая часть метрик: имя, описание, метки и значения по наборам меток"""
+
+    type = "untyped"
+
+    def __init__(self, name, documentation, labels=(), callback=None):
+        """
+        Args:
+            name: Имя метрики (graph_editor_...)
+            documentation: Строка HELP
+            labels: Имена меток
+            callback: Функция без аргументов, возвращающая значение на момент
+                запроса метрик: число (метрика без меток) или
+                {кортеж значений меток: число}
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.callback = callback
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if len(labels) != len(self.labels) or any(name not in labels for name in self.labels):
+            raise ValueError(f"Метрика {self.name}: ожидаются метки {self.labels}, получены {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labels)
+
+    def _label_text(self, key, extra=()):
+        pairs = list(zip(self.labels, key)) + list(extra)
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{name}="{_escape_label(value)}"' for name, value in pairs) + "}"
+
+    def _current(self):
+        """{кортеж значений меток: значение}"""
+        if self.callback is None:
+            with self._lock:
+                return dict(self._values)
+        values = self.callback()
+        if not isinstance(values, dict):
+            return {(): values}
+        return {tuple(str(part) for part in key): value for key, value in values.items()}
+
+    def samples(self):
+        """Строки значений: (суффикс имени, значения меток, доп. метки, значение)"""
+        return [("", key, (), value) for key, value in sorted(self._current().items())]
+
+    def value(self, **labels):
+        """Текущее значение для набора меток (0, если его еще не было)"""
+        return self._current().get(self._key(labels), 0)
+
+    def render(self):
+        """Строки HELP, TYPE и значений метрики"""
+        lines = [f"# HELP {self.name} {_escape_help(self.documentation)}", f"# TYPE {self.name} {self.type}"]
+        for suffix, key, extra, value in self.samples():
+            lines.append(f"{self.name}{suffix}{self._label_text(key, extra)} {format_value(value)}")
+        return lines
+
+
+class Counter(Metric):
+    """Монотонно растущий счетчик"""
+
+    type = "counter"
+
+    def inc(self, amount=1, **labels):
+        if amount < 0:
+            raise ValueError(f"Счетчик {self.name} не может уменьшаться")
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    """Значение, которое может расти и уменьшаться"""
+
+    type = "gauge"
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    @contextmanager
+    def track(self, **labels):
+        """Увеличивает значение на время блока (например, запросы в работе)"""
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+
+class Histogram(Metric):
+    """Распределение значений по корзинам с суммой и числом наблюдений"""
+
+    type = "histogram"
+
+    def __init__(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        if "le" in labels:
+            raise ValueError(f"Гистограмма {name}: метка le зарезервирована")
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(float(bound) for bound in buckets if bound != math.inf))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # [число наблюдений по корзинам (не накопленное), сумма, число]
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][index] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Наблюдает время выполнения блока в секундах"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def value(self, **labels):
+        """(число наблюдений, сумма) для набора меток"""
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            return (state[2], state[1]) if state else (0, 0.0)
+
+    def samples(self):
+        with self._lock:
+            states = sorted((key, (list(state[0]), state[1], state[2])) for key, state in self._values.items())
+        samples = []
+        for key, (counts, total, count) in states:
+            cumulative = 0
+            for bound, observed in zip(self.buckets, counts):
+                cumulative += observed
+                samples.append(("_bucket", key, (("le", format_value(bound)),), cumulative))
+            samples.append(("_bucket", key, (("le", "+Inf"),), count))
+            samples.append(("_sum", key, (), total))
+            samples.append(("_count", key, (), count))
+        return samples
+
+
+class MetricsRegistry:
+    """Набор метрик процесса и их вывод для /api/metrics"""
+
+    def __init__(self):
+        self._metrics = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Метрика {metric.name} уже зарегистрирована")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labels=(), callback=None):
+        return self._register(Counter(name, documentation, labels, callback))
+
+    def gauge(self, name, documentation, labels=(), callback=None):
+        return self._register(Gauge(name, documentation, labels, callback))
+
+    def histogram(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, documentation, labels, buckets))
+
+    def get(self, name):
+        with self._lock:
+            return self._metrics.get(name)
+
+    def render(self):
+        """Все метрики в текстовом формате Prometheus"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            try:
+                lines.extend(metric.render())
+            except Exception as e:
+                # Ошибка одного источника не должна ломать весь ответ
+                logger.warning(f"⚠️  Метрика {metric.name} не собрана: {e}")
+        return "\n".join(lines) + "\n"
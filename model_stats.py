@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""
+Оценка сложности модели без перечисления сценариев
+
+PathCounter обходит тот же граф действий и состояний, что и PathEngine
+(path_engine.py), но вместо списков путей хранит их количество
+(целые числа Python не переполняются). Для каждого действия:
+
+- путей к действию 0, если у него нет начальных состояний или какое-то
+  начальное состояние никем не создается; иначе это произведение числа
+  путей к начальным состояниям;
+- путей к состоянию - сумма по создающим его действиям величины
+  max(1, путей к действию): действие без путей само по себе дает один путь.
+
+Генератор выводит для действия max(1, путей к действию) сценариев, так что
+счетчик заранее показывает, сколько сценариев даст генерация. Для циклов
+с политикой "break" узлы цикла считаются за один проход, без перебора
+путей без повторений, и результат - приближенная оценка (exact = False).
+"""
+
+import math
+import time
+
+from path_engine import PathEngine, ACTION, STATE
+
+# Числа больше этого в отчете отдаются строками: JavaScript теряет точность
+JSON_SAFE_INTEGER = 2 ** 53 - 1
+
+ON_LIMIT_POLICIES = ("cap", "reject")
+
+
+class ScenarioLimitError(ValueError):
+    """Модель дает больше сценариев, чем разрешено (политика "reject")"""
+
+    def __init__(self, total, limit, complexity=None):
+        self.total = total
+        self.limit = limit
+        self.complexity = complexity
+        super().__init__(f"Модель дает {total} сценариев, больше лимита {limit}")
+
+
+def digits(value):
+    """Число десятичных знаков целого числа (без преобразования в строку)"""
+    return int(math.log10(value)) + 1 if value > 0 else 1
+
+
+def json_number(value):
+    """
+    Целое число для JSON: большие значения - строкой
+
+    Числа длиннее предела преобразования int в str (4300 знаков по
+    умолчанию) отдаются порядком величины.
+    """
+    if value <= JSON_SAFE_INTEGER:
+        return value
+    try:
+        return str(value)
+    except ValueError:
+        return f"~1e{digits(value) - 1}"
+
+
+class PathCounter(PathEngine):
+    """
+    Считает пути-предусловия вместо их перечисления
+
+    В self.ways хранятся целые числа, в self.depth - длина самой длинной
+    цепочки зависимостей (в действиях) до узла.
+    """
+
+    def __init__(self, model, cycle_policy="break"):
+        super().__init__(model, cycle_policy=cycle_policy)
+        self.depth = {}
+
+    def _compute(self, node):
+        kind, name = node
+        self.depth[node] = max((self.depth.get(dep, 0) for dep in self._deps(node)), default=0)
+        if kind == ACTION:
+            self.depth[node] += 1
+        return super()._compute(node)
+
+    def _resolve_cycle(self, component, cycle):
+        if self.cycle_policy == "skip":
+            for node in component:
+                self.ways[node] = 0
+                self.depth[node] = 0
+                if node[0] == ACTION:
+                    self.skipped_actions.add(node[1])
+            return
+
+        # "break": один проход в порядке завершения обхода; пути через еще
+        # не посчитанные узлы цикла не учитываются (приближенная оценка)
+        for node in component:
+            self.ways[node] = None
+        for node in component:
+            self.ways[node] = self._compute(node)
+
+    def _compute_action(self, action_name):
+        init_states = self.model.get(action_name, {}).get("init_states", [])
+        if not init_states:
+            return 0
+
+        count = 1
+        for init_state in dict.fromkeys(init_states):
+            if init_state not in self.states:
+                return 0
+            dep = (STATE, init_state)
+            if self.cycle_policy == "skip" and dep in self._cyclic:
+                return 0
+            ways_to_state = self.ways[dep]
+            if not ways_to_state:
+                return 0
+            count *= ways_to_state
+        return count
+
+    def _compute_state(self, state_name):
+        count = 0
+        for action_name in self.states[state_name]["actions"]:
+            dep = (ACTION, action_name)
+            if self.cycle_policy == "skip" and dep in self._cyclic:
+                continue
+            prereq_paths = self.ways[dep]
+            if prereq_paths is None:
+                continue
+            count += max(1, prereq_paths)
+        return count
+
+    def update_model(self, model):
+        dirty_actions = super().update_model(model)
+        # Глубина - как пути: только у узлов, посчитанных для новой версии
+        self.depth = {node: depth for node, depth in self.depth.items() if node in self.ways}
+        return dirty_actions
+
+    # --- API ---
+
+    def ways_to_action(self, action_name):
+        """Число путей-предусловий действия"""
+        if action_name not in self.model:
+            return 0
+        return self._ways_to((ACTION, action_name))
+
+    def ways_to_state(self, state_name):
+        """Число путей к состоянию"""
+        if state_name not in self.states:
+            return 0
+        return self._ways_to((STATE, state_name))
+
+    @property
+    def exact(self):
+        """Точны ли счетчики (в цикле с политикой "break" - приближенная оценка)"""
+        return not (self.cycles and self.cycle_policy == "break")
+
+    def scenarios(self, action_name):
+        """Сколько сценариев генератор выведет для действия"""
+        return max(1, self.ways_to_action(action_name))
+
+    def total_scenarios(self, action_names=None, limit=None):
+        """
+        Сумма сценариев по действиям (по умолчанию - по всей модели)
+
+        Args:
+            action_names: Действия (None - все)
+            limit: Не больше limit сценариев на действие (размер выборки)
+        """
+        if action_names is None:
+            action_names = self.model.keys()
+        total = 0
+        for action_name in action_names:
+            if action_name in self.model:
+                scenarios = self.scenarios(action_name)
+                total += scenarios if limit is None else min(scenarios, limit)
+        return total
+
+    def components(self):
+        """Слабо связные компоненты: списки действий, связанных через общие состояния"""
+        parent = {action_name: action_name for action_name in self.model}
+
+        def find(action_name):
+            while parent[action_name] != action_name:
+                parent[action_name] = parent[parent[action_name]]
+                action_name = parent[action_name]
+            return action_name
+
+        owner = {}
+        for action_name, action_data in self.model.items():
+            for state in list(action_data.get("init_states", [])) + list(action_data.get("final_states", [])):
+                if state in owner:
+                    parent[find(action_name)] = find(owner[state])
+                else:
+                    owner[state] = action_name
+
+        groups = {}
+        for action_name in self.model:
+            groups.setdefault(find(action_name), []).append(action_name)
+        return sorted(groups.values(), key=len, reverse=True)
+
+    def report(self, top=10):
+        """
+        Сводка сложности модели (обходит всю модель)
+
+        Args:
+            top: Сколько самых "тяжелых" действий и состояний показывать
+        """
+        started = time.monotonic()
+        for action_name in self.model:
+            self._visit((ACTION, action_name))
+
+        scenarios = {action_name: self.scenarios(action_name) for action_name in self.model}
+        total = sum(scenarios.values())
+        action_depth = {name: self.depth.get((ACTION, name), 0) for name in self.model}
+        action_fan_in = {name: len(dict.fromkeys(data.get("init_states", []))) for name, data in self.model.items()}
+        state_fan_in = {name: len(dict.fromkeys(data["actions"])) for name, data in self.states.items()}
+        components = self.components()
+
+        def heaviest(values):
+            return sorted(values.items(), key=lambda item: item[1], reverse=True)[:top]
+
+        return {
+            "actions": len(self.model),
+            "states": len(self.states),
+            "total_scenarios": json_number(total),
+            "total_scenarios_digits": digits(total),
+            "max_scenarios_per_action": json_number(max(scenarios.values(), default=0)),
+            "exact": self.exact,
+            "cycle_policy": self.cycle_policy,
+            "cycles": [list(cycle) for cycle in self.cycles],
+            "max_depth": max(action_depth.values(), default=0),
+            "max_action_fan_in": max(action_fan_in.values(), default=0),
+            "max_state_fan_in": max(state_fan_in.values(), default=0),
+            "heaviest_actions": [
+                {"action": name, "scenarios": json_number(count), "depth": action_depth[name]}
+                for name, count in heaviest(scenarios)
+            ],
+            "widest_states": [
+                {"state": name, "producers": count, "paths": json_number(self.ways.get((STATE, name)) or 0)}
+                for name, count in heaviest(state_fan_in)
+            ],
+            "components": {
+                "count": len(components),
+                "largest": [
+                    {"actions": len(component), "sample": component[:5]}
+                    for component in components[:5]
+                ]
+            },
+            "elapsed_ms": round((time.monotonic() - started) * 1000, 2)
+        }
@@ -0,0 +1,534 @@
+#!/usr/bin/env python3
+"""
+Хранилище моделей в памяти с отложенной пакетной записью на диск
+"""
+
+import atexit
+import copy
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+import logging
+
+from compiled_model import CompiledModel
+
+logger = logging.getLogger(__name__)
+
+
+def _id_number(element_id):
+    """Числовая часть ID вида a00012 / o00003 / s00007 / c00042 (0 если не разбирается)"""
+    try:
+        return int(str(element_id)[1:])
+    except (TypeError, ValueError):
+        return 0
+
+
+class ModelIndex:
+    """
+    Индексы модели по естественным ключам для слияния действий за O(1).
+
+    - действия: (actor, action, place) -> action_id
+    - объекты: object_name.lower() -> объект
+    - состояния: (object_id, state_name.lower()) -> state_id
+    - связи: множество пар (connection_out, connection_in)
+
+    Счетчики ID монотонны и хранятся в metadata["id_counters"] самой модели,
+    поэтому новые ID не зависят от порядка элементов и переживают сохранение.
+    Индекс остается корректным, пока модель меняется только через его методы.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        for key in ("model_actions", "model_objects", "model_connections"):
+            model.setdefault(key, [])
+        metadata = model.setdefault("metadata", {})
+
+        self.actions = {}
+        for action in model["model_actions"]:
+            key = (action.get("action_actor"), action.get("action_action"), action.get("action_place"))
+            self.actions.setdefault(key, action["action_id"])
+
+        self.objects = {}
+        self.states = {}
+        state_counters = {}
+        for obj in model["model_objects"]:
+            self.objects.setdefault(obj["object_name"].lower(), obj)
+            object_id = obj["object_id"]
+            for state in obj.get("resource_state", []):
+                self.states.setdefault((object_id, state["state_name"].lower()), state["state_id"])
+                state_counters[object_id] = max(state_counters.get(object_id, 0), _id_number(state["state_id"]))
+
+        self.connections = {
+            (conn.get("connection_out"), conn.get("connection_in"))
+            for conn in model["model_connections"]
+        }
+
+        # Счетчики: сохраненные в модели или максимум по существующим ID
+        counters = metadata.get("id_counters") or {}
+        self.counters = {
+            "action": max(counters.get("action", 0),
+                          max((_id_number(a.get("action_id")) for a in model["model_actions"]), default=0)),
+            "object": max(counters.get("object", 0),
+                          max((_id_number(o.get("object_id")) for o in model["model_objects"]), default=0)),
+            "connection": max(counters.get("connection", 0),
+                              max((_id_number(c.get("connection_id")) for c in model["model_connections"]), default=0)),
+            "state": dict(state_counters, **{
+                object_id: max(value, state_counters.get(object_id, 0))
+                for object_id, value in (counters.get("state") or {}).items()
+            })
+        }
+        metadata["id_counters"] = self.counters
+
+    def _next(self, kind, prefix):
+        self.counters[kind] += 1
+        return f"{prefix}{self.counters[kind]:05d}"
+
+    def find_action(self, actor, action, place):
+        return self.actions.get((actor, action, place))
+
+    def add_action(self, fields):
+        """Добавляет действие с новым action_id и возвращает его"""
+        action = {"action_id": self._next("action", "a"), **fields}
+        self.model["model_actions"].append(action)
+        key = (action.get("action_actor"), action.get("action_action"), action.get("action_place"))
+        self.actions.setdefault(key, action["action_id"])
+        return action
+
+    def find_object(self, object_name):
+        return self.objects.get(object_name.lower())
+
+    def add_object(self, object_name):
+        """Создает объект с новым object_id и возвращает его"""
+        obj = {
+            "object_id": self._next("object", "o"),
+            "object_name": object_name,
+            "resource_state": []
+        }
+        self.model["model_objects"].append(obj)
+        self.objects.setdefault(object_name.lower(), obj)
+        return obj
+
+    def find_state(self, obj, state_name):
+        return self.states.get((obj["object_id"], state_name.lower()))
+
+    def add_state(self, obj, state_name):
+        """Добавляет состояние объекту и возвращает его state_id (нумерация внутри объекта)"""
+        object_id = obj["object_id"]
+        number = self.counters["state"].get(object_id, 0) + 1
+        self.counters["state"][object_id] = number
+        state_id = f"s{number:05d}"
+        obj.setdefault("resource_state", []).append({
+            "state_id": state_id,
+            "state_name": state_name
+        })
+        self.states.setdefault((object_id, state_name.lower()), state_id)
+        return state_id
+
+    def has_connection(self, connection_out, connection_in):
+        return (connection_out, connection_in) in self.connections
+
+    def add_connection(self, fields):
+        """Добавляет связь с новым connection_id и возвращает ее"""
+        connection = {"connection_id": self._next("connection", "c"), **fields}
+        self.model["model_connections"].append(connection)
+        self.connections.add((connection["connection_out"], connection["connection_in"]))
+        return connection
+
+
+class ModelRegistry:
+    """
+    Реестр файлов моделей каталога models/: имя, путь, mtime, размер и
+    число действий, объектов и связей.
+
+    Записи обновляются при сохранении модели через ModelStore. Изменения
+    извне замечаются лениво: каталог пересканируется, только если изменился
+    его mtime (файл добавлен, удален или заменен), поэтому поиск последней
+    модели не зависит от числа файлов.
+    """
+
+    def __init__(self, directory="models"):
+        self.directory = directory
+        self.scans = 0
+        self._lock = threading.Lock()
+        # name -> {"name", "path", "mtime", "size", "actions", "objects", "connections"}
+        self._entries = {}
+        self._latest = None
+        self._dir_mtime = None
+
+    def _dir_stat(self):
+        try:
+            return os.stat(self.directory).st_mtime_ns
+        except OSError:
+            return None
+
+    def _make_entry(self, name, path, stat, model=None):
+        entry = {
+            "name": name,
+            "path": path,
+            "mtime": stat.st_mtime,
+            "size": stat.st_size,
+            "actions": None,
+            "objects": None,
+            "connections": None
+        }
+        if model is not None:
+            self._set_counts(entry, model)
+        return entry
+
+    @staticmethod
+    def _set_counts(entry, model):
+        entry["actions"] = len(model.get("model_actions", []))
+        entry["objects"] = len(model.get("model_objects", []))
+        entry["connections"] = len(model.get("model_connections", []))
+
+    def _refresh_locked(self):
+        """Пересканирует каталог, если он изменился с прошлого раза"""
+        dir_mtime = self._dir_stat()
+        if dir_mtime is not None and dir_mtime == self._dir_mtime:
+            return
+        self._dir_mtime = dir_mtime
+
+        entries = {}
+        if dir_mtime is not None:
+            with os.scandir(self.directory) as it:
+                for item in it:
+                    if not item.name.endswith(".json") or not item.is_file():
+                        continue
+                    try:
+                        stat = item.stat()
+                    except OSError:
+                        continue
+                    name = item.name[:-len(".json")]
+                    old = self._entries.get(name)
+                    if old is not None and old["mtime"] == stat.st_mtime and old["size"] == stat.st_size:
+                        entries[name] = old
+                    else:
+                        entries[name] = self._make_entry(name, item.path, stat)
+        self.scans += 1
+        self._entries = entries
+        self._update_latest_locked()
+
+    def _update_latest_locked(self):
+        self._latest = max(self._entries.values(), key=lambda e: e["mtime"], default=None)
+
+    def record(self, name, path, model=None):
+        """Обновляет запись после сохранения модели (вызывается ModelStore.flush)"""
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return
+        with self._lock:
+            self._refresh_locked()
+            entry = self._make_entry(name, path, stat, model)
+            self._entries[name] = entry
+            if self._latest is None or entry["mtime"] >= self._latest["mtime"]:
+                self._latest = entry
+            elif self._latest["name"] == name:
+                self._update_latest_locked()
+            # Собственная запись изменила mtime каталога - повторный скан не нужен
+            self._dir_mtime = self._dir_stat()
+
+    def latest(self):
+        """
+        Запись самой новой модели или None, если моделей нет
+
+        Помимо mtime каталога проверяется файл самой новой модели: он мог
+        быть перезаписан на месте без изменения каталога.
+        """
+        with self._lock:
+            self._refresh_locked()
+            latest = self._latest
+            if latest is not None:
+                try:
+                    stat = os.stat(latest["path"])
+                except OSError:
+                    self._dir_mtime = None
+                    self._refresh_locked()
+                    return dict(self._latest) if self._latest else None
+                if stat.st_mtime != latest["mtime"] or stat.st_size != latest["size"]:
+                    self._entries[latest["name"]] = self._make_entry(latest["name"], latest["path"], stat)
+                    self._update_latest_locked()
+            return dict(self._latest) if self._latest else None
+
+    def list(self):
+        """
+        Все модели, от новых к старым, с числом действий, объектов и связей
+
+        Счетчики для файлов, измененных извне, читаются из файла один раз
+        и кэшируются до следующего изменения.
+        """
+        with self._lock:
+            self._refresh_locked()
+            entries = sorted(self._entries.values(), key=lambda e: e["mtime"], reverse=True)
+            for entry in entries:
+                if entry["actions"] is None:
+                    try:
+                        with open(entry["path"], 'r', encoding='utf-8') as f:
+                            self._set_counts(entry, json.load(f))
+                    except (OSError, ValueError, AttributeError) as e:
+                        logger.warning(f"Не удалось прочитать модель {entry['path']}: {e}")
+            return [dict(entry) for entry in entries]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "directory": self.directory,
+                "models": len(self._entries),
+                "latest": self._latest["name"] if self._latest else None,
+                "scans": self.scans
+            }
+
+
+class ModelStore:
+    """
+    Хранит активные модели models/{name}.json в памяти.
+
+    Изменения применяются к модели в памяти и помечают ее как измененную;
+    на диск модель записывается одним атомарным сохранением (временный файл
+    и os.replace) при явном flush() или фоновым потоком раз в flush_interval
+    секунд. Слияние N действий стоит одну запись файла вместо N.
+    """
+
+    def __init__(self, directory="models", flush_interval=2.0, max_cached_models=64):
+        """
+        Args:
+            directory: Каталог файлов моделей
+            flush_interval: Период фоновой записи измененных моделей (секунды)
+            max_cached_models: Сколько неизмененных моделей держать в памяти
+        """
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.max_cached_models = max_cached_models
+
+        self.writes = 0
+        self.loads = 0
+
+        self._guard = threading.Lock()
+        self._locks = {}
+        # name -> {"model": dict, "dirty": bool, "mtime": mtime файла при загрузке/записи,
+        #          "index": ModelIndex или None, "compiled": CompiledModel или None}
+        self._entries = OrderedDict()
+
+        self._stop = threading.Event()
+        self._flusher = None
+
+        self.registry = ModelRegistry(directory)
+
+    def path_for(self, name):
+        """Путь к файлу модели"""
+        return os.path.join(self.directory, f"{name}.json")
+
+    def lock(self, name):
+        """
+        Блокировка модели
+
+        Все изменения модели выполняются под этой блокировкой; она
+        реентерабельна, поэтому методы хранилища можно вызывать внутри.
+        """
+        with self._guard:
+            lock = self._locks.get(name)
+            if lock is None:
+                lock = threading.RLock()
+                self._locks[name] = lock
+            return lock
+
+    def _file_mtime(self, name):
+        try:
+            return os.path.getmtime(self.path_for(name))
+        except OSError:
+            return None
+
+    def get(self, name):
+        """
+        Возвращает модель из памяти (загружая с диска при первом обращении)
+
+        Возвращаемый словарь можно изменять на месте под lock(name), после
+        чего вызвать put(). Если файл был изменен извне, а в памяти нет
+        несохраненных изменений, модель перечитывается.
+
+        Returns:
+            dict модели или None, если файла нет
+        """
+        with self.lock(name):
+            with self._guard:
+                entry = self._entries.get(name)
+                if entry is not None:
+                    self._entries.move_to_end(name)
+
+            if entry is not None and (entry["dirty"] or entry["mtime"] == self._file_mtime(name)):
+                return entry["model"]
+
+            filename = self.path_for(name)
+            if not os.path.exists(filename):
+                if entry is not None and entry["mtime"] is None:
+                    # Модель создана в памяти и еще не записана
+                    return entry["model"]
+                with self._guard:
+                    self._entries.pop(name, None)
+                return None
+
+            mtime = self._file_mtime(name)
+            with open(filename, 'r', encoding='utf-8') as f:
+                model = json.load(f)
+            self.loads += 1
+
+            with self._guard:
+                self._entries[name] = {"model": model, "dirty": False, "mtime": mtime, "index": None, "compiled": None}
+                self._entries.move_to_end(name)
+                self._evict_clean_locked()
+            return model
+
+    def put(self, name, model, index=None):
+        """
+        Сохраняет модель в памяти и помечает ее для записи на диск
+
+        Args:
+            name: Имя модели
+            model: dict модели
+            index: Готовый ModelIndex этой модели (чтобы не перестраивать)
+        """
+        with self.lock(name):
+            with self._guard:
+                entry = self._entries.get(name)
+                mtime = entry["mtime"] if entry is not None else None
+                if index is None or index.model is not model:
+                    # Индекс сохраняется, только если модель изменялась на месте
+                    index = entry["index"] if entry is not None and entry["model"] is model else None
+                # Скомпилированная модель устаревает при любом изменении
+                self._entries[name] = {"model": model, "dirty": True, "mtime": mtime, "index": index, "compiled": None}
+                self._entries.move_to_end(name)
+
+    def index(self, name, model=None):
+        """
+        Индекс модели по естественным ключам (строится при первом обращении)
+
+        Вызывается под lock(name) после get()/put(); None, если модели нет.
+        Индекс всегда строится для переданного model: между get() и index()
+        неизмененная модель может быть выгружена из памяти другим потоком и
+        перечитана, и индекс перечитанной копии изменял бы не тот словарь.
+
+        Args:
+            model: Словарь модели, полученный вызывающим от get()/put()
+                (None - текущая модель хранилища)
+        """
+        with self.lock(name):
+            if model is None:
+                model = self.get(name)
+                if model is None:
+                    return None
+            with self._guard:
+                entry = self._entries.get(name)
+            if entry is None or entry["model"] is not model:
+                # Модель выгружена или заменена: индекс попадет в хранилище при put()
+                return ModelIndex(model)
+            if entry["index"] is None or entry["index"].model is not model:
+                entry["index"] = ModelIndex(model)
+            return entry["index"]
+
+    def compiled(self, name):
+        """
+        CompiledModel модели (строится один раз на версию модели)
+
+        Версия меняется при put() и при перечитывании файла, измененного
+        извне. None, если модели нет.
+        """
+        with self.lock(name):
+            model = self.get(name)
+            if model is None:
+                return None
+            with self._guard:
+                entry = self._entries[name]
+            if entry["compiled"] is None:
+                entry["compiled"] = CompiledModel(model)
+            return entry["compiled"]
+
+    def snapshot(self, name):
+        """Глубокая копия модели (для ответа клиенту вне блокировки) или None"""
+        with self.lock(name):
+            model = self.get(name)
+            return copy.deepcopy(model) if model is not None else None
+
+    def flush(self, name=None):
+        """
+        Записывает измененные модели на диск
+
+        Args:
+            name: Имя модели; None - все измененные модели
+
+        Returns:
+            Число записанных файлов
+        """
+        if name is None:
+            with self._guard:
+                names = [n for n, entry in self._entries.items() if entry["dirty"]]
+            return sum(self.flush(n) for n in names)
+
+        with self.lock(name):
+            with self._guard:
+                entry = self._entries.get(name)
+            if entry is None or not entry["dirty"]:
+                return 0
+
+            self._write_atomic(self.path_for(name), entry["model"])
+            with self._guard:
+                entry["dirty"] = False
+                entry["mtime"] = self._file_mtime(name)
+                self._evict_clean_locked()
+            self.writes += 1
+            self.registry.record(name, self.path_for(name), entry["model"])
+            return 1
+
+    def _write_atomic(self, filename, model):
+        os.makedirs(os.path.dirname(filename) or ".", exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(filename) or ".", suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(model, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, filename)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def _evict_clean_locked(self):
+        """Выгружает давно не использованные сохраненные модели сверх лимита"""
+        excess = len(self._entries) - self.max_cached_models
+        if excess <= 0:
+            return
+        for name in [n for n, entry in self._entries.items() if not entry["dirty"]][:excess]:
+            del self._entries[name]
+
+    def start(self):
+        """Запускает фоновую запись измененных моделей"""
+        if self._flusher is not None:
+            return
+        self._flusher = threading.Thread(target=self._flush_loop, name="model-store-flush", daemon=True)
+        self._flusher.start()
+        atexit.register(self.close)
+
+    def _flush_loop(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"❌ Ошибка фоновой записи моделей: {e}")
+
+    def close(self):
+        """Останавливает фоновую запись и сохраняет все изменения"""
+        self._stop.set()
+        self.flush()
+
+    def stats(self):
+        with self._guard:
+            dirty = sum(1 for entry in self._entries.values() if entry["dirty"])
+            cached = len(self._entries)
+        return {
+            "cached_models": cached,
+            "dirty_models": dirty,
+            "writes": self.writes,
+            "loads": self.loads,
+            "flush_interval": self.flush_interval,
+            "registry": self.registry.stats()
+        }
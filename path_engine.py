@@ -0,0 +1,512 @@
+#!/usr/bin/env python3
+"""
+Итеративный движок путей для BDD генераторов
+
+Модель - словарь {action_name: {"init_states": [...], "final_states": [...]}}.
+Действие зависит от своих начальных состояний, состояние - от действий,
+которые его создают. Граф зависимостей обходится итеративным поиском в
+глубину (без рекурсии Python), сильно связные компоненты выделяются
+алгоритмом Тарьяна, и пути для узлов компоненты вычисляются сразу после ее
+закрытия: все внешние зависимости к этому моменту уже посчитаны.
+
+Пути совпадают с рекурсивным алгоритмом test_generator_bot.py, пока в модели
+нет циклов. Циклы обрабатываются по политике cycle_policy:
+
+- "break" (по умолчанию): внутри цикла учитываются только пути, в которых
+  действие не повторяется; они находятся итерациями до неподвижной точки
+  (как в алгоритме Беллмана-Форда), начиная с путей, входящих в цикл извне;
+- "skip": действия и состояния циклов исключаются, зависящие от них
+  действия остаются без путей;
+- "error": первый найденный цикл вызывает ModelCycleError.
+
+Пути хранятся компактно: имена действий заменены целыми номерами, а путь -
+узел PathNode связного списка, общий префикс которого хранится один раз.
+Путь к состоянию продолжает путь к создающему действию одним узлом, при
+слиянии путей двух состояний новый узел ссылается на левый путь и хранит
+только новые действия правого. Списками имен пути становятся только при
+выдаче.
+"""
+
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+CYCLE_POLICIES = ("break", "skip", "error")
+
+ACTION = "a"
+STATE = "s"
+
+
+class ModelCycleError(ValueError):
+    """В модели есть циклическая зависимость (политика "error")"""
+
+    def __init__(self, cycle):
+        self.cycle = cycle
+        super().__init__(f"Циклическая зависимость между действиями: {', '.join(cycle)}")
+
+
+class PathNode:
+    """Путь: общий префикс (другой узел или None) и кортеж номеров действий после него"""
+
+    __slots__ = ("parent", "actions", "length")
+
+    def __init__(self, parent, actions):
+        self.parent = parent
+        self.actions = actions
+        self.length = (parent.length if parent is not None else 0) + len(actions)
+
+    def ids(self):
+        """Номера действий пути от первого к последнему"""
+        chunks = []
+        node = self
+        while node is not None:
+            chunks.append(node.actions)
+            node = node.parent
+        ids = []
+        for chunk in reversed(chunks):
+            ids.extend(chunk)
+        return ids
+
+
+class PathEngine:
+    """
+    Вычисляет пути-предусловия к действиям и состояниям модели.
+
+    Вычисление ленивое: ways_to_action() обходит только ту часть графа, от
+    которой зависит действие, и запоминает результат. Ограничения
+    max_paths и time_budget работают так же, как в BDDGeneratorSimple:
+    для каждого узла хранится не больше max_paths первых путей. Бюджет
+    времени отсчитывается от первого вычисления путей (или start_budget()),
+    а не от создания движка, и заново - после update_model().
+    """
+
+    def __init__(self, model, cycle_policy="break", max_paths=None, time_budget=None):
+        """
+        Args:
+            model: {action_name: {"init_states": [...], "final_states": [...]}}
+            cycle_policy: "break", "skip" или "error"
+            max_paths: Максимум путей на действие и состояние (None - без ограничения)
+            time_budget: Бюджет времени на вычисление путей в секундах (None - без ограничения)
+        """
+        if cycle_policy not in CYCLE_POLICIES:
+            raise ValueError(f"Неизвестная политика циклов: {cycle_policy} (ожидается одна из {CYCLE_POLICIES})")
+
+        self.model = model
+        self.cycle_policy = cycle_policy
+        self.max_paths = max_paths or None
+        self.time_budget = time_budget or None
+        self.deadline = None
+        self.timed_out = False
+        self._budget_started = False
+
+        # state_name -> {"actions": [действия, создающие состояние]}
+        self.states = {}
+        for action_name, action_data in model.items():
+            for final_state in action_data.get("final_states", []):
+                if final_state not in self.states:
+                    self.states[final_state] = {"actions": []}
+                self.states[final_state]["actions"].append(action_name)
+
+        # Номера действий в путях: names[номер] - имя действия,
+        # _single[номер] - общий кортеж (номер,) для узлов из одного действия
+        self.names = []
+        self._ids = {}
+        self._single = []
+
+        # (тип, имя) -> список путей (PathNode)
+        self.ways = {}
+        self.truncated_actions = set()
+        self.truncated_states = set()
+        self.skipped_actions = set()
+        self.cycles = []
+
+        # Состояние обхода Тарьяна, общее для всех вызовов
+        self._counter = 0
+        self._index = {}
+        self._lowlink = {}
+        self._finished = {}
+        self._tarjan_stack = []
+        self._on_stack = set()
+        self._cyclic = set()
+
+    def _intern(self, action_name):
+        action_id = self._ids.get(action_name)
+        if action_id is None:
+            action_id = self._ids[action_name] = len(self.names)
+            self.names.append(action_name)
+            self._single.append((action_id,))
+        return action_id
+
+    def path_names(self, path):
+        """Список имен действий пути"""
+        names = self.names
+        return [names[action_id] for action_id in path.ids()]
+
+    # --- граф ---
+
+    def _deps(self, node):
+        """Зависимости узла в порядке, в котором их перебирает рекурсивный алгоритм"""
+        kind, name = node
+        if kind == ACTION:
+            init_states = self.model.get(name, {}).get("init_states", [])
+            return [(STATE, state) for state in dict.fromkeys(init_states) if state in self.states]
+        return [(ACTION, action) for action in dict.fromkeys(self.states[name]["actions"])]
+
+    # --- обход ---
+
+    def _visit(self, root):
+        """Итеративный обход Тарьяна от root; пути считаются при закрытии компонент"""
+        if root in self._index:
+            return
+
+        self.start_budget()
+        self._open(root)
+        path = [(root, iter(self._deps(root)))]
+
+        while path:
+            node, deps = path[-1]
+            descended = False
+            for dep in deps:
+                if dep not in self._index:
+                    self._open(dep)
+                    path.append((dep, iter(self._deps(dep))))
+                    descended = True
+                    break
+                if dep in self._on_stack:
+                    self._lowlink[node] = min(self._lowlink[node], self._index[dep])
+            if descended:
+                continue
+
+            path.pop()
+            self._finished[node] = len(self._finished)
+            if path:
+                parent = path[-1][0]
+                self._lowlink[parent] = min(self._lowlink[parent], self._lowlink[node])
+
+            if self._lowlink[node] == self._index[node]:
+                component = []
+                while True:
+                    member = self._tarjan_stack.pop()
+                    self._on_stack.discard(member)
+                    component.append(member)
+                    if member == node:
+                        break
+                self._close_component(component)
+
+    def _open(self, node):
+        self._index[node] = self._lowlink[node] = self._counter
+        self._counter += 1
+        self._tarjan_stack.append(node)
+        self._on_stack.add(node)
+
+    def _close_component(self, component):
+        """Вычисляет пути для узлов закрытой компоненты"""
+        # Порядок завершения обхода: зависимости внутри компоненты раньше
+        component.sort(key=self._finished.get)
+
+        if len(component) == 1:
+            self.ways[component[0]] = self._compute(component[0])
+            return
+
+        cycle = [name for kind, name in component if kind == ACTION]
+        self.cycles.append(cycle)
+        self._cyclic.update(component)
+        if self.cycle_policy == "error":
+            raise ModelCycleError(cycle)
+        logger.warning(f"Цикл в модели ({self.cycle_policy}): {', '.join(cycle)}")
+        self._resolve_cycle(component, cycle)
+
+    def _resolve_cycle(self, component, cycle):
+        """Вычисляет пути для узлов цикла по политике skip или break"""
+        if self.cycle_policy == "skip":
+            for node in component:
+                self.ways[node] = []
+                if node[0] == ACTION:
+                    self.skipped_actions.add(node[1])
+            return
+
+        # "break": None - путей к узлу пока не найдено. Каждый проход может
+        # удлинить найденные пути на одно действие цикла, поэтому проходов
+        # не больше числа действий цикла плюс один.
+        for node in component:
+            self.ways[node] = None
+        for _ in range(len(cycle) + 1):
+            for node in component:
+                if node[0] == ACTION:
+                    self.truncated_actions.discard(node[1])
+                else:
+                    self.truncated_states.discard(node[1])
+            changed = False
+            for node in component:
+                ways = self._compute(node)
+                if not self._same_ways(ways, self.ways[node]):
+                    self.ways[node] = ways
+                    changed = True
+            if not changed or self.timed_out:
+                break
+        for node in component:
+            if self.ways[node] is None:
+                self.ways[node] = []
+
+    @staticmethod
+    def _same_ways(left, right):
+        """Совпадают ли списки путей по содержимому (узлы сравниваются по номерам)"""
+        if left is None or right is None:
+            return left is right
+        return len(left) == len(right) and all(a.ids() == b.ids() for a, b in zip(left, right))
+
+    # --- вычисление путей ---
+
+    def _limit_reached(self, count):
+        """Проверяет лимит путей и бюджет времени"""
+        if self.max_paths is not None and count >= self.max_paths:
+            return True
+        if self.deadline is not None and time.monotonic() > self.deadline:
+            if not self.timed_out:
+                logger.warning(f"Бюджет времени {self.time_budget} с исчерпан, сценарии обрезаны")
+            self.timed_out = True
+            return True
+        return False
+
+    def _compute(self, node):
+        kind, name = node
+        if kind == ACTION:
+            return self._compute_action(name)
+        return self._compute_state(name)
+
+    def _compute_action(self, action_name):
+        """
+        Пути к действию: декартово произведение путей к его начальным состояниям
+
+        Returns:
+            Список путей; None, если внутри цикла путь к какому-то начальному
+            состоянию еще не найден
+        """
+        init_states = self.model.get(action_name, {}).get("init_states", [])
+        if not init_states:
+            return []
+
+        ways_to_states = []
+        for init_state in dict.fromkeys(init_states):
+            if init_state not in self.states:
+                return []
+            dep = (STATE, init_state)
+            if self.cycle_policy == "skip" and dep in self._cyclic:
+                return []
+            ways_to_state = self.ways[dep]
+            if ways_to_state is None:
+                return None
+            if not ways_to_state:
+                return []
+            ways_to_states.append(ways_to_state)
+            if init_state in self.truncated_states:
+                self.truncated_actions.add(action_name)
+
+        in_cycle = (ACTION, action_name) in self._cyclic
+        final_ways = []
+        for ways_to_state in ways_to_states:
+            if len(final_ways) == 0:
+                final_ways = ways_to_state
+                continue
+
+            # Слияние без повторов: новый узел ссылается на левый путь и
+            # хранит только действия правого, которых в левом нет
+            merged_ways = []
+            truncated = False
+            right_ids = [way_right.ids() for way_right in ways_to_state]
+            for way_left in final_ways:
+                left_ids = way_left.ids()
+                left_unique = len(dict.fromkeys(left_ids))
+                if left_unique != len(left_ids):
+                    # Повторы в самом левом пути (бывают только в цикле)
+                    way_left = PathNode(None, tuple(dict.fromkeys(left_ids)))
+                for ids in right_ids:
+                    if self._limit_reached(len(merged_ways)):
+                        truncated = True
+                        break
+                    added = tuple(dict.fromkeys(left_ids + ids))[left_unique:]
+                    merged_ways.append(PathNode(way_left, added) if added else way_left)
+                if truncated:
+                    break
+            if truncated:
+                self.truncated_actions.add(action_name)
+            final_ways = merged_ways
+
+        if in_cycle:
+            # Путь не может проходить через само действие
+            action_id = self._intern(action_name)
+            final_ways = [way for way in final_ways if action_id not in way.ids()]
+            return final_ways or None
+        return final_ways
+
+    def _compute_state(self, state_name):
+        """
+        Пути к состоянию: пути каждого создающего его действия плюс само действие
+
+        Returns:
+            Список путей; None, если внутри цикла ни одно действие еще не дает пути
+        """
+        all_ways_to_state = []
+        for action_name in self.states[state_name]["actions"]:
+            action_id = self._intern(action_name)
+            dep = (ACTION, action_name)
+            if self.cycle_policy == "skip" and dep in self._cyclic:
+                continue
+            prereq_paths = self.ways[dep]
+            if prereq_paths is None:
+                continue
+            if self._limit_reached(len(all_ways_to_state)):
+                self.truncated_states.add(state_name)
+                break
+
+            if action_name in self.truncated_actions:
+                self.truncated_states.add(state_name)
+
+            single = self._single[action_id]
+            if len(prereq_paths) == 0:
+                all_ways_to_state.append(PathNode(None, single))
+                continue
+
+            for path in prereq_paths:
+                if self._limit_reached(len(all_ways_to_state)):
+                    self.truncated_states.add(state_name)
+                    break
+                all_ways_to_state.append(PathNode(path, single))
+
+        if not all_ways_to_state and (STATE, state_name) in self._cyclic:
+            return None
+        return all_ways_to_state
+
+    # --- API ---
+
+    def _ways_to(self, node):
+        """Вычисленное значение узла (для PathEngine - список PathNode)"""
+        self._visit(node)
+        return self.ways[node]
+
+    def start_budget(self):
+        """Начинает отсчет бюджета времени, если он еще не идет"""
+        if not self._budget_started:
+            self._budget_started = True
+            self.deadline = time.monotonic() + self.time_budget if self.time_budget else None
+
+    def visit(self, node):
+        """Вычисляет значение узла (ACTION или STATE, имя) и всех его зависимостей в ways"""
+        self._visit(node)
+
+    def is_cyclic(self, node):
+        """Лежит ли узел на цикле (известно для уже обойденных узлов)"""
+        return node in self._cyclic
+
+    def cyclic_nodes(self):
+        """Узлы на циклах среди обойденных (после analyze() - все)"""
+        return set(self._cyclic)
+
+    def action_paths(self, action_name):
+        """Пути-предусловия действия в компактном виде (список PathNode)"""
+        if action_name not in self.model:
+            return []
+        return self._ways_to((ACTION, action_name))
+
+    def iter_ways_to_action(self, action_name):
+        """Пути-предусловия действия по одному, списками имен"""
+        for path in self.action_paths(action_name):
+            yield self.path_names(path)
+
+    def ways_to_action(self, action_name):
+        """Пути-предусловия действия (списки имен действий)"""
+        return list(self.iter_ways_to_action(action_name))
+
+    def ways_to_state(self, state_name):
+        """Пути, приводящие модель в состояние"""
+        if state_name not in self.states:
+            return []
+        return [self.path_names(path) for path in self._ways_to((STATE, state_name))]
+
+    def analyze(self):
+        """Обходит всю модель (находит все циклы) и возвращает report()"""
+        for action_name in self.model:
+            self._visit((ACTION, action_name))
+        return self.report()
+
+    def update_model(self, model):
+        """
+        Переходит к новой версии модели, сохраняя пути незатронутых узлов
+
+        Изменившиеся действия (начальные или конечные состояния, появление,
+        удаление) и состояния, у которых изменился список создающих
+        действий, вместе со всеми зависящими от них узлами теряют
+        посчитанные пути и будут пройдены заново при следующем запросе.
+        Остальные узлы от измененных не зависят, поэтому их пути совпадают
+        с теми, что дал бы новый движок. Бюджет времени отсчитывается заново
+        от следующего вычисления путей.
+
+        Args:
+            model: Новая модель в том же формате
+
+        Returns:
+            Множество действий, пути которых посчитаны заново (в том числе удаленные)
+        """
+        old_model, old_states = self.model, self.states
+        self.model = model
+        self.states = {}
+        for action_name, action_data in model.items():
+            for final_state in action_data.get("final_states", []):
+                if final_state not in self.states:
+                    self.states[final_state] = {"actions": []}
+                self.states[final_state]["actions"].append(action_name)
+
+        consumers = {}
+        for action_name, action_data in model.items():
+            for init_state in dict.fromkeys(action_data.get("init_states", [])):
+                consumers.setdefault(init_state, []).append(action_name)
+
+        stack = [(ACTION, action_name) for action_name in old_model.keys() | model.keys()
+                 if old_model.get(action_name) != model.get(action_name)]
+        stack += [(STATE, state_name) for state_name in old_states.keys() | self.states.keys()
+                  if old_states.get(state_name) != self.states.get(state_name)]
+
+        # Зависимые узлы: состояния, которые создает действие, и действия,
+        # которым нужно состояние
+        dirty = set(stack)
+        while stack:
+            kind, name = stack.pop()
+            if kind == ACTION:
+                dependents = [(STATE, state) for state in model.get(name, {}).get("final_states", [])]
+            else:
+                dependents = [(ACTION, action) for action in consumers.get(name, [])]
+            for dependent in dependents:
+                if dependent not in dirty:
+                    dirty.add(dependent)
+                    stack.append(dependent)
+
+        for node in dirty:
+            self.ways.pop(node, None)
+            self._index.pop(node, None)
+            self._lowlink.pop(node, None)
+            self._finished.pop(node, None)
+            self._cyclic.discard(node)
+        dirty_actions = {name for kind, name in dirty if kind == ACTION}
+        self.truncated_actions -= dirty_actions
+        self.skipped_actions -= dirty_actions
+        self.truncated_states -= {name for kind, name in dirty if kind == STATE}
+        self.cycles = [cycle for cycle in self.cycles if not dirty_actions.intersection(cycle)]
+
+        self.deadline = None
+        self.timed_out = False
+        self._budget_started = False
+        return dirty_actions
+
+    def report(self):
+        """Сведения о циклах и ограничениях по уже обойденной части модели"""
+        return {
+            "cycle_policy": self.cycle_policy,
+            "cycles": [list(cycle) for cycle in self.cycles],
+            "skipped_actions": sorted(self.skipped_actions),
+            "truncated": bool(self.truncated_actions),
+            "truncated_actions": sorted(self.truncated_actions),
+            "timed_out": self.timed_out,
+            "max_scenarios_per_action": self.max_paths,
+            "time_budget": self.time_budget
+        }
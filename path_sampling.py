@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Равномерная случайная выборка сценариев без перечисления всех путей
+
+Пути к действию у PathEngine упорядочены: для действия - как числа в
+смешанной системе счисления (первое начальное состояние - старший разряд),
+для состояния - подряд по создающим его действиям. Зная число путей к
+каждому узлу (PathCounter из model_stats.py), путь с любым номером можно
+восстановить напрямую, спускаясь по графу: это занимает время, линейное
+по длине пути. Выборка n различных номеров из [0, число путей) дает
+равномерную выборку сценариев; номера упорядочены, поэтому выбранные
+сценарии идут в том же порядке, что и при полном перечислении.
+
+Выборка точна для моделей без циклов и для политики "skip"; для циклов с
+политикой "break" счетчики приближенные, и BDDGeneratorSimple выбирает
+сценарии из перечисленных путей.
+"""
+
+import bisect
+import random
+
+from path_engine import ACTION, STATE
+
+
+class PathSampler:
+    """Восстановление путей по номеру и равномерная выборка"""
+
+    def __init__(self, counter):
+        """
+        Args:
+            counter: PathCounter модели
+        """
+        self.counter = counter
+        self.model = counter.model
+        self.states = counter.states
+        # state_name -> (создающие действия, накопленные веса)
+        self._producers = {}
+
+    def count(self, action_name):
+        """Число путей к действию (0 - действие без предусловий)"""
+        return self.counter.ways_to_action(action_name)
+
+    def _count(self, node):
+        if node not in self.counter.ways:
+            self.counter.visit(node)
+        return self.counter.ways[node] or 0
+
+    def _producer_weights(self, state_name):
+        weights = self._producers.get(state_name)
+        if weights is None:
+            producers = [
+                action_name for action_name in self.states[state_name]["actions"]
+                if not (self.counter.cycle_policy == "skip" and self.counter.is_cyclic((ACTION, action_name)))
+            ]
+            cumulative = []
+            total = 0
+            for action_name in producers:
+                total += max(1, self._count((ACTION, action_name)))
+                cumulative.append(total)
+            weights = self._producers[state_name] = (producers, cumulative)
+        return weights
+
+    def path(self, action_name, index):
+        """
+        Путь к действию с номером index (как в PathEngine.ways_to_action)
+
+        Обход итеративный: стек задач ("action", имя, номер),
+        ("state", имя, номер), ("emit", имя) и ("end", начало). Повторы
+        действий убираются, как при слиянии путей нескольких состояний,
+        один раз - на выходе из самого внешнего такого слияния.
+        """
+        path = []
+        merging = False
+        stack = [("action", action_name, index)]
+        while stack:
+            task = stack.pop()
+            kind = task[0]
+            if kind == "emit":
+                path.append(task[1])
+            elif kind == "end":
+                start = task[1]
+                path[start:] = dict.fromkeys(path[start:])
+                merging = False
+            elif kind == "action":
+                _, name, number = task
+                init_states = list(dict.fromkeys(self.model[name].get("init_states", [])))
+                digits = []
+                for init_state in reversed(init_states):
+                    base = self._count((STATE, init_state))
+                    digits.append((init_state, number % base))
+                    number //= base
+                if len(init_states) > 1 and not merging:
+                    merging = True
+                    stack.append(("end", len(path)))
+                # digits собраны с младшего разряда - в стек в том же порядке
+                for init_state, digit in digits:
+                    stack.append(("state", init_state, digit))
+            else:
+                _, name, number = task
+                producers, cumulative = self._producer_weights(name)
+                position = bisect.bisect_right(cumulative, number)
+                producer = producers[position]
+                offset = number - (cumulative[position - 1] if position else 0)
+                stack.append(("emit", producer))
+                if self._count((ACTION, producer)):
+                    stack.append(("action", producer, offset))
+        return path
+
+    def sample_indices(self, action_name, size, rng):
+        """
+        size различных номеров путей к действию (все, если путей не больше)
+
+        Returns:
+            Номера по возрастанию
+        """
+        total = self.count(action_name)
+        if total <= size:
+            return list(range(total))
+        chosen = set()
+        while len(chosen) < size:
+            chosen.add(rng.randrange(total))
+        return sorted(chosen)
+
+    def sample(self, action_name, size, rng=None):
+        """
+        Равномерная выборка до size различных путей к действию
+
+        Args:
+            action_name: Действие
+            size: Размер выборки
+            rng: random.Random (по умолчанию - новый генератор)
+
+        Returns:
+            Список путей в порядке полного перечисления
+        """
+        rng = rng or random.Random()
+        return [self.path(action_name, index) for index in self.sample_indices(action_name, size, rng)]
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Выбор минимального набора сценариев, покрывающего модель
+
+Сценарий - последовательность действий. Он покрывает каждое выполненное
+действие и каждый переход "действие A создает состояние S, которое
+требуется действию B" (A - последнее действие перед B, создающее S).
+Из всех сценариев-кандидатов жадно (как в задаче о покрытии множества)
+выбираются те, что добавляют больше всего непокрытых элементов, пока
+покрытие не перестанет расти. Размер набора растет примерно линейно с
+размером модели, а не с числом путей.
+"""
+
+import heapq
+
+
+def scenario_elements(sequence, produces, consumes):
+    """
+    Элементы модели, которые покрывает сценарий
+
+    Args:
+        sequence: Последовательность действий
+        produces: {action: [состояния, которые создает действие]}
+        consumes: {action: [состояния, которые требуются действию]}
+
+    Returns:
+        set из ("action", action) и ("transition", producer, state, consumer)
+    """
+    elements = set()
+    last_producer = {}
+    for action in sequence:
+        elements.add(("action", action))
+        for state in consumes.get(action, ()):
+            producer = last_producer.get(state)
+            if producer is not None:
+                elements.add(("transition", producer, state, action))
+        for state in produces.get(action, ()):
+            last_producer[state] = action
+    return elements
+
+
+def model_transitions(produces, consumes):
+    """Все переходы модели: (producer, state, consumer)"""
+    consumers = {}
+    for action, states in consumes.items():
+        for state in dict.fromkeys(states):
+            consumers.setdefault(state, []).append(action)
+    return {
+        ("transition", producer, state, consumer)
+        for producer, states in produces.items()
+        for state in dict.fromkeys(states)
+        for consumer in consumers.get(state, ())
+    }
+
+
+def select_covering_scenarios(candidates, produces, consumes, actions=None):
+    """
+    Жадно выбирает сценарии, покрывающие все достижимые действия и переходы
+
+    Args:
+        candidates: Список последовательностей действий
+        produces: {action: [создаваемые состояния]}
+        consumes: {action: [требуемые состояния]}
+        actions: Все действия, покрытие которых оценивается
+            (по умолчанию - ключи produces и consumes)
+
+    Returns:
+        (индексы выбранных кандидатов по возрастанию, отчет о покрытии)
+    """
+    covers = [scenario_elements(sequence, produces, consumes) for sequence in candidates]
+
+    # Ленивый жадный выбор: выигрыш кандидата только уменьшается, поэтому
+    # пересчитываем его, лишь когда кандидат оказывается на вершине кучи.
+    # При равном выигрыше берется более ранний кандидат.
+    heap = [(-len(elements), index) for index, elements in enumerate(covers)]
+    heapq.heapify(heap)
+    covered = set()
+    selected = []
+    while heap:
+        negative_gain, index = heapq.heappop(heap)
+        gain = len(covers[index] - covered)
+        if gain == 0:
+            continue
+        if gain < -negative_gain:
+            heapq.heappush(heap, (-gain, index))
+            continue
+        selected.append(index)
+        covered |= covers[index]
+
+    if actions is None:
+        actions = set(produces) | set(consumes)
+    all_actions = {("action", action) for action in actions}
+    all_transitions = model_transitions(produces, consumes)
+
+    def ratio(part, total):
+        return round(len(part) / len(total), 4) if total else 1.0
+
+    covered_actions = covered & all_actions
+    covered_transitions = covered & all_transitions
+    report = {
+        "selection": "coverage",
+        "candidates": len(candidates),
+        "selected": len(selected),
+        "actions": {
+            "covered": len(covered_actions),
+            "total": len(all_actions),
+            "ratio": ratio(covered_actions, all_actions)
+        },
+        "transitions": {
+            "covered": len(covered_transitions),
+            "total": len(all_transitions),
+            "ratio": ratio(covered_transitions, all_transitions)
+        },
+        "uncovered_actions": sorted(action for _, action in all_actions - covered_actions)
+    }
+    return sorted(selected), report
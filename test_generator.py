@@ -2,9 +2,13 @@ import json
 import os
 import zipfile
 import io
+import time
 from datetime import datetime
 import logging
 
+from scenario_selection import select_covering_scenarios
+from compiled_model import CompiledModel, ACTION_TO_STATE
+
 # Настройка логирования
 logging.basicConfig(
     level=logging.INFO,
@@ -15,57 +19,84 @@ logger = logging.getLogger(__name__)
 class TestGenerator:
     """
     Генератор E2E тестов для структуры test_project.json
+    
+    В режиме selection="coverage" вместо всех путей выводится небольшой
+    набор сценариев, покрывающий каждое действие и каждый переход через
+    состояние (scenario_selection.py).
+    
+    Ограничения max_scenarios_per_action и time_budget работают так же, как
+    в BDDGeneratorSimple: к действию ищется не больше max_scenarios_per_action
+    путей, по истечении бюджета времени поиск останавливается. В режиме
+    "coverage" кандидатов на действие без явного лимита не больше
+    COVERAGE_CANDIDATES_PER_ACTION. Действия с неполным списком путей
+    попадают в truncated_actions.
     """
     
-    def __init__(self, model_data):
+    SELECTION_MODES = ("all", "coverage")
+    
+    # Лимит кандидатов на действие для selection="coverage" по умолчанию
+    COVERAGE_CANDIDATES_PER_ACTION = 200
+    
+    def __init__(self, model_data, selection="all", compiled=None, max_scenarios_per_action=None, time_budget=None):
         """
         Инициализация генератора тестов
         
         Args:
             model_data: Данные модели в формате test_project.json
+            selection: "all" - все пути, "coverage" - минимальный покрывающий набор
+            compiled: Готовая CompiledModel этой модели (чтобы не разбирать повторно)
+            max_scenarios_per_action: Максимум путей на действие (None - без ограничения)
+            time_budget: Бюджет времени на поиск путей в секундах (None - без ограничения)
         """
+        if selection not in self.SELECTION_MODES:
+            raise ValueError(f"Неизвестный режим выбора сценариев: {selection} (ожидается один из {self.SELECTION_MODES})")
         self.model = model_data
+        self.selection = selection
+        self.coverage = None
+        self.compiled = compiled if compiled is not None else CompiledModel(model_data)
+        self.max_scenarios_per_action = max_scenarios_per_action or None
+        self.time_budget = time_budget or None
+        self.deadline = time.monotonic() + self.time_budget if self.time_budget else None
+        self.timed_out = False
+        self.truncated_actions = set()
+        self._paths_truncated = False
         
         # Создаем структуры для быстрого доступа
         self.actions = {}
         self.objects = {}
         self.connections = []
-        self.state_map = {}  # Карта состояний: state_id -> {object_name, state_name}
+        self.state_map = {}  # Карта состояний: object_id + state_id -> {object_name, state_name}
         
         self._parse_model()
         logger.info(f"Инициализирован генератор тестов: {len(self.actions)} действий, {len(self.objects)} объектов")
     
     def _parse_model(self):
-        """Разбирает структуру модели"""
-        # Парсим действия
-        for action in self.model.get('model_actions', []):
-            action_id = action.get('action_id')
+        """Разбирает структуру модели (через CompiledModel, один проход по связям)"""
+        compiled = self.compiled
+        
+        # Действия
+        for action, action_id in enumerate(compiled.action_ids):
+            action_name = compiled.action_names[action]
             self.actions[action_id] = {
                 'id': action_id,
-                'name': action.get('action_name', ''),
-                'links': action.get('action_links', {})
+                'name': action_name if action_name is not None else ''
             }
         
-        # Парсим объекты и состояния
-        for obj in self.model.get('model_objects', []):
-            object_id = obj.get('object_id')
-            object_name = obj.get('object_name', '')
+        # Объекты и состояния; состояние - object_id + state_id, как в связях
+        for obj, object_id in enumerate(compiled.object_ids):
             self.objects[object_id] = {
                 'id': object_id,
-                'name': object_name,
+                'name': compiled.object_names[obj],
                 'states': {}
             }
-            
-            # Добавляем состояния в карту
-            for state in obj.get('resource_state', []):
-                state_id = state.get('state_id')
-                state_name = state.get('state_name', '')
-                self.state_map[state_id] = {
-                    'object_id': object_id,
-                    'object_name': object_name,
-                    'state_name': state_name
-                }
-                self.objects[object_id]['states'][state_id] = state_name
+        for state, state_key in enumerate(compiled.state_keys):
+            obj = compiled.state_objects[state]
+            self.state_map[state_key] = {
+                'object_id': compiled.object_ids[obj],
+                'object_name': compiled.object_names[obj],
+                'state_name': compiled.state_names[state]
+            }
+            self.objects[compiled.object_ids[obj]]['states'][compiled.state_ids[state]] = compiled.state_names[state]
         
         # Парсим связи
         self.connections = self.model.get('model_connections', [])
@@ -81,41 +112,17 @@ class TestGenerator:
             'preconditions': {},     # Предусловия для действий
         }
         
-        # Анализируем связи для построения графа
-        for conn in self.connections:
-            conn_out = conn.get('connection_out', '')
-            conn_in = conn.get('connection_in', '')
-            
-            # Определяем тип connection_out (действие или состояние)
-            if conn_out.startswith('a'):  # Это действие
-                # connection_in должно быть состоянием (формат: object_id + state_id)
-                if conn_in and len(conn_in) >= 8:  # Минимальная длина для o00000s00000
-                    state_id = conn_in[6:]  # Извлекаем state_id из строки
-                    if state_id in self.state_map:
-                        if conn_out not in self.dependency_graph['action_to_states']:
-                            self.dependency_graph['action_to_states'][conn_out] = []
-                        self.dependency_graph['action_to_states'][conn_out].append(state_id)
-                        
-                        if state_id not in self.dependency_graph['state_to_actions']:
-                            self.dependency_graph['state_to_actions'][state_id] = []
-                        self.dependency_graph['state_to_actions'][state_id].append(conn_out)
-            
-            elif conn_out.startswith('o'):  # Это состояние
-                # Ищем state_id в строке
-                if 's' in conn_out:
-                    parts = conn_out.split('s')
-                    if len(parts) == 2:
-                        state_id = 's' + parts[1]
-                        if state_id in self.state_map:
-                            # connection_in должно быть действием
-                            if conn_in and conn_in.startswith('a'):
-                                if state_id not in self.dependency_graph['state_to_actions']:
-                                    self.dependency_graph['state_to_actions'][state_id] = []
-                                self.dependency_graph['state_to_actions'][state_id].append(conn_in)
-                                
-                                if conn_in not in self.dependency_graph['preconditions']:
-                                    self.dependency_graph['preconditions'][conn_in] = []
-                                self.dependency_graph['preconditions'][conn_in].append(state_id)
+        # Связи уже разобраны в CompiledModel.edges (в порядке model_connections)
+        action_ids = self.compiled.action_ids
+        state_keys = self.compiled.state_keys
+        for direction, action, state in self.compiled.edges:
+            action_id = action_ids[action]
+            state_id = state_keys[state]
+            if direction == ACTION_TO_STATE:
+                self.dependency_graph['action_to_states'].setdefault(action_id, []).append(state_id)
+            else:
+                self.dependency_graph['preconditions'].setdefault(action_id, []).append(state_id)
+            self.dependency_graph['state_to_actions'].setdefault(state_id, []).append(action_id)
     
     def _get_state_description(self, state_id):
         """Получает полное описание состояния"""
@@ -130,13 +137,54 @@ class TestGenerator:
             return self.actions[action_id]['name']
         return f"Действие {action_id}"
     
-    def _find_paths_to_action(self, action_id, visited=None):
+    def _limit_reached(self, count, limit):
+        """Проверяет лимит путей и бюджет времени; при срабатывании поиск неполный"""
+        if limit is not None and count >= limit:
+            self._paths_truncated = True
+            return True
+        if self.deadline is not None and time.monotonic() > self.deadline:
+            if not self.timed_out:
+                logger.warning(f"Бюджет времени {self.time_budget} с исчерпан, сценарии обрезаны")
+            self.timed_out = True
+            self._paths_truncated = True
+            return True
+        return False
+    
+    def path_limit(self):
+        """Лимит путей на действие для текущего режима (None - без ограничения)"""
+        if self.selection == "coverage":
+            return self.max_scenarios_per_action or self.COVERAGE_CANDIDATES_PER_ACTION
+        return self.max_scenarios_per_action
+    
+    def find_paths(self, action_id, limit=None):
+        """
+        Пути к действию с учетом ограничений генератора
+        
+        Args:
+            action_id: ID действия
+            limit: Максимум путей (по умолчанию - max_scenarios_per_action)
+            
+        Returns:
+            Список путей; при неполном поиске действие попадает в truncated_actions
+        """
+        if limit is None:
+            limit = self.max_scenarios_per_action
+        self._paths_truncated = False
+        paths = self._find_paths_to_action(action_id, limit=limit)
+        if self._paths_truncated:
+            self.truncated_actions.add(action_id)
+        return paths
+    
+    def _find_paths_to_action(self, action_id, visited=None, limit=None):
         """
         Находит все пути (цепочки действий) для достижения указанного действия
         
         Args:
             action_id: ID действия
             visited: Множество посещенных действий (для предотвращения циклов)
+            limit: Максимум путей (None - все); вложенные вызовы получают
+                только оставшуюся часть лимита, так что число вызовов
+                ограничено лимитом и глубиной модели
             
         Returns:
             Список путей (каждый путь - список ID действий)
@@ -165,8 +213,12 @@ class TestGenerator:
             leading_actions = self.dependency_graph.get('state_to_actions', {}).get(state_id, [])
             
             for leading_action in leading_actions:
+                if self._limit_reached(len(all_paths), limit):
+                    break
+                
                 # Рекурсивно находим пути к leading_action
-                sub_paths = self._find_paths_to_action(leading_action, visited.copy())
+                remaining = limit - len(all_paths) if limit is not None else None
+                sub_paths = self._find_paths_to_action(leading_action, visited.copy(), remaining)
                 
                 # Добавляем текущее действие в конец каждого подпути
                 for path in sub_paths:
@@ -182,12 +234,60 @@ class TestGenerator:
         
         return all_paths
     
-    def generate_test_for_action(self, action_id):
+    def select_scenarios(self, action_ids):
+        """
+        Минимальный набор путей, покрывающий действия и переходы модели
+        
+        Args:
+            action_ids: ID действий, пути к которым участвуют в выборе
+            
+        Returns:
+            {action_id: [выбранные пути]}; отчет о покрытии - в self.coverage
+        """
+        candidates = []
+        owners = []
+        limit = self.path_limit()
+        truncated = 0
+        for action_id in action_ids:
+            for path in self.find_paths(action_id, limit=limit):
+                candidates.append(path)
+                owners.append(action_id)
+            truncated += action_id in self.truncated_actions
+        if truncated:
+            logger.warning(f"Кандидаты в сценарии ограничены: {truncated} из {len(action_ids)} действий "
+                           f"(не более {limit} путей на действие"
+                           f"{', бюджет времени исчерпан' if self.timed_out else ''})")
+        
+        indices, self.coverage = select_covering_scenarios(
+            candidates,
+            self.dependency_graph['action_to_states'],
+            self.dependency_graph['preconditions'],
+            actions=self.actions.keys()
+        )
+        
+        selected = {action_id: [] for action_id in action_ids}
+        for index in indices:
+            selected[owners[index]].append(candidates[index])
+        logger.info(f"Выбрано {len(indices)} из {len(candidates)} сценариев, "
+                    f"покрытие действий {self.coverage['actions']['ratio']:.0%}, "
+                    f"переходов {self.coverage['transitions']['ratio']:.0%}")
+        return selected
+    
+    def _plan(self, action_ids):
+        """Список (action_id, пути или None - все пути) для вывода"""
+        action_ids = list(action_ids)
+        if self.selection == "all":
+            return [(action_id, None) for action_id in action_ids]
+        selected = self.select_scenarios(action_ids)
+        return [(action_id, selected[action_id]) for action_id in action_ids if selected[action_id]]
+    
+    def generate_test_for_action(self, action_id, paths=None):
         """
         Генерирует E2E тест для конкретного действия
         
         Args:
             action_id: ID действия
+            paths: Пути для вывода (None - все пути к действию)
             
         Returns:
             Строка с тестом в формате BDD
@@ -198,7 +298,9 @@ class TestGenerator:
         action_name = self.actions[action_id]['name']
         
         # Находим все пути к действию
-        paths = self._find_paths_to_action(action_id)
+        enumerated = paths is None
+        if enumerated:
+            paths = self.find_paths(action_id)
         
         # Генерируем тест
         test_content = f"# E2E тест: {action_name}\n"
@@ -248,6 +350,11 @@ class TestGenerator:
             
             test_content += "\n---\n\n"
         
+        if enumerated and action_id in self.truncated_actions:
+            test_content += (f"# Показаны не все сценарии: поиск путей ограничен "
+                             f"({self.max_scenarios_per_action or '-'} сценариев, "
+                             f"{self.time_budget or '-'} с)\n")
+        
         return test_content
     
     def generate_all_tests(self):
@@ -259,12 +366,12 @@ class TestGenerator:
         """
         all_tests = {}
         
-        for action_id in self.actions:
+        for action_id, paths in self._plan(self.actions):
             action_name = self.actions[action_id]['name']
             safe_name = "".join(c for c in action_name if c.isalnum() or c in " _-").rstrip()
             filename = f"e2e_test_{action_id}_{safe_name.replace(' ', '_')}.md"
             
-            test_content = self.generate_test_for_action(action_id)
+            test_content = self.generate_test_for_action(action_id, paths)
             all_tests[filename] = test_content
             
             logger.info(f"Сгенерирован тест для действия: {action_name} ({action_id})")
@@ -283,19 +390,23 @@ class TestGenerator:
         """
         selected_tests = {}
         
+        known_ids = []
         for action_id in action_ids:
             if action_id in self.actions:
-                action_name = self.actions[action_id]['name']
-                safe_name = "".join(c for c in action_name if c.isalnum() or c in " _-").rstrip()
-                filename = f"e2e_test_{action_id}_{safe_name.replace(' ', '_')}.md"
-                
-                test_content = self.generate_test_for_action(action_id)
-                selected_tests[filename] = test_content
-                
-                logger.info(f"Сгенерирован тест для действия: {action_name} ({action_id})")
+                known_ids.append(action_id)
             else:
                 logger.warning(f"Действие {action_id} не найдено в модели")
         
+        for action_id, paths in self._plan(known_ids):
+            action_name = self.actions[action_id]['name']
+            safe_name = "".join(c for c in action_name if c.isalnum() or c in " _-").rstrip()
+            filename = f"e2e_test_{action_id}_{safe_name.replace(' ', '_')}.md"
+            
+            test_content = self.generate_test_for_action(action_id, paths)
+            selected_tests[filename] = test_content
+            
+            logger.info(f"Сгенерирован тест для действия: {action_name} ({action_id})")
+        
         return selected_tests
     
     def create_zip_archive(self, tests_dict, archive_name=None):
@@ -357,6 +468,19 @@ class TestGenerator:
         report += f"- Состояний: {len(self.state_map)}\n"
         report += f"- Связей: {len(self.connections)}\n"
         
+        if self.truncated_actions:
+            report += (f"\n**Пути найдены не полностью** для {len(self.truncated_actions)} действий: "
+                       f"не более {self.path_limit() or '-'} путей на действие, "
+                       f"бюджет времени {self.time_budget or '-'} с.\n")
+        
+        if self.coverage:
+            report += f"\n## Покрытие:\n"
+            report += f"- Выбрано сценариев: {self.coverage['selected']} из {self.coverage['candidates']}\n"
+            report += (f"- Действия: {self.coverage['actions']['covered']} из {self.coverage['actions']['total']} "
+                       f"({self.coverage['actions']['ratio']:.0%})\n")
+            report += (f"- Переходы: {self.coverage['transitions']['covered']} из {self.coverage['transitions']['total']} "
+                       f"({self.coverage['transitions']['ratio']:.0%})\n")
+        
         return report
 
 
@@ -371,19 +495,25 @@ def load_model_from_file(filepath):
         return None
 
 
-def generate_tests_from_model(model_data, action_ids=None):
+def generate_tests_from_model(model_data, action_ids=None, selection="all",
+                              max_scenarios_per_action=None, time_budget=None):
     """
     Основная функция для генерации тестов
     
     Args:
         model_data: Данные модели
         action_ids: Список ID действий (None для всех)
+        selection: "all" - все пути, "coverage" - минимальный покрывающий набор
+        max_scenarios_per_action: Максимум путей на действие (None - все)
+        time_budget: Бюджет времени на поиск путей в секундах (None - без ограничения)
         
     Returns:
         (tests_dict, zip_buffer, archive_name, summary)
     """
     try:
-        generator = TestGenerator(model_data)
+        generator = TestGenerator(model_data, selection=selection,
+                                  max_scenarios_per_action=max_scenarios_per_action,
+                                  time_budget=time_budget)
         
         if action_ids is None:
             # Генерация всех тестов
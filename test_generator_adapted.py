@@ -6,10 +6,25 @@
 
 import json
 import os
+import sys
+import math
 import zipfile
 import io
+import argparse
+import copy
+import itertools
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 import logging
+import random
+
+from path_engine import PathEngine, CYCLE_POLICIES
+from scenario_selection import select_covering_scenarios
+from model_stats import PathCounter, ScenarioLimitError, ON_LIMIT_POLICIES, json_number
+from path_sampling import PathSampler
+from compiled_model import CompiledModel
 
 # Настройка логирования
 logging.basicConfig(
@@ -22,149 +37,410 @@ logger = logging.getLogger(__name__)
 class BDDGeneratorSimple:
     """
     Упрощенная версия BDDGenerator без зависимостей
+
+    Пути вычисляет итеративный PathEngine (path_engine.py), поэтому циклы и
+    длинные цепочки в модели не приводят к RecursionError; циклы
+    обрабатываются по политике cycle_policy ("break", "skip", "error").
+
+    По умолчанию перечисляет все пути к каждому действию. С ограничениями
+    max_scenarios_per_action и time_budget для каждого действия и состояния
+    хранится не больше max_scenarios_per_action первых путей (это ровно
+    начало полного перечисления в том же порядке), а по истечении бюджета
+    времени перечисление останавливается. Действия с неполным списком
+    сценариев попадают в truncation_report().
+
+    В режиме selection="coverage" из всех сценариев выбирается небольшой
+    набор, покрывающий каждое действие и каждый переход через состояние
+    (scenario_selection.py); действия, уже покрытые чужими сценариями,
+    не получают отдельного файла.
+
+    С sample_size для каждого действия выводится равномерная случайная
+    выборка из sample_size сценариев (path_sampling.py) вместо перечисления;
+    seed делает выборку воспроизводимой.
     """
-    def __init__(self, model: dict):
+    SELECTION_MODES = ("all", "coverage")
+
+    def __init__(self, model: dict, max_scenarios_per_action=None, time_budget=None,
+                 cycle_policy="break", selection="all", sample_size=None, seed=None):
+        """
+        Args:
+            model: {action_name: {"init_states": [...], "final_states": [...]}}
+            max_scenarios_per_action: Максимум сценариев на действие (None - без ограничения)
+            time_budget: Бюджет времени на перечисление путей в секундах (None - без ограничения)
+            cycle_policy: Обработка циклов в модели: "break", "skip" или "error"
+            selection: "all" - все сценарии, "coverage" - минимальный покрывающий набор
+            sample_size: Случайная выборка сценариев на действие (None - перечисление)
+            seed: Зерно выборки (None - случайное, попадает в отчет)
+        """
+        if selection not in self.SELECTION_MODES:
+            raise ValueError(f"Неизвестный режим выбора сценариев: {selection} (ожидается один из {self.SELECTION_MODES})")
         self.model = model
-        self.states = {}
-        self.ways_to_action_cache = {}
-        self.ways_to_state_cache = {}
-        self._build_states_map()
+        self.selection = selection
+        self.coverage = None
+        self.precheck = None
+        self.max_scenarios_per_action = max_scenarios_per_action or None
+        self.time_budget = time_budget or None
+        self.engine = PathEngine(
+            model,
+            cycle_policy=cycle_policy,
+            max_paths=self.max_scenarios_per_action,
+            time_budget=self.time_budget
+        )
+        self.states = self.engine.states
+        self.sample_size = sample_size or None
+        self.seed = seed
+        self.sampler = None
+        self.sampled_actions = {}
+        if self.sample_size is not None:
+            if self.seed is None:
+                self.seed = random.randrange(2 ** 32)
+            counter = PathCounter(model, cycle_policy=cycle_policy)
+            counter.analyze()
+            if counter.exact:
+                self.sampler = PathSampler(counter)
+            else:
+                logger.warning("Счетчики путей в модели с циклами приближенные: "
+                               "выборка делается из перечисленных путей")
         logger.debug("Карта состояний построена.")
 
-    def _build_states_map(self):
-        for action_name, action_data in self.model.items():
-            for final_state in action_data.get("final_states", []):
-                if final_state not in self.states:
-                    self.states[final_state] = {"actions": []}
-                self.states[final_state]["actions"].append(action_name)
+    @property
+    def truncated_actions(self):
+        return self.engine.truncated_actions
 
-    def get_ways_to_action(self, action_name: str):
-        if action_name in self.ways_to_action_cache:
-            return self.ways_to_action_cache[action_name]
+    def limit_scenarios(self, max_scenarios_per_action):
+        """Ужесточает лимит сценариев на действие (до начала перечисления)"""
+        if self.max_scenarios_per_action is None or max_scenarios_per_action < self.max_scenarios_per_action:
+            self.max_scenarios_per_action = max_scenarios_per_action
+            self.engine.max_paths = max_scenarios_per_action
+        if self.sample_size is not None and max_scenarios_per_action < self.sample_size:
+            self.sample_size = max_scenarios_per_action
 
-        action = self.model.get(action_name, {})
-        init_states = action.get("init_states", [])
+    def update_model(self, model: dict):
+        """
+        Переходит к новой версии модели (см. PathEngine.update_model)
 
-        if not init_states:
-            self.ways_to_action_cache[action_name] = []
-            return []
+        Только для перечисления всех сценариев: выборка и покрывающий набор
+        зависят от модели целиком.
 
-        ways_to_states = {}
-        
-        for init_state in init_states:
-            if init_state not in self.states:
-                self.ways_to_action_cache[action_name] = []
-                return []
-            
-            ways_to_state = self.get_ways_to_state(init_state)
-            
-            if not ways_to_state:
-                self.ways_to_action_cache[action_name] = []
-                return []
-                
-            ways_to_states[init_state] = ways_to_state
-
-        final_ways = []
-        for state_name, ways_to_state in ways_to_states.items():
-            if len(final_ways) == 0:
-                final_ways = ways_to_state
-                continue
-
-            merged_ways = []
-            for way_left in final_ways:
-                for way_right in ways_to_state:
-                    merged_path = list(dict.fromkeys(way_left + way_right))
-                    merged_ways.append(merged_path)
-            final_ways = merged_ways
-
-        self.ways_to_action_cache[action_name] = final_ways
-        return final_ways
+        Returns:
+            Множество действий, сценарии которых могли измениться
+        """
+        if self.selection != "all" or self.sample_size is not None:
+            raise ValueError("Обновление модели без пересчета доступно только для selection=\"all\" без выборки")
+        self.model = model
+        dirty_actions = self.engine.update_model(model)
+        self.states = self.engine.states
+        return dirty_actions
+
+    def _rng(self, action_name):
+        """Генератор выборки действия: не зависит от порядка и набора действий"""
+        return random.Random(f"{self.seed}:{action_name}")
+
+    def sample_scenarios(self, action_name: str):
+        """
+        Равномерная выборка до sample_size путей-предусловий действия
+
+        Returns:
+            Список путей в порядке полного перечисления
+        """
+        rng = self._rng(action_name)
+        if self.sampler is not None:
+            total = self.sampler.count(action_name)
+            paths = self.sampler.sample(action_name, self.sample_size, rng)
+        else:
+            prereq_paths = self.engine.action_paths(action_name)
+            total = len(prereq_paths)
+            indices = sorted(rng.sample(range(total), min(self.sample_size, total)))
+            paths = [self.engine.path_names(prereq_paths[index]) for index in indices]
+        if total > len(paths):
+            self.sampled_actions[action_name] = total
+        return paths
+
+    def get_ways_to_action(self, action_name: str):
+        return self.engine.ways_to_action(action_name)
 
     def get_ways_to_state(self, state_name: str):
-        if state_name in self.ways_to_state_cache:
-            return self.ways_to_state_cache[state_name]
+        return self.engine.ways_to_state(state_name)
 
-        if state_name not in self.states:
-            self.ways_to_state_cache[state_name] = []
-            return []
+    def iter_scenarios(self, action_name: str):
+        """
+        Перебирает пути-предусловия действия по одному
 
-        state = self.states[state_name]
-        all_ways_to_state = []
+        Действие без путей дает один пустой сценарий.
+        """
+        if self.sample_size is not None:
+            prereq_paths = self.sample_scenarios(action_name)
+            if not prereq_paths:
+                yield []
+                return
+            yield from prereq_paths
+            return
+        if not self.engine.action_paths(action_name):
+            yield []
+            return
+        # Списки имен строятся по одному, только для вывода
+        yield from self.engine.iter_ways_to_action(action_name)
 
-        for action_name in state["actions"]:
-            prereq_paths = self.get_ways_to_action(action_name)
+    def select_scenarios(self, action_names):
+        """
+        Минимальный набор сценариев, покрывающий действия и переходы модели
 
-            if len(prereq_paths) == 0:
-                final_paths_for_action = [[action_name]]
-            else:
-                final_paths_for_action = []
-                for path in prereq_paths:
-                    new_path = path.copy()
-                    new_path.append(action_name)
-                    final_paths_for_action.append(new_path)
+        Args:
+            action_names: Действия, сценарии которых участвуют в выборе
+
+        Returns:
+            {action_name: [выбранные пути]}; отчет о покрытии - в self.coverage
+        """
+        candidates = []
+        owners = []
+        for action_name in action_names:
+            for path in self.iter_scenarios(action_name):
+                candidates.append(path + [action_name])
+                owners.append((action_name, path))
+
+        produces = {name: data.get("final_states", []) for name, data in self.model.items()}
+        consumes = {name: data.get("init_states", []) for name, data in self.model.items()}
+        indices, self.coverage = select_covering_scenarios(candidates, produces, consumes, actions=self.model.keys())
+
+        selected = {action_name: [] for action_name in action_names}
+        for index in indices:
+            action_name, path = owners[index]
+            selected[action_name].append(path)
+        logger.info(f"Выбрано {len(indices)} из {len(candidates)} сценариев, "
+                    f"покрытие действий {self.coverage['actions']['ratio']:.0%}, "
+                    f"переходов {self.coverage['transitions']['ratio']:.0%}")
+        return selected
+
+    def plan(self, action_names):
+        """
+        Какие действия и с какими путями выводить
+
+        Returns:
+            Список (action_name, пути или None - все сценарии действия)
+        """
+        action_names = list(action_names)
+        if self.selection == "all":
+            return [(action_name, None) for action_name in action_names]
+        selected = self.select_scenarios(action_names)
+        return [(action_name, selected[action_name]) for action_name in action_names if selected[action_name]]
+
+    def render_bdd(self, action_name: str, final_states=None, paths=None):
+        """
+        Текст BDD файла для действия
+
+        Args:
+            action_name: Действие
+            final_states: Ожидаемые состояния (по умолчанию - из модели)
+            paths: Пути-предусловия для вывода (по умолчанию - все сценарии)
+        """
+        if final_states is None:
+            final_states = self.model.get(action_name, {}).get("final_states", [])
+        if paths is None:
+            paths = self.iter_scenarios(action_name)
+
+        parts = [f"Функциональность: {action_name}\n\n"]
+        
+        for i, path in enumerate(paths):
+            scenario_num = i + 1
+            parts.append(f"Сценарий {scenario_num} {action_name}\n")
+            
+            for step in path:
+                parts.append(f"Когда {step}\n")
             
-            all_ways_to_state.extend(final_paths_for_action)
+            parts.append(f"Когда {action_name}\n")
+            
+            for state in final_states:
+                parts.append(f"Тогда {state}\n")
+            
+            parts.append("\n")
 
-        self.ways_to_state_cache[state_name] = all_ways_to_state
-        return all_ways_to_state
+        if action_name in self.sampled_actions:
+            parts.append(f"# Случайная выборка: {self.sample_size} из "
+                         f"{self.sampled_actions[action_name]} сценариев (seed={self.seed})\n")
+        if action_name in self.truncated_actions:
+            parts.append(f"# Показаны не все сценарии: перечисление ограничено "
+                         f"({self.max_scenarios_per_action or '-'} сценариев, "
+                         f"{self.time_budget or '-'} с)\n")
+        
+        return "".join(parts)
 
     def generate_all_bdd_files(self):
         all_files = {}
 
-        for action_name in self.model.keys():
+        for action_name, paths in self.plan(self.model.keys()):
             logger.info(f"Генерация BDD для действия: '{action_name}'")
-            prereq_paths = self.get_ways_to_action(action_name)
-            final_states = self.model[action_name].get("final_states", [])
-
-            if not prereq_paths:
-                prereq_paths = [[]] 
-            
-            txt_content = f"Функциональность: {action_name}\n\n"
-            
-            for i, path in enumerate(prereq_paths):
-                scenario_num = i + 1
-                txt_content += f"Сценарий {scenario_num} {action_name}\n"
-                
-                for step in path:
-                    txt_content += f"Когда {step}\n"
-                
-                txt_content += f"Когда {action_name}\n"
-                
-                for state in final_states:
-                    txt_content += f"Тогда {state}\n"
-                
-                txt_content += "\n"
             
             safe_name = "".join(c for c in action_name if c.isalnum() or c in " _-").rstrip()
             filename = f"{safe_name.replace(' ', '_')}.txt"
             
-            all_files[filename] = txt_content
+            all_files[filename] = self.render_bdd(action_name, paths=paths)
             
         return all_files
 
+    def run_state(self):
+        """Сведения, накопленные при перечислении и выборке (для процессов пула)"""
+        return {
+            "truncated_actions": set(self.engine.truncated_actions),
+            "skipped_actions": set(self.engine.skipped_actions),
+            "cycles": list(self.engine.cycles),
+            "timed_out": self.engine.timed_out,
+            "sampled_actions": dict(self.sampled_actions)
+        }
+
+    def merge_run_state(self, state):
+        """Добавляет сведения run_state() другого процесса к своим"""
+        self.engine.truncated_actions |= state["truncated_actions"]
+        self.engine.skipped_actions |= state["skipped_actions"]
+        known_cycles = {frozenset(cycle) for cycle in self.engine.cycles}
+        for cycle in state["cycles"]:
+            if frozenset(cycle) not in known_cycles:
+                known_cycles.add(frozenset(cycle))
+                self.engine.cycles.append(cycle)
+        self.engine.timed_out = self.engine.timed_out or state["timed_out"]
+        self.sampled_actions.update(state["sampled_actions"])
+
+    def truncation_report(self):
+        """Сведения об обрезанных списках сценариев, циклах модели и покрытии"""
+        report = self.engine.report()
+        report["selection"] = self.selection
+        report["coverage"] = self.coverage
+        report["precheck"] = self.precheck
+        report["sampling"] = None
+        if self.sample_size is not None:
+            report["sampling"] = {
+                "sample_size": self.sample_size,
+                "seed": self.seed,
+                "exact": self.sampler is not None,
+                "sampled_actions": len(self.sampled_actions)
+            }
+        return report
+
+
+# Генератор процесса пула рендеринга (см. BDDGeneratorAdapted.iter_tests)
+_render_generator = None
+
+
+def _init_render_worker(generator):
+    """Инициализация процесса пула: генератор с уже построенным графом модели"""
+    global _render_generator
+    _render_generator = generator
+
+
+def _render_chunk(tasks):
+    """
+    Рендеринг части действий в процессе пула
+    
+    Args:
+        tasks: Список (action_name, пути или None)
+        
+    Returns:
+        ([(filename, content), ...], BDDGeneratorSimple.run_state())
+    """
+    files = [_render_generator.render_test(action_name, paths) for action_name, paths in tasks]
+    return files, _render_generator.bdd_generator.run_state()
+
+
+def resolve_processes(processes):
+    """
+    Число процессов рендеринга: None или 1 - без пула, 0 - по числу ядер
+    
+    Raises:
+        ValueError: Не целое неотрицательное число
+    """
+    if processes is None:
+        return 1
+    if isinstance(processes, bool) or not isinstance(processes, int) or processes < 0:
+        raise ValueError(f"Число процессов должно быть неотрицательным целым числом: {processes}")
+    return processes or os.cpu_count() or 1
+
+
+def resolve_start_method(start_method=None):
+    """
+    Способ запуска процессов рендеринга (None - безопасный по умолчанию)
+    
+    fork копирует процесс вместе с блокировками, захваченными другими
+    потоками: в многопоточном API сервере процесс пула может навсегда
+    повиснуть на блокировке логгера, хранилища моделей или кэша. Поэтому
+    по умолчанию процессы порождаются forkserver (из отдельного чистого
+    процесса), а где его нет - spawn. fork задается явно там, где других
+    потоков нет (командная строка).
+    
+    Raises:
+        ValueError: Способ недоступен на этой платформе
+    """
+    methods = multiprocessing.get_all_start_methods()
+    if start_method is None:
+        return "forkserver" if "forkserver" in methods else "spawn"
+    if start_method not in methods:
+        raise ValueError(f"Способ запуска процессов {start_method} недоступен (доступны: {', '.join(methods)})")
+    return start_method
+
+
+def count_scenarios(content):
+    """Число сценариев в тексте файла теста (строки "Сценарий N ..." из render_bdd)"""
+    return content.count("\nСценарий ")
+
 
 class BDDGeneratorAdapted:
     """
     Адаптированный генератор BDD-сценариев для структуры test_project.json
+    
+    С processes > 1 файлы действий рендерятся в пуле процессов: граф
+    модели строится один раз в родительском процессе, процессы получают
+    генератор при старте (сериализованным, при fork - без копирования),
+    а файлы выдаются в том же порядке, что и без пула.
+    
+    С incremental=True генератор переживает правки модели: update_model()
+    сбрасывает пути и готовые файлы только ниже по графу от изменений, и
+    следующий iter_tests() строит заново лишь эти файлы.
     """
     
-    def __init__(self, model_data):
+    # Частей на процесс: мелкие части выравнивают нагрузку между процессами
+    CHUNKS_PER_PROCESS = 4
+    
+    def __init__(self, model_data, max_scenarios_per_action=None, time_budget=None,
+                 cycle_policy="break", selection="all", sample_size=None, seed=None, processes=None,
+                 compiled=None, incremental=False, start_method=None):
         """
         Инициализация генератора для структуры test_project.json
         
         Args:
-            model_data: Данные модели в формате test_project.json
+            model_data: Данные модели в формате test_project.json (не нужны, если задан compiled)
+            max_scenarios_per_action: Максимум сценариев на действие (None - все)
+            time_budget: Бюджет времени на перечисление путей в секундах (None - без ограничения)
+            cycle_policy: Обработка циклов в модели: "break", "skip" или "error"
+            selection: "all" - все сценарии, "coverage" - минимальный покрывающий набор
+            sample_size: Случайная выборка сценариев на действие (None - перечисление)
+            seed: Зерно выборки (None - случайное)
+            processes: Процессы рендеринга (None или 1 - в текущем процессе, 0 - по числу ядер)
+            compiled: Готовая CompiledModel этой модели (чтобы не разбирать повторно)
+            incremental: Запоминать файлы действий для update_model()
+            start_method: Способ запуска процессов рендеринга (см. resolve_start_method)
         """
         self.model_data = model_data
-        self.states = {}
-        self.ways_to_action_cache = {}
-        self.ways_to_state_cache = {}
+        self.processes = resolve_processes(processes)
+        self.start_method = resolve_start_method(start_method)
+        self.compiled = compiled if compiled is not None else CompiledModel(model_data)
         
         # Преобразуем нашу структуру в формат для BDDGenerator
         self.simple_model = self._convert_to_simple_format()
         
         # Инициализируем оригинальный генератор
-        self.bdd_generator = BDDGeneratorSimple(self.simple_model)
+        self.bdd_generator = BDDGeneratorSimple(
+            self.simple_model,
+            max_scenarios_per_action=max_scenarios_per_action,
+            time_budget=time_budget,
+            cycle_policy=cycle_policy,
+            selection=selection,
+            sample_size=sample_size,
+            seed=seed
+        )
+        
+        # Готовые файлы действий текущей версии модели (только incremental):
+        # action_name -> (filename, content)
+        self.rendered = {} if incremental else None
+        self.render_stats = None
+        self._path_counter = None
         
         logger.info(f"Инициализирован адаптированный генератор для {len(self.simple_model)} действий")
     
@@ -175,76 +451,62 @@ class BDDGeneratorAdapted:
         Возвращает:
             dict в формате {action_name: {"init_states": [], "final_states": []}}
         """
-        simple_model = {}
+        return self.compiled.simple_model()
+    
+    def path_counter(self):
+        """
+        Счетчик путей по преобразованной модели (model_stats.py)
         
-        # Строим карту состояний: state_id -> state_name
-        state_map = {}
-        for obj in self.model_data.get('model_objects', []):
-            object_id = obj.get('object_id')
-            object_name = obj.get('object_name', '')
-            
-            for state in obj.get('resource_state', []):
-                state_id = state.get('state_id')
-                state_name = state.get('state_name', '')
-                state_map[state_id] = f"{object_name} {state_name}"
-        
-        # Строим карту связей: action_id -> {init_states: [], final_states: []}
-        action_states = {}
-        
-        # Инициализируем все действия
-        for action in self.model_data.get('model_actions', []):
-            action_id = action.get('action_id')
-            action_name = action.get('action_name', f"Действие {action_id}")
-            action_states[action_id] = {
-                'name': action_name,
-                'init_states': [],  # Состояния, которые ведут к действию
-                'final_states': []  # Состояния, которые создаются действием
-            }
+        С incremental=True счетчик один на генератор и обновляется вместе с моделью.
+        """
+        if self.rendered is None:
+            return PathCounter(self.simple_model, cycle_policy=self.bdd_generator.engine.cycle_policy)
+        if self._path_counter is None:
+            self._path_counter = PathCounter(self.simple_model, cycle_policy=self.bdd_generator.engine.cycle_policy)
+        return self._path_counter
+    
+    def update_model(self, model_data, compiled=None):
+        """
+        Переходит к новой версии модели без построения генератора заново
         
-        # Анализируем связи для определения init_states и final_states
-        for conn in self.model_data.get('model_connections', []):
-            conn_out = conn.get('connection_out', '')
-            conn_in = conn.get('connection_in', '')
-            
-            # Определяем тип связи
-            if conn_out.startswith('a'):  # Действие -> Состояние
-                # conn_out - действие, conn_in - состояние
-                action_id = conn_out
-                
-                # Извлекаем state_id из строки формата "o00000s00000"
-                if conn_in and len(conn_in) >= 8:
-                    # Формат: o00000s00000
-                    if 's' in conn_in:
-                        parts = conn_in.split('s')
-                        if len(parts) == 2:
-                            state_id = 's' + parts[1]
-                            if state_id in state_map:
-                                if action_id in action_states:
-                                    action_states[action_id]['final_states'].append(state_map[state_id])
+        Пути и файлы действий, которых изменение не касается, сохраняются;
+        файлы действий ниже по графу от измененных действий и состояний
+        будут построены заново при следующем iter_tests().
+        
+        Args:
+            model_data: Новая версия модели (не нужна, если задан compiled)
+            compiled: Готовая CompiledModel новой версии
             
-            elif conn_out.startswith('o'):  # Состояние -> Действие
-                # conn_out - состояние, conn_in - действие
-                if conn_in and conn_in.startswith('a'):
-                    action_id = conn_in
-                    
-                    # Извлекаем state_id из conn_out
-                    if 's' in conn_out:
-                        parts = conn_out.split('s')
-                        if len(parts) == 2:
-                            state_id = 's' + parts[1]
-                            if state_id in state_map:
-                                if action_id in action_states:
-                                    action_states[action_id]['init_states'].append(state_map[state_id])
-        
-        # Преобразуем в простой формат
-        for action_id, states in action_states.items():
-            action_name = states['name']
-            simple_model[action_name] = {
-                "init_states": list(set(states['init_states'])),  # Убираем дубли
-                "final_states": list(set(states['final_states']))
-            }
+        Returns:
+            Множество действий, сценарии которых могли измениться
+        """
+        if self.rendered is None:
+            raise ValueError("Обновление модели доступно только генератору с incremental=True")
+        old_compiled = self.compiled
+        self.model_data = model_data
+        self.compiled = compiled if compiled is not None else CompiledModel(model_data)
+        self.simple_model = self._convert_to_simple_format()
+        
+        dirty_actions = self.bdd_generator.update_model(self.simple_model)
+        if self._path_counter is not None:
+            self._path_counter.update_model(self.simple_model)
         
-        return simple_model
+        for action_name in list(self.rendered):
+            if (action_name in dirty_actions or action_name not in self.simple_model
+                    or self._has_action(old_compiled, action_name) != self._has_action(self.compiled, action_name)):
+                del self.rendered[action_name]
+        logger.info(f"Модель обновлена: затронуто {len(dirty_actions)} действий, "
+                    f"готовых файлов {len(self.rendered)}")
+        return dirty_actions
+    
+    def complexity(self, top=10):
+        """
+        Сложность модели без перечисления сценариев
+        
+        Returns:
+            PathCounter.report(): число сценариев, глубина, ветвление, компоненты
+        """
+        return self.path_counter().report(top=top)
     
     def generate_all_bdd_files(self):
         """
@@ -255,50 +517,166 @@ class BDDGeneratorAdapted:
         """
         return self.bdd_generator.generate_all_bdd_files()
     
-    def generate_bdd_for_action(self, action_name):
+    def generate_bdd_for_action(self, action_name, paths=None):
         """
         Генерирует BDD для конкретного действия
         
         Args:
             action_name: Название действия
+            paths: Пути-предусловия для вывода (None - все сценарии действия)
             
         Returns:
             Строка с BDD сценарием
         """
-        # Находим action_id по названию
-        action_id = None
-        for action in self.model_data.get('model_actions', []):
-            if action.get('action_name') == action_name:
-                action_id = action.get('action_id')
-                break
-        
-        if not action_id:
+        # Находим действие по названию
+        if not self._has_action(self.compiled, action_name):
             return f"# Ошибка: действие '{action_name}' не найдено\n"
         
-        # Генерируем пути к действию
-        prereq_paths = self.bdd_generator.get_ways_to_action(action_name)
+        # Генерируем пути к действию и текст сценариев
         final_states = self.simple_model.get(action_name, {}).get('final_states', [])
+        return self.bdd_generator.render_bdd(action_name, final_states, paths=paths)
+    
+    @staticmethod
+    def _has_action(compiled, action_name):
+        """Есть ли в модели действие с таким названием и непустым ID"""
+        action = compiled.find_action_by_name(action_name)
+        return action is not None and bool(compiled.action_ids[action])
+    
+    def iter_tests(self, action_names=None):
+        """
+        Генерирует тесты по одному действию
+        
+        Args:
+            action_names: Список названий действий (None - все действия)
+            
+        Yields:
+            (filename, content) - файл создается непосредственно перед выдачей
+        """
+        if action_names is None:
+            known_actions = list(self.simple_model.keys())
+        else:
+            known_actions = []
+            for action_name in action_names:
+                if action_name in self.simple_model:
+                    known_actions.append(action_name)
+                else:
+                    logger.warning(f"Действие '{action_name}' не найдено в модели")
         
-        if not prereq_paths:
-            prereq_paths = [[]]
+        plan = self.bdd_generator.plan(known_actions)
+        if self.rendered is not None:
+            yield from self._iter_tests_incremental(plan)
+            return
+        yield from self._render_plan(plan)
+    
+    def _render_plan(self, plan):
+        """(filename, content) действий плана по порядку, в пуле процессов или здесь"""
+        if self.processes > 1 and len(plan) > 1:
+            return self._iter_tests_parallel(plan)
+        return (self.render_test(action_name, paths) for action_name, paths in plan)
+    
+    def _iter_tests_incremental(self, plan):
+        """
+        Файлы плана: готовые берутся из self.rendered, остальные строятся
+        (в том же порядке) и запоминаются
+        """
+        missing = {}
+        for action_name, paths in plan:
+            if action_name not in self.rendered and action_name not in missing:
+                missing[action_name] = paths
+        self.render_stats = {"rendered": len(missing), "reused": len(dict(plan)) - len(missing)}
         
-        txt_content = f"Функциональность: {action_name}\n\n"
+        fresh = self._render_plan(list(missing.items()))
+        try:
+            for action_name, _ in plan:
+                if action_name not in self.rendered:
+                    self.rendered[action_name] = next(fresh)
+                yield self.rendered[action_name]
+        finally:
+            fresh.close()
+    
+    def render_test(self, action_name, paths=None):
+        """Файл теста действия: (filename, content)"""
+        safe_name = "".join(c for c in action_name if c.isalnum() or c in " _-").rstrip()
+        filename = f"bdd_{safe_name.replace(' ', '_')}.txt"
         
-        for i, path in enumerate(prereq_paths):
-            scenario_num = i + 1
-            txt_content += f"Сценарий {scenario_num} {action_name}\n"
-            
-            for step in path:
-                txt_content += f"Когда {step}\n"
-            
-            txt_content += f"Когда {action_name}\n"
-            
-            for state in final_states:
-                txt_content += f"Тогда {state}\n"
-            
-            txt_content += "\n"
+        test_content = self.generate_bdd_for_action(action_name, paths)
+        logger.info(f"Сгенерирован BDD для действия: {action_name}")
         
-        return txt_content
+        return filename, test_content
+    
+    def _resolve_cycles(self, plan):
+        """
+        Перечисляет пути действий плана по порядку, пока не разрешены все циклы
+        
+        При политике "break" пути узлов цикла зависят от того, с какого узла
+        обход вошел в цикл. Процессы пула обходили бы граф в своем порядке,
+        поэтому циклы разрешаются до запуска пула так же, как без него, а
+        процессы получают уже посчитанные пути. В модели без циклов
+        перечисление целиком остается процессам.
+        """
+        counter = self.path_counter()
+        counter.analyze()
+        engine = self.bdd_generator.engine
+        pending = [node for node in counter.cyclic_nodes() if node not in engine.ways]
+        for action_name, paths in plan:
+            if not pending:
+                break
+            if paths is None:
+                engine.action_paths(action_name)
+                pending = [node for node in pending if node not in engine.ways]
+    
+    def _render_context(self):
+        """
+        Копия генератора для процессов пула: только то, что нужно render_test
+        
+        Исходная модель, готовые файлы инкрементальной сессии и счетчик путей
+        процессам не нужны, а сериализовались бы в каждый из них.
+        """
+        context = copy.copy(self)
+        context.model_data = None
+        context.rendered = None
+        context.render_stats = None
+        context._path_counter = None
+        return context
+    
+    def _iter_tests_parallel(self, plan):
+        """
+        Рендеринг плана в пуле процессов с сохранением порядка
+        
+        План режется на части подряд идущих действий; в работе одновременно
+        не больше двух частей на процесс, поэтому готовые, но еще не
+        выданные файлы не копятся в памяти. Сведения об обрезке, циклах и
+        выборке из процессов объединяются с собственными.
+        """
+        # Бюджет времени общий: процессы получают уже идущий отсчет
+        self.bdd_generator.engine.start_budget()
+        if self.bdd_generator.engine.cycle_policy == "break":
+            self._resolve_cycles(plan)
+        
+        processes = min(self.processes, len(plan))
+        chunk_size = math.ceil(len(plan) / (processes * self.CHUNKS_PER_PROCESS))
+        chunks = iter([plan[i:i + chunk_size] for i in range(0, len(plan), chunk_size)])
+        
+        # fork передает генератор процессам без сериализации, forkserver и
+        # spawn сериализуют его в каждый процесс
+        logger.info(f"Рендеринг {len(plan)} действий в {processes} процессах ({self.start_method})")
+        
+        with ProcessPoolExecutor(
+            max_workers=processes,
+            mp_context=multiprocessing.get_context(self.start_method),
+            initializer=_init_render_worker,
+            initargs=(self._render_context(),)
+        ) as executor:
+            pending = deque()
+            for chunk in itertools.islice(chunks, processes * 2):
+                pending.append(executor.submit(_render_chunk, chunk))
+            while pending:
+                files, state = pending.popleft().result()
+                chunk = next(chunks, None)
+                if chunk is not None:
+                    pending.append(executor.submit(_render_chunk, chunk))
+                self.bdd_generator.merge_run_state(state)
+                yield from files
     
     def generate_all_tests(self):
         """
@@ -307,18 +685,7 @@ class BDDGeneratorAdapted:
         Returns:
             dict {filename: content}
         """
-        all_tests = {}
-        
-        for action_name in self.simple_model.keys():
-            safe_name = "".join(c for c in action_name if c.isalnum() or c in " _-").rstrip()
-            filename = f"bdd_{safe_name.replace(' ', '_')}.txt"
-            
-            test_content = self.generate_bdd_for_action(action_name)
-            all_tests[filename] = test_content
-            
-            logger.info(f"Сгенерирован BDD для действия: {action_name}")
-        
-        return all_tests
+        return dict(self.iter_tests())
     
     def generate_tests_for_actions(self, action_names):
         """
@@ -330,21 +697,7 @@ class BDDGeneratorAdapted:
         Returns:
             dict {filename: content} для выбранных тестов
         """
-        selected_tests = {}
-        
-        for action_name in action_names:
-            if action_name in self.simple_model:
-                safe_name = "".join(c for c in action_name if c.isalnum() or c in " _-").rstrip()
-                filename = f"bdd_{safe_name.replace(' ', '_')}.txt"
-                
-                test_content = self.generate_bdd_for_action(action_name)
-                selected_tests[filename] = test_content
-                
-                logger.info(f"Сгенерирован BDD для действия: {action_name}")
-            else:
-                logger.warning(f"Действие '{action_name}' не найдено в модели")
-        
-        return selected_tests
+        return dict(self.iter_tests(action_names))
 
 
 class TestGeneratorAdapted:
@@ -352,42 +705,153 @@ class TestGeneratorAdapted:
     Полный адаптированный генератор тестов с поддержкой ZIP архивов
     """
     
-    def __init__(self, model_data):
+    def __init__(self, model_data, max_scenarios_per_action=None, time_budget=None,
+                 cycle_policy="break", selection="all", sample_size=None, seed=None, processes=None,
+                 compiled=None, incremental=False, start_method=None):
         self.model_data = model_data
-        self.generator = BDDGeneratorAdapted(model_data)
+        self.generator = BDDGeneratorAdapted(
+            model_data,
+            compiled=compiled,
+            incremental=incremental,
+            start_method=start_method,
+            max_scenarios_per_action=max_scenarios_per_action,
+            time_budget=time_budget,
+            cycle_policy=cycle_policy,
+            selection=selection,
+            sample_size=sample_size,
+            seed=seed,
+            processes=processes
+        )
+        # Сценарии в последнем архиве write_zip_archive()
+        self.scenarios_written = 0
+    
+    def truncation_report(self):
+        """Сведения об обрезанных списках сценариев, циклах модели и покрытии"""
+        return self.generator.bdd_generator.truncation_report()
     
     def generate_all(self):
         """Генерирует все тесты"""
-        return self.generator.generate_all_tests()
+        return dict(self.iter_tests())
     
     def generate_for_actions(self, action_names):
         """Генерирует тесты для указанных действий"""
         return self.generator.generate_tests_for_actions(action_names)
     
-    def generate_for_action_ids(self, action_ids):
-        """Генерирует тесты для указанных ID действий"""
-        # Преобразуем action_ids в action_names
-        action_names = []
-        action_id_to_name = {}
+    def precheck(self, max_total_scenarios, on_limit="cap", action_ids=None):
+        """
+        Проверка объема генерации до перечисления сценариев
         
-        for action in self.model_data.get('model_actions', []):
-            action_id = action.get('action_id')
-            action_name = action.get('action_name')
-            action_id_to_name[action_id] = action_name
+        Считает, сколько сценариев даст генерация. Если больше
+        max_total_scenarios: при on_limit == "cap" лимит сценариев на
+        действие уменьшается так, чтобы сумма уложилась в max_total_scenarios,
+        при on_limit == "reject" генерация отклоняется.
+        
+        Args:
+            max_total_scenarios: Допустимое число сценариев
+            on_limit: "cap" или "reject"
+            action_ids: ID действий, для которых будут тесты (None - все)
+            
+        Returns:
+            dict с результатом проверки (попадает в truncation_report)
+            
+        Raises:
+            ScenarioLimitError: Лимит превышен и on_limit == "reject"
+        """
+        if on_limit not in ON_LIMIT_POLICIES:
+            raise ValueError(f"Неизвестная политика лимита: {on_limit} (ожидается одна из {ON_LIMIT_POLICIES})")
+        
+        action_names = None if action_ids is None else self._action_names_for_ids(action_ids)
+        counter = self.generator.path_counter()
+        bdd_generator = self.generator.bdd_generator
+        total = counter.total_scenarios(action_names, limit=bdd_generator.sample_size)
+        
+        result = {
+            "total_scenarios": json_number(total),
+            "exact": counter.exact,
+            "max_total_scenarios": max_total_scenarios,
+            "on_limit": on_limit,
+            "action": "none"
+        }
+        if total > max_total_scenarios:
+            if on_limit == "reject":
+                raise ScenarioLimitError(json_number(total), max_total_scenarios, counter.report(top=5))
+            actions_count = len(action_names) if action_names is not None else len(self.generator.simple_model)
+            per_action = max(1, max_total_scenarios // max(1, actions_count))
+            result["max_scenarios_per_action"] = bdd_generator.max_scenarios_per_action
+            if bdd_generator.max_scenarios_per_action is not None and bdd_generator.max_scenarios_per_action <= per_action:
+                # Действующий лимит на действие уже укладывает генерацию в max_total_scenarios
+                bdd_generator.precheck = result
+                return result
+            bdd_generator.limit_scenarios(per_action)
+            result["action"] = "capped"
+            result["max_scenarios_per_action"] = bdd_generator.max_scenarios_per_action
+            logger.warning(f"Модель дает {total} сценариев, больше лимита {max_total_scenarios}: "
+                           f"не более {bdd_generator.max_scenarios_per_action} сценариев на действие")
+        
+        bdd_generator.precheck = result
+        return result
+    
+    def _action_names_for_ids(self, action_ids):
+        """Названия действий по их ID (неизвестные ID пропускаются)"""
+        action_names = []
+        compiled = self.generator.compiled
         
         for action_id in action_ids:
-            if action_id in action_id_to_name:
-                action_names.append(action_id_to_name[action_id])
+            action = compiled.find_action(action_id)
+            if action is not None:
+                action_names.append(compiled.action_label(action))
             else:
                 logger.warning(f"Действие с ID '{action_id}' не найдено")
         
-        return self.generate_for_actions(action_names)
+        return action_names
+    
+    def generate_for_action_ids(self, action_ids):
+        """Генерирует тесты для указанных ID действий"""
+        return self.generate_for_actions(self._action_names_for_ids(action_ids))
+    
+    def iter_tests(self, action_ids=None):
+        """(filename, content) по одному действию; action_ids=None - все действия"""
+        action_names = None if action_ids is None else self._action_names_for_ids(action_ids)
+        return self.generator.iter_tests(action_names)
+    
+    @staticmethod
+    def archive_name():
+        """Имя ZIP архива с отметкой времени"""
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        return f"bdd_tests_{timestamp}.zip"
+    
+    def write_zip_archive(self, fileobj, action_ids=None):
+        """
+        Пишет ZIP архив с тестами в поток, не собирая его в памяти
+        
+        Каждый файл генерируется и сжимается непосредственно перед записью;
+        поток может не поддерживать seek (сокет). README.md пишется последним:
+        в нем сведения об ограничениях, известные только после генерации.
+        
+        Args:
+            fileobj: Файлоподобный объект с write()
+            action_ids: Список ID действий (None - все действия)
+            
+        Returns:
+            Список имен записанных файлов тестов (число сценариев в них -
+            self.scenarios_written)
+        """
+        filenames = []
+        self.scenarios_written = 0
+        with zipfile.ZipFile(fileobj, 'w', zipfile.ZIP_DEFLATED) as zipf:
+            for filename, content in self.iter_tests(action_ids):
+                zipf.writestr(filename, content.encode('utf-8'))
+                filenames.append(filename)
+                self.scenarios_written += count_scenarios(content)
+            
+            readme_content = self._generate_readme(filenames)
+            zipf.writestr("README.md", readme_content.encode('utf-8'))
+        return filenames
     
     def create_zip_archive(self, tests_dict, archive_name=None):
         """Создает ZIP архив с тестами"""
         if archive_name is None:
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            archive_name = f"bdd_tests_{timestamp}.zip"
+            archive_name = self.archive_name()
         
         zip_buffer = io.BytesIO()
         
@@ -403,7 +867,7 @@ class TestGeneratorAdapted:
         return zip_buffer, archive_name
     
     def _generate_readme(self, tests_dict):
-        """Генерирует README файл для архива"""
+        """Генерирует README файл для архива (tests_dict - тесты или их имена)"""
         readme = f"# BDD тесты (адаптированный алгоритм)\n\n"
         readme += f"**Дата генерации:** {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n"
         readme += f"**Всего тестов:** {len(tests_dict)}\n\n"
@@ -419,8 +883,40 @@ class TestGeneratorAdapted:
         readme += "- **Когда**: Предусловия и шаги\n"
         readme += "- **Тогда**: Ожидаемые результаты\n\n"
         
+        report = self.truncation_report()
+        if report["truncated"]:
+            readme += "## Ограничения\n"
+            readme += (f"Перечисление сценариев ограничено: не более "
+                       f"{report['max_scenarios_per_action'] or '-'} сценариев на действие, "
+                       f"бюджет времени {report['time_budget'] or '-'} с.\n")
+            readme += f"Показаны не все сценарии для {len(report['truncated_actions'])} действий.\n"
+            precheck = report.get("precheck")
+            if precheck and precheck["action"] == "capped":
+                readme += (f"Модель дает {precheck['total_scenarios']} сценариев при лимите "
+                           f"{precheck['max_total_scenarios']}, лимит на действие уменьшен.\n")
+            readme += "\n"
+        
+        sampling = report.get("sampling")
+        if sampling:
+            readme += "## Выборка\n"
+            readme += (f"Для {sampling['sampled_actions']} действий выведена равномерная случайная выборка "
+                       f"из {sampling['sample_size']} сценариев (seed={sampling['seed']}).\n\n")
+        
+        coverage = report.get("coverage")
+        if coverage:
+            readme += "## Покрытие\n"
+            readme += (f"Выбрано {coverage['selected']} из {coverage['candidates']} сценариев, "
+                       f"покрывающих каждое действие и переход хотя бы один раз.\n")
+            readme += (f"- Действия: {coverage['actions']['covered']} из {coverage['actions']['total']} "
+                       f"({coverage['actions']['ratio']:.0%})\n")
+            readme += (f"- Переходы: {coverage['transitions']['covered']} из {coverage['transitions']['total']} "
+                       f"({coverage['transitions']['ratio']:.0%})\n")
+            if coverage["uncovered_actions"]:
+                readme += f"- Непокрытые действия: {', '.join(coverage['uncovered_actions'])}\n"
+            readme += "\n"
+        
         readme += "## Список тестов\n"
-        for filename in sorted(tests_dict.keys()):
+        for filename in sorted(tests_dict):
             readme += f"- `{filename}`\n"
         
         return readme
@@ -437,19 +933,126 @@ def load_model(filepath):
         return None
 
 
-def generate_tests(model_data, action_ids=None):
+def model_complexity(model_data, cycle_policy="break", top=10, compiled=None):
     """
-    Основная функция генерации тестов
+    Сложность модели test_project.json без генерации тестов
+    
+    Args:
+        model_data: Данные модели (не нужны, если задан compiled)
+        cycle_policy: Обработка циклов в модели: "break", "skip" или "error"
+        top: Сколько самых "тяжелых" действий и состояний показывать
+        compiled: Готовая CompiledModel модели
+        
+    Returns:
+        PathCounter.report()
+        
+    Raises:
+        ValueError: Неизвестная политика циклов
+        ModelCycleError: В модели есть цикл и cycle_policy == "error"
+    """
+    return BDDGeneratorAdapted(model_data, cycle_policy=cycle_policy, compiled=compiled).complexity(top=top)
+
+
+def create_test_generator(model_data, action_ids=None, max_scenarios_per_action=None, time_budget=None,
+                          cycle_policy="break", selection="all", max_total_scenarios=None, on_limit="cap",
+                          sample_size=None, seed=None, processes=None, compiled=None, incremental=False,
+                          start_method=None):
+    """
+    Проверяет параметры и готовит генератор тестов
+    
+    Все ошибки запроса (неверные параметры, цикл при cycle_policy == "error",
+    превышение лимита при on_limit == "reject") возникают здесь, до
+    генерации первого файла - поэтому ответ можно отдавать потоком.
+    Параметры - как у generate_tests_with_report(); incremental - генератор
+    для GenerationSession (generation_sessions.py), переживающий правки модели;
+    start_method - способ запуска процессов рендеринга (resolve_start_method).
+    
+    Returns:
+        TestGeneratorAdapted
+        
+    Raises:
+        ValueError, ModelCycleError, ScenarioLimitError
+    """
+    if cycle_policy not in CYCLE_POLICIES:
+        raise ValueError(f"Неизвестная политика циклов: {cycle_policy} (ожидается одна из {CYCLE_POLICIES})")
+    if selection not in BDDGeneratorSimple.SELECTION_MODES:
+        raise ValueError(f"Неизвестный режим выбора сценариев: {selection} "
+                         f"(ожидается один из {BDDGeneratorSimple.SELECTION_MODES})")
+    if on_limit not in ON_LIMIT_POLICIES:
+        raise ValueError(f"Неизвестная политика лимита: {on_limit} (ожидается одна из {ON_LIMIT_POLICIES})")
+    if sample_size is not None and (not isinstance(sample_size, int) or sample_size < 0):
+        raise ValueError(f"Размер выборки должен быть неотрицательным целым числом: {sample_size}")
+    resolve_processes(processes)
+    resolve_start_method(start_method)
+    
+    generator = TestGeneratorAdapted(
+        model_data,
+        max_scenarios_per_action=max_scenarios_per_action,
+        time_budget=time_budget,
+        cycle_policy=cycle_policy,
+        selection=selection,
+        sample_size=sample_size,
+        seed=seed,
+        processes=processes,
+        compiled=compiled,
+        incremental=incremental,
+        start_method=start_method
+    )
+    
+    if max_total_scenarios:
+        # Считаем сценарии до перечисления: отклоняем или ограничиваем
+        generator.precheck(max_total_scenarios, on_limit, action_ids)
+    elif cycle_policy == "error":
+        # Циклы находятся обходом графа со счетчиками, без перечисления путей
+        generator.generator.path_counter().analyze()
+    
+    return generator
+
+
+def generate_tests_with_report(model_data, action_ids=None, max_scenarios_per_action=None, time_budget=None,
+                               cycle_policy="break", selection="all", max_total_scenarios=None, on_limit="cap",
+                               sample_size=None, seed=None, processes=None, compiled=None):
+    """
+    Генерация тестов со сведениями об ограничении перечисления
     
     Args:
         model_data: Данные модели
         action_ids: Список ID действий (None для всех)
+        max_scenarios_per_action: Максимум сценариев на действие (None - все)
+        time_budget: Бюджет времени на перечисление путей в секундах (None - без ограничения)
+        cycle_policy: Обработка циклов в модели: "break", "skip" или "error"
+        selection: "all" - все сценарии, "coverage" - минимальный покрывающий набор
+        max_total_scenarios: Предварительная проверка объема (None - без проверки)
+        on_limit: При превышении max_total_scenarios: "cap" - ограничить, "reject" - отклонить
+        sample_size: Случайная выборка сценариев на действие (None - перечисление всех)
+        seed: Зерно выборки для воспроизводимости (None - случайное)
+        processes: Процессы рендеринга (None или 1 - без пула, 0 - по числу ядер)
+        compiled: Готовая CompiledModel модели (например, из ModelStore.compiled)
         
     Returns:
-        (tests_dict, zip_buffer, archive_name)
+        (tests_dict, zip_buffer, archive_name, report), где report - результат
+        BDDGeneratorSimple.truncation_report()
+        
+    Raises:
+        ValueError: Неизвестная политика циклов, лимита, режим выбора сценариев или размер выборки
+        ModelCycleError: В модели есть цикл и cycle_policy == "error"
+        ScenarioLimitError: Модель дает больше max_total_scenarios сценариев и on_limit == "reject"
     """
     try:
-        generator = TestGeneratorAdapted(model_data)
+        generator = create_test_generator(
+            model_data,
+            action_ids,
+            max_scenarios_per_action=max_scenarios_per_action,
+            time_budget=time_budget,
+            cycle_policy=cycle_policy,
+            selection=selection,
+            max_total_scenarios=max_total_scenarios,
+            on_limit=on_limit,
+            sample_size=sample_size,
+            seed=seed,
+            processes=processes,
+            compiled=compiled
+        )
         
         if action_ids is None:
             # Генерация всех тестов
@@ -461,51 +1064,101 @@ def generate_tests(model_data, action_ids=None):
         # Создаем ZIP архив
         zip_buffer, archive_name = generator.create_zip_archive(tests_dict)
         
-        return tests_dict, zip_buffer, archive_name
+        return tests_dict, zip_buffer, archive_name, generator.truncation_report()
         
+    except ValueError:
+        # Ошибки запроса (в том числе ModelCycleError и ScenarioLimitError)
+        raise
     except Exception as e:
         logger.error(f"Ошибка генерации тестов: {e}")
-        return {}, None, None
+        return {}, None, None, None
 
 
-# Тестирование
-if __name__ == "__main__":
-    print("Тестирование адаптированного генератора тестов...")
-    
-    # Загружаем тестовую модель
-    model = load_model("test_project.json")
+def generate_tests(model_data, action_ids=None, max_scenarios_per_action=None, time_budget=None,
+                   cycle_policy="break", selection="all", sample_size=None, seed=None, processes=None):
+    """
+    Основная функция генерации тестов
     
-    if model:
-        print(f"✓ Модель загружена: {len(model.get('model_actions', []))} действий")
-        
-        # Тест 1: Генерация всех тестов
-        print("\n1. Генерация всех тестов...")
-        tests_dict, zip_buffer, archive_name = generate_tests(model)
+    Args:
+        model_data: Данные модели
+        action_ids: Список ID действий (None для всех)
+        max_scenarios_per_action: Максимум сценариев на действие (None - все)
+        time_budget: Бюджет времени на перечисление путей в секундах (None - без ограничения)
+        cycle_policy: Обработка циклов в модели: "break", "skip" или "error"
+        selection: "all" - все сценарии, "coverage" - минимальный покрывающий набор
+        sample_size: Случайная выборка сценариев на действие (None - перечисление всех)
+        seed: Зерно выборки для воспроизводимости (None - случайное)
+        processes: Процессы рендеринга (None или 1 - без пула, 0 - по числу ядер)
         
-        if tests_dict:
-            print(f"✓ Сгенерировано {len(tests_dict)} тестов")
-            print(f"✓ Создан архив: {archive_name}")
-            
-            # Сохраняем архив для проверки
-            with open(archive_name, 'wb') as f:
-                f.write(zip_buffer.getvalue())
-            print(f"✓ Архив сохранен на диск")
-            
-            # Показываем пример теста
-            first_file = list(tests_dict.keys())[0]
-            print(f"\nПример теста ({first_file}):")
-            print("=" * 50)
-            print(tests_dict[first_file][:500] + "...")
-            print("=" * 50)
-        
-        # Тест 2: Генерация тестов для конкретных действий
-        print("\n2. Генерация тестов для действий a00001 и a00002...")
-        tests_dict2, zip_buffer2, archive_name2 = generate_tests(model, ["a00001", "a00002"])
-        
-        if tests_dict2:
-            print(f"✓ Сгенерировано {len(tests_dict2)} тестов для выбранных действий")
-            print(f"✓ Создан архив: {archive_name2}")
-        
-        print("\n✅ Адаптированный генератор тестов работает корректно!")
-    else:
-        print("❌ Не удалось загрузить модель test_project.json")
\ No newline at end of file
+    Returns:
+        (tests_dict, zip_buffer, archive_name)
+    """
+    tests_dict, zip_buffer, archive_name, _ = generate_tests_with_report(
+        model_data, action_ids, max_scenarios_per_action, time_budget, cycle_policy, selection,
+        sample_size=sample_size, seed=seed, processes=processes
+    )
+    return tests_dict, zip_buffer, archive_name
+
+
+def main(argv=None):
+    """Генерация архива тестов из командной строки"""
+    parser = argparse.ArgumentParser(description="Генерация BDD тестов по модели Graph Editor")
+    parser.add_argument("model", nargs="?", default="test_project.json", help="Файл модели (JSON)")
+    parser.add_argument("-o", "--output", help="Файл ZIP архива (по умолчанию bdd_tests_<время>.zip)")
+    parser.add_argument("--actions", nargs="+", help="ID действий (по умолчанию - все)")
+    parser.add_argument("--processes", type=int, default=1,
+                        help="Процессы рендеринга (1 - без пула, 0 - по числу ядер)")
+    parser.add_argument("--max-scenarios", type=int, help="Максимум сценариев на действие")
+    parser.add_argument("--time-budget", type=float, help="Бюджет времени на перечисление путей (с)")
+    parser.add_argument("--cycle-policy", choices=CYCLE_POLICIES, default="break")
+    parser.add_argument("--selection", choices=BDDGeneratorSimple.SELECTION_MODES, default="all")
+    parser.add_argument("--max-total-scenarios", type=int, help="Предварительная проверка объема")
+    parser.add_argument("--on-limit", choices=ON_LIMIT_POLICIES, default="cap")
+    parser.add_argument("--sample-size", type=int, help="Случайная выборка сценариев на действие")
+    parser.add_argument("--seed", type=int, help="Зерно выборки")
+    args = parser.parse_args(argv)
+    
+    model = load_model(args.model)
+    if not model:
+        print(f"❌ Не удалось загрузить модель {args.model}")
+        return 1
+    print(f"✓ Модель загружена: {len(model.get('model_actions', []))} действий")
+    
+    try:
+        generator = create_test_generator(
+            model,
+            args.actions,
+            max_scenarios_per_action=args.max_scenarios,
+            time_budget=args.time_budget,
+            cycle_policy=args.cycle_policy,
+            selection=args.selection,
+            max_total_scenarios=args.max_total_scenarios,
+            on_limit=args.on_limit,
+            sample_size=args.sample_size,
+            seed=args.seed,
+            processes=args.processes,
+            # В командной строке нет других потоков - fork безопасен и не
+            # сериализует генератор
+            start_method="fork" if "fork" in multiprocessing.get_all_start_methods() else None
+        )
+    except ValueError as e:
+        print(f"❌ Тесты не сгенерированы: {e}")
+        return 2
+    
+    output = args.output or generator.archive_name()
+    started = datetime.now()
+    with open(output, "wb") as f:
+        filenames = generator.write_zip_archive(f, args.actions)
+    elapsed = (datetime.now() - started).total_seconds()
+    
+    report = generator.truncation_report()
+    print(f"✓ Сгенерировано {len(filenames)} тестов за {elapsed:.2f} с "
+          f"(процессов: {generator.generator.processes})")
+    if report["truncated"]:
+        print(f"⚠️  Сценарии обрезаны для {len(report['truncated_actions'])} действий")
+    print(f"✓ Архив сохранен: {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,6 +4,7 @@ import telebot
 from telebot.types import Message, Document
 import logging
 import zipfile  # <-- 1. Добавлен импорт zipfile
+from path_engine import PathEngine, ModelCycleError
 
 # --- НАСТРОЙКА ЛОГГИРОВАНИЯ ---
 logging.basicConfig(
@@ -27,102 +28,34 @@ TOKEN = ""
 class BDDGenerator:
     """
     Класс инкапсулирует логику генерации BDD-сценариев.
+
+    Пути вычисляет итеративный PathEngine: циклы в модели обрабатываются
+    по политике cycle_policy, а не заканчиваются RecursionError.
     """
-    def __init__(self, model: dict):
+    def __init__(self, model: dict, cycle_policy: str = "break"):
         self.model = model
-        self.states = {}
-        self.ways_to_action_cache = {}
-        self.ways_to_state_cache = {}
-        self._build_states_map()
+        self.engine = PathEngine(model, cycle_policy=cycle_policy)
+        self.states = self.engine.states
         logger.debug("Карта состояний построена.")
 
-    def _build_states_map(self):
-        for action_name, action_data in self.model.items():
-            for final_state in action_data["final_states"]:
-                if final_state not in self.states:
-                    self.states[final_state] = {"actions": []}
-                self.states[final_state]["actions"].append(action_name)
-
     def get_ways_to_action(self, action_name: str) -> list[list[str]]:
-        if action_name in self.ways_to_action_cache:
-            return self.ways_to_action_cache[action_name]
-
-        action = self.model[action_name]
-        init_states = action["init_states"]
-
-        if not init_states:
-            self.ways_to_action_cache[action_name] = []
-            return []
-
-        ways_to_states = {}
-        
-        for init_state in init_states:
-            if init_state not in self.states:
-                self.ways_to_action_cache[action_name] = []
-                return []
-            
-            ways_to_state = self.get_ways_to_state(init_state)
-            
-            if not ways_to_state:
-                self.ways_to_action_cache[action_name] = []
-                return []
-                
-            ways_to_states[init_state] = ways_to_state
-
-        final_ways: list[list[str]] = []
-        for state_name, ways_to_state in ways_to_states.items():
-            if len(final_ways) == 0:
-                final_ways = ways_to_state
-                continue
-
-            merged_ways: list[list[str]] = []
-            for way_left in final_ways:
-                for way_right in ways_to_state:
-                    merged_path = list(dict.fromkeys(way_left + way_right))
-                    merged_ways.append(merged_path)
-            final_ways = merged_ways
-
-        self.ways_to_action_cache[action_name] = final_ways
-        return final_ways
+        return self.engine.ways_to_action(action_name)
 
     def get_ways_to_state(self, state_name: str) -> list[list[str]]:
-        if state_name in self.ways_to_state_cache:
-            return self.ways_to_state_cache[state_name]
-
-        if state_name not in self.states:
-            self.ways_to_state_cache[state_name] = []
-            return []
-
-        state = self.states[state_name]
-        all_ways_to_state: list[list[str]] = []
-
-        for action_name in state["actions"]:
-            prereq_paths = self.get_ways_to_action(action_name)
-
-            if len(prereq_paths) == 0:
-                final_paths_for_action = [[action_name]]
-            else:
-                final_paths_for_action = []
-                for path in prereq_paths:
-                    new_path = path.copy()
-                    new_path.append(action_name)
-                    final_paths_for_action.append(new_path)
-            
-            all_ways_to_state.extend(final_paths_for_action)
-
-        self.ways_to_state_cache[state_name] = all_ways_to_state
-        return all_ways_to_state
+        return self.engine.ways_to_state(state_name)
 
     def generate_all_bdd_files(self) -> dict[str, str]:
         all_files = {}
 
         for action_name in self.model.keys():
             logger.info(f"Генерация BDD для действия: '{action_name}'")
-            prereq_paths = self.get_ways_to_action(action_name)
             final_states = self.model[action_name]["final_states"]
 
-            if not prereq_paths:
-                prereq_paths = [[]] 
+            # Пути хранятся компактно; списки имен строятся по одному при выводе
+            if self.engine.action_paths(action_name):
+                prereq_paths = self.engine.iter_ways_to_action(action_name)
+            else:
+                prereq_paths = [[]]
             
             txt_content = f"Функциональность: {action_name}\n\n"
             
@@ -176,6 +109,13 @@ def process_json_data(message: Message, model: dict):
         file_count = len(all_files)
         logger.info(f"Генерация для {user_info} завершена. Сгенерировано {file_count} файлов.")
         
+        cycles = generator.engine.cycles
+        if cycles:
+            logger.warning(f"В модели {user_info} найдено циклов: {len(cycles)}")
+            bot.send_message(chat_id,
+                f"⚠️ В модели найдено циклических зависимостей: {len(cycles)}. "
+                "Для действий в циклах показаны только пути без повторения действий.")
+        
         # --- 2. ГЕНЕРАЦИЯ ZIP-АРХИВА В ПАМЯТИ ---
         zip_buffer = io.BytesIO()
         with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zipf:
@@ -208,10 +148,10 @@ def process_json_data(message: Message, model: dict):
             caption=f"✅ Готово! Сгенерировано {file_count} BDD-сценариев. Все файлы также собраны в этом архиве."
         )
 
-    except RecursionError:
-        logger.error(f"Ошибка рекурсии для {user_info}. Вероятны циклические зависимости в модели.")
+    except ModelCycleError as e:
+        logger.error(f"Циклическая зависимость в модели {user_info}: {e}")
         bot.send_message(chat_id, 
-            "❌ **Ошибка!**\nОбнаружена бесконечная рекурсия. Пожалуйста, проверь свою модель на **циклические зависимости**.")
+            f"❌ **Ошибка!**\n{e}. Пожалуйста, проверь свою модель на **циклические зависимости**.")
     except Exception as e:
         logger.critical(f"Критическая ошибка при обработке модели для {user_info}: {e}", exc_info=True)
         bot.send_message(chat_id, f"❌ **Произошла критическая ошибка при обработке модели:**\n`{e}`\n\nПроверь логику состояний. (Детали см. в `bot.log`)")
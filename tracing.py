@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""
+Трассировка запросов API Graph Editor: время этапов обработки
+
+Trace собирает этапы (spans) одного запроса или фоновой задачи: имя,
+смещение от начала, длительность, поток и атрибуты. Текущая трасса
+хранится в потоке, поэтому конвейер генерации отмечает этапы через span(),
+не зная, есть ли трасса: без нее span() ничего не делает. Рабочие потоки
+(части документа, отправляемые в LLM параллельно) выполняются в трассе
+запроса через bind().
+
+Сводка по этапам отдается клиенту заголовком Server-Timing, а по
+завершении запроса TraceLog пишет трассу строкой JSON в журнал трасс и,
+если запрос дольше порога, в журнал медленных запросов.
+"""
+
+import contextlib
+import datetime
+import json
+import os
+import re
+import threading
+import time
+import uuid
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Сколько этапов хранится в записи трассы; сводка по этапам учитывает все
+MAX_SPANS = 500
+
+# ID запроса клиента (заголовок X-Request-ID) принимается только такого вида
+REQUEST_ID_PATTERN = re.compile(r"^[A-Za-z0-9._:-]{1,64}$")
+
+_local = threading.local()
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 3)
+
+
+def new_request_id():
+    return uuid.uuid4().hex[:16]
+
+
+def request_id_from(header):
+    """ID запроса из заголовка X-Request-ID клиента или новый"""
+    if header and REQUEST_ID_PATTERN.match(header):
+        return header
+    return new_request_id()
+
+
+class Trace:
+    """Этапы одного запроса; span() и add() можно вызывать из нескольких потоков"""
+
+    def __init__(self, request_id, name, **attrs):
+        """
+        Args:
+            request_id: ID запроса (X-Request-ID) или задачи
+            name: Вид трассы: http, job
+            attrs: Сведения о запросе (метод, маршрут, модель)
+        """
+        self.request_id = request_id
+        self.name = name
+        self.attrs = attrs
+        self.started_at = datetime.datetime.now()
+        self.duration = None
+        self.spans = []
+        self.dropped_spans = 0
+        # Имя этапа -> [число, суммарное время в секундах], в порядке появления
+        self.totals = {}
+        self._started = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def elapsed(self):
+        """Секунды от начала трассы"""
+        return time.perf_counter() - self._started
+
+    @contextlib.contextmanager
+    def span(self, name, **attrs):
+        """
+        Этап трассы на время блока
+
+        Yields:
+            Словарь атрибутов этапа: его можно дополнить внутри блока
+            (например, числом найденных действий)
+        """
+        started = time.perf_counter()
+        error = None
+        try:
+            yield attrs
+        except Exception as e:
+            error = type(e).__name__
+            raise
+        finally:
+            self.add(name, started, time.perf_counter(), attrs, error)
+
+    def add(self, name, started, finished, attrs=None, error=None):
+        """Добавляет завершенный этап (started, finished - значения time.perf_counter())"""
+        duration = finished - started
+        span = {
+            "name": name,
+            "start_ms": _ms(started - self._started),
+            "duration_ms": _ms(duration),
+            "thread": threading.current_thread().name
+        }
+        if attrs:
+            span["attrs"] = attrs
+        if error:
+            span["error"] = error
+        with self._lock:
+            total = self.totals.setdefault(name, [0, 0.0])
+            total[0] += 1
+            total[1] += duration
+            if len(self.spans) < MAX_SPANS:
+                self.spans.append(span)
+            else:
+                self.dropped_spans += 1
+
+    def finish(self, **attrs):
+        """Фиксирует длительность трассы и итоговые сведения (статус ответа)"""
+        self.attrs.update(attrs)
+        self.duration = self.elapsed()
+
+    def server_timing(self):
+        """
+        Значение заголовка Server-Timing: время этапов по именам к этому
+        моменту (desc - число этапов, если их несколько) и total
+        """
+        with self._lock:
+            totals = list(self.totals.items())
+        metrics = []
+        for name, (count, seconds) in totals:
+            metric = f"{name};dur={_ms(seconds)}"
+            if count > 1:
+                metric += f';desc="{count}x"'
+            metrics.append(metric)
+        metrics.append(f"total;dur={_ms(self.duration if self.duration is not None else self.elapsed())}")
+        return ", ".join(metrics)
+
+    def to_dict(self):
+        """Запись трассы для журнала"""
+        with self._lock:
+            stages = {name: {"count": count, "duration_ms": _ms(seconds)}
+                      for name, (count, seconds) in self.totals.items()}
+            spans = list(self.spans)
+            dropped = self.dropped_spans
+        record = {
+            "request_id": self.request_id,
+            "name": self.name,
+            "started_at": self.started_at.isoformat(),
+            "duration_ms": _ms(self.duration if self.duration is not None else self.elapsed()),
+            **self.attrs,
+            "stages": stages,
+            "spans": spans
+        }
+        if dropped:
+            record["dropped_spans"] = dropped
+        return record
+
+
+def current():
+    """Трасса, в которой выполняется поток, или None"""
+    return getattr(_local, "trace", None)
+
+
+@contextlib.contextmanager
+def activate(trace):
+    """Выполняет блок в трассе trace (None - вне трассы)"""
+    previous = current()
+    _local.trace = trace
+    try:
+        yield trace
+    finally:
+        _local.trace = previous
+
+
+def span(name, **attrs):
+    """Этап текущей трассы (см. Trace.span); вне трассы ничего не делает"""
+    trace = current()
+    if trace is None:
+        return contextlib.nullcontext(attrs)
+    return trace.span(name, **attrs)
+
+
+def bind(function):
+    """function, выполняемая в текущей трассе - для передачи в пул потоков"""
+    trace = current()
+    if trace is None:
+        return function
+
+    def run(*args, **kwargs):
+        with activate(trace):
+            return function(*args, **kwargs)
+    return run
+
+
+class TraceLog:
+    """
+    Журналы трасс в формате JSON lines
+
+    Файл журнала больше max_bytes переименовывается в {path}.1 (прежний
+    {path}.1 удаляется), так что на диске не больше двух файлов журнала.
+    """
+
+    def __init__(self, path=None, slow_path=None, slow_threshold=None, max_bytes=50 * 1024 * 1024):
+        """
+        Args:
+            path: Журнал всех трасс (None - не писать)
+            slow_path: Журнал медленных запросов (None - только предупреждение в лог)
+            slow_threshold: Порог медленного запроса в секундах (None - не отслеживать)
+            max_bytes: Размер файла журнала, после которого он сменяется (0 - без ограничения)
+        """
+        self.path = path
+        self.slow_path = slow_path
+        self.slow_threshold = slow_threshold
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def write(self, trace):
+        """Записывает завершенную трассу; медленную - и в журнал медленных запросов"""
+        slow = self.slow_threshold is not None and trace.duration >= self.slow_threshold
+        if not self.path and not slow:
+            return
+        line = json.dumps(trace.to_dict(), ensure_ascii=False, default=str)
+        if self.path:
+            self._append(self.path, line)
+        if slow:
+            logger.warning(f"🐢 Медленный запрос {trace.request_id} ({trace.attrs.get('route', trace.name)}): "
+                           f"{_ms(trace.duration)} мс; {trace.server_timing()}")
+            if self.slow_path:
+                self._append(self.slow_path, line)
+
+    def _append(self, path, line):
+        with self._lock:
+            try:
+                directory = os.path.dirname(path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                if self.max_bytes and os.path.exists(path) and os.path.getsize(path) >= self.max_bytes:
+                    os.replace(path, path + ".1")
+                with open(path, "a", encoding="utf-8") as f:
+                    f.write(line + "\n")
+            except OSError as e:
+                logger.warning(f"⚠️  Трасса не записана в {path}: {e}")